@@ -396,6 +396,61 @@ class DatabaseHealthCheck(FastBlocksHealthCheck):
         )
 
 
+class WarmupHealthCheck(FastBlocksHealthCheck):
+    """Readiness of this worker's startup cache warm-up.
+
+    Degraded while the entries of the access trace are being loaded, so the
+    worker does not report healthy with cold template caches.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(
+            component_id="warmup",
+            component_name="Cache Warm-up",
+        )
+
+    async def _perform_health_check(
+        self,
+        check_type: t.Any,
+    ) -> HealthCheckResult:
+        """Check whether the startup warm-up has finished."""
+        details: dict[str, t.Any] = {}
+        status = HealthStatus.HEALTHY
+        message = "Cache warm-up complete"
+
+        try:
+            from fastblocks.adapters.templates._access_trace import (
+                get_startup_warmup,
+            )
+
+            progress = get_startup_warmup()
+            details["queued"] = progress.queued
+            details["completed"] = progress.completed
+            if progress.running:
+                status = HealthStatus.DEGRADED
+                message = (
+                    f"Warming caches: {progress.completed} of "
+                    f"{progress.queued} entries loaded"
+                )
+            elif progress.timed_out:
+                message = "Cache warm-up timed out; the rest loads in the background"
+                details["timed_out"] = True
+
+        except Exception as e:
+            status = HealthStatus.UNKNOWN
+            message = f"Warm-up health check failed: {e}"
+            details["error"] = str(e)
+
+        return HealthCheckResult(
+            component_id=self.component_id,
+            component_name=self.component_name,
+            status=status,
+            check_type=check_type,
+            message=message,
+            details=details,
+        )
+
+
 async def register_fastblocks_health_checks() -> bool:
     """Register all FastBlocks components with Oneiric HealthService.
 
@@ -411,6 +466,7 @@ async def register_fastblocks_health_checks() -> bool:
         await health_service.register_component(CacheHealthCheck())
         await health_service.register_component(RoutesHealthCheck())
         await health_service.register_component(DatabaseHealthCheck())
+        await health_service.register_component(WarmupHealthCheck())
 
         # Store health service in depends for retrieval
         register_candidate(
@@ -446,7 +502,7 @@ def _determine_overall_health_status(results: dict[str, t.Any]) -> str:
 
 async def _get_component_health_results(health_service: t.Any) -> dict[str, t.Any]:
     """Get health results for all components."""
-    component_ids = ["templates", "cache", "routes", "database"]
+    component_ids = ["templates", "cache", "routes", "database", "warmup"]
     results = {}
 
     for component_id in component_ids:
@@ -479,6 +535,7 @@ async def get_fastblocks_health_summary() -> dict[str, t.Any]:
         await health_service.register_component(CacheHealthCheck())
         await health_service.register_component(RoutesHealthCheck())
         await health_service.register_component(DatabaseHealthCheck())
+        await health_service.register_component(WarmupHealthCheck())
 
         # Get health status for all registered components
         results = await _get_component_health_results(health_service)
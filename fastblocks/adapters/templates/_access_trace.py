@@ -0,0 +1,230 @@
+"""Persisted trace of the templates and blocks a worker uses.
+
+A worker starts with cold template caches after every deploy. The trace
+counts how often each template and block was used and is saved to a local
+JSON file. On startup ``warm_from_trace`` loads the most used entries again,
+most used first, and the ``warmup`` health check reports the worker
+degraded until they are loaded.
+
+Only names and use counts are recorded: no context values, request data or
+timestamps. Names longer than ``AccessTrace.MAX_NAME_LENGTH`` are skipped.
+Counts loaded from a previous run are halved, so entries that stop being
+used fade out of the trace over a few restarts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import json
+import os
+import tempfile
+import time
+import typing as t
+from collections import Counter, deque
+from contextlib import suppress
+from dataclasses import dataclass
+from enum import Enum
+from operator import itemgetter
+from pathlib import Path
+
+ACCESS_TRACE_FORMAT_VERSION = 1
+DEFAULT_WARMUP_ENTRIES = 100
+DEFAULT_WARMUP_CONCURRENCY = 4
+
+Loader = t.Callable[[str], t.Awaitable[t.Any]]
+
+
+class AccessKind(Enum):
+    """What a traced name refers to."""
+
+    TEMPLATE = "template"
+    BLOCK = "block"  # "<template name>:<block name>"
+
+
+class AccessTrace:
+    """(kind, name) -> use count, bounded and persisted as JSON."""
+
+    MAX_ENTRIES: int = 4096
+    MAX_NAME_LENGTH: int = 256
+    # Minimum seconds between saves requested through ``save_due``.
+    SAVE_INTERVAL: float = 60.0
+
+    def __init__(
+        self, path: str | Path | None = None, max_entries: int | None = None
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self.counts: Counter[tuple[AccessKind, str]] = Counter()
+        self.dirty = False
+        self._last_save = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def record(self, kind: AccessKind, name: str, count: int = 1) -> None:
+        if len(name) > self.MAX_NAME_LENGTH:
+            return
+        self.counts[(kind, name)] += count
+        self.dirty = True
+        # Let the table grow to twice its cap, then keep the most used:
+        # trimming is amortized over max_entries new names.
+        if len(self.counts) > 2 * self.max_entries:
+            self._trim()
+
+    def top(
+        self, n: int, kinds: t.Iterable[AccessKind] | None = None
+    ) -> list[tuple[AccessKind, str]]:
+        """The ``n`` most used entries, optionally of ``kinds`` only."""
+        wanted = None if kinds is None else set(kinds)
+        items = (
+            item
+            for item in self.counts.items()
+            if wanted is None or item[0][0] in wanted
+        )
+        return [key for key, _ in heapq.nlargest(n, items, key=itemgetter(1))]
+
+    @property
+    def save_due(self) -> bool:
+        """Whether new uses were recorded and ``SAVE_INTERVAL`` has passed."""
+        return self.dirty and time.monotonic() - self._last_save >= self.SAVE_INTERVAL
+
+    async def load(self) -> None:
+        """Add the halved counts of the trace file to this trace.
+
+        A missing or unreadable file adds nothing.
+        """
+        if self.path is None:
+            return
+        with suppress(OSError, ValueError, TypeError, KeyError):
+            data = json.loads(await asyncio.to_thread(self.path.read_text))
+            if data.get("format") != ACCESS_TRACE_FORMAT_VERSION:
+                return
+            kinds = {kind.value for kind in AccessKind}
+            for kind, name, count in data["entries"]:
+                # Kinds no longer traced are dropped.
+                if kind in kinds and count // 2:
+                    self.counts[(AccessKind(kind), str(name))] += count // 2
+            self._trim()
+
+    async def save(self) -> None:
+        """Write the trace if uses were recorded since it was last saved."""
+        self._last_save = time.monotonic()
+        if self.path is None or not self.dirty:
+            return
+        self._trim()
+        data = {
+            "format": ACCESS_TRACE_FORMAT_VERSION,
+            "entries": [
+                [kind.value, name, count]
+                for (kind, name), count in self.counts.most_common()
+            ],
+        }
+        with suppress(OSError):
+            await asyncio.to_thread(self._write, self.path, json.dumps(data))
+            self.dirty = False
+
+    def _trim(self) -> None:
+        if len(self.counts) > self.max_entries:
+            self.counts = Counter(dict(self.counts.most_common(self.max_entries)))
+
+    @staticmethod
+    def _write(path: Path, text: str) -> None:
+        # Write a file of our own then rename it over the trace, so readers
+        # and other workers saving the same trace never see a partial file.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                tmp_file.write(text)
+            os.replace(tmp_name, path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp_name)
+            raise
+
+
+@dataclass
+class WarmupProgress:
+    """State of the startup warm-up, read by the ``warmup`` health check."""
+
+    running: bool = False
+    queued: int = 0
+    completed: int = 0
+    timed_out: bool = False
+
+    @property
+    def pending(self) -> int:
+        return self.queued - self.completed
+
+
+_startup_warmup = WarmupProgress()
+
+
+def get_startup_warmup() -> WarmupProgress:
+    """Progress of this worker's startup warm-up."""
+    return _startup_warmup
+
+
+async def warm_from_trace(
+    trace: AccessTrace,
+    loaders: t.Mapping[AccessKind, Loader],
+    top_n: int = DEFAULT_WARMUP_ENTRIES,
+    timeout: float | None = None,
+    progress: WarmupProgress | None = None,
+    concurrency: int = DEFAULT_WARMUP_CONCURRENCY,
+) -> WarmupProgress:
+    """Load the ``top_n`` most used traced entries.
+
+    ``concurrency`` workers call the loaders most used entry first; the
+    loaders fill the caches they belong to, and their results are dropped.
+    Entries of a kind without a loader are skipped. Returns when every entry
+    has been loaded or ``timeout`` seconds have passed; entries still queued
+    then keep loading in the background.
+
+    Args:
+        trace: Trace recorded by previous runs
+        loaders: Loader per kind, called with the traced name
+        top_n: Number of entries to warm
+        timeout: Seconds to wait for the entries, if bounded
+        progress: Progress to update (this worker's startup warm-up by
+            default)
+        concurrency: Entries loaded at the same time
+    """
+    progress = progress or _startup_warmup
+    progress.running = True
+    try:
+        queue = deque(trace.top(top_n, kinds=loaders))
+        progress.queued += len(queue)
+        workers = {
+            asyncio.create_task(_load_entries(queue, loaders, progress))
+            for _ in range(min(concurrency, len(queue)))
+        }
+        if workers:
+            _, pending = await asyncio.wait(workers, timeout=timeout)
+            if pending:
+                progress.timed_out = True
+                # Keep a reference so the workers are not collected mid-load.
+                _background_workers.update(pending)
+                for worker in pending:
+                    worker.add_done_callback(_background_workers.discard)
+    finally:
+        progress.running = False
+    return progress
+
+
+_background_workers: set[asyncio.Task[None]] = set()
+
+
+async def _load_entries(
+    queue: deque[tuple[AccessKind, str]],
+    loaders: t.Mapping[AccessKind, Loader],
+    progress: WarmupProgress,
+) -> None:
+    while queue:
+        kind, name = queue.popleft()
+        try:
+            with suppress(Exception):
+                await loaders[kind](name)
+        finally:
+            progress.completed += 1
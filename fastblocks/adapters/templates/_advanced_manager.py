@@ -60,6 +60,7 @@ except ImportError:
     SandboxedEnvironment = Environment  # type: ignore[assignment,misc]
 from jinja2.runtime import StrictUndefined as RuntimeStrictUndefined
 
+from ._partials import render_block_async
 from .jinja2 import Templates, TemplatesSettings
 
 __all__ = [
@@ -314,7 +315,6 @@ class HybridTemplatesManager:
         self._validation_cache: dict[str, TemplateValidationResult] = {}
         self._fragment_cache: dict[str, list[FragmentInfo]] = {}
         self._autocomplete_cache: dict[str, list[AutocompleteItem]] = {}
-        self._template_dependencies: dict[str, set[str]] = {}
 
     async def _initialize_base_templates(self) -> None:
         """Initialize base templates instance."""
@@ -913,11 +913,8 @@ class HybridTemplatesManager:
             if fragment_info.block_name:
                 # Render specific block
                 template = env.get_template(fragment_info.template_path)
-                # render_block exists in Jinja2 runtime but not in type stubs
-                return str(
-                    template.render_block(  # type: ignore[attr-defined]
-                        fragment_info.block_name, context or {}
-                    )
+                return await render_block_async(
+                    template, fragment_info.block_name, context or {}
                 )
             else:
                 # Render entire template
@@ -969,36 +966,34 @@ class HybridTemplatesManager:
         return compiled_templates
 
     async def get_template_dependencies(self, template_name: str) -> set[str]:
-        """Get dependencies for a template (extends, includes, imports)."""
-        if template_name in self._template_dependencies:
-            return self._template_dependencies[template_name]
-
-        dependencies = set()
-        env = self._get_template_environment()
-
-        with suppress(Exception):
-            source, _, _ = env.loader.get_source(env, template_name)  # type: ignore
-            parsed = env.parse(source, template_name)
+        """Get dependencies for a template (extends, includes, imports).
 
-            # Find extends, includes, and imports
-            node: t.Any
-            # find_all accepts strings but type stubs expect Node types
-            for node in parsed.find_all(
-                t.cast(t.Any, ("Extends", "Include", "FromImport"))
-            ):
-                if hasattr(node, "template") and hasattr(node.template, "value"):
-                    dependencies.add(node.template.value)
-
-            self._template_dependencies[template_name] = dependencies
+        Reads the dependency graph the app environment maintains; loading
+        the template through ``prefetch_template`` records it (and its
+        parents and includes, concurrently) if it has not been compiled yet.
+        """
+        if not self.base_templates:
+            return set()
+        graph = self.base_templates.dependency_graphs.get("app")
+        if graph is None:
+            return set()
+        if template_name not in graph:
+            with suppress(Exception):
+                await self.base_templates.prefetch_template(template_name)
+        return graph.dependencies(template_name)
 
-        return dependencies
+    async def get_template_dependents(self, template_name: str) -> set[str]:
+        """Get every template that would change if ``template_name`` changed."""
+        if not self.base_templates:
+            return set()
+        graph = self.base_templates.dependency_graphs.get("app")
+        return graph.descendants(template_name) if graph is not None else set()
 
     def clear_caches(self) -> None:
         """Clear all internal caches."""
         self._validation_cache.clear()
         self._fragment_cache.clear()
         self._autocomplete_cache.clear()
-        self._template_dependencies.clear()
 
 
 MODULE_ID = UUID("01937d87-1234-7890-abcd-1234567890ab")
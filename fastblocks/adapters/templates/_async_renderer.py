@@ -16,8 +16,10 @@ Author: lesleslie <les@wedgwoodwebworks.com>
 Created: 2025-01-12
 """
 
+import asyncio
 import time
 import typing as t
+from collections import OrderedDict
 from collections.abc import AsyncIterator
 from contextlib import suppress
 from dataclasses import dataclass, field
@@ -45,12 +47,15 @@ from starlette.requests import Request
 from starlette.responses import HTMLResponse, Response, StreamingResponse
 
 from ._advanced_manager import HybridTemplatesManager, TemplateValidationResult
+from ._fingerprint import UnfingerprintableError, context_fingerprint, estimate_size
+from ._partials import render_block_async, stream_deferred_blocks
 from ._performance_optimizer import (
     PerformanceMetrics,
     PerformanceOptimizer,
     get_performance_optimizer,
 )
-from .jinja2 import Templates
+from ._render_cache import RenderCache, RenderTimeTracker, jittered_ttl, key_prefix
+from .jinja2 import Templates, _with_vary
 
 
 class RenderMode(Enum):
@@ -83,7 +88,22 @@ class RenderContext:
     fragment_name: str | None = None
     block_name: str | None = None
     cache_key: str | None = None
-    cache_ttl: int = 300
+    # Seconds ``cache_key`` is cached for; None uses the optimizer's TTL for
+    # the template.
+    cache_ttl: int | None = None
+    # Context keys the output depends on. When set and ``cache_key`` is not,
+    # the output is cached under a fingerprint of just these keys.
+    cache_context_keys: t.Collection[str] | None = None
+    # Seconds the render may take. An overrunning render is cancelled and the
+    # last output cached under ``cache_key`` (even if expired) is served, or
+    # else ``budget_placeholder``.
+    render_budget: float | None = None
+    budget_placeholder: str | None = None
+    # Blocks streamed out of order: the page streams with placeholders for
+    # them, then each follows as an hx-swap-oob fragment once rendered.
+    # Implies streaming.
+    deferred_blocks: t.Collection[str] | None = None
+    deferred_placeholder: str = ""
     enable_streaming: bool = False
     chunk_size: int = 8192
     validate_template: bool = False
@@ -103,17 +123,29 @@ class RenderResult:
     validation_result: TemplateValidationResult | None = None
     template_path: str | None = None
     fragment_info: dict[str, t.Any] = field(default_factory=dict)
+    budget_exceeded: bool = False
 
 
 class AsyncTemplateRenderer:
     """Enhanced async template renderer with advanced features."""
 
+    # Bounds for the in-memory render cache (LRU by entries and bytes).
+    MAX_CACHE_ENTRIES: int = 1024
+    MAX_CACHE_BYTES: int = 64 * 1024 * 1024
+    # Cap on templates with render-time statistics.
+    MAX_TRACKED_TEMPLATES: int = 512
+    # Largest fraction cache TTLs are shortened by, so output cached
+    # together (e.g. on warm-up) does not expire and re-render together.
+    CACHE_TTL_JITTER: float = 0.1
+
     def __init__(
         self,
         base_templates: Templates | None = None,
         hybrid_manager: HybridTemplatesManager | None = None,
         cache_strategy: CacheStrategy = CacheStrategy.MEMORY,
         performance_optimizer: PerformanceOptimizer | None = None,
+        max_cache_entries: int | None = None,
+        max_cache_bytes: int | None = None,
     ) -> None:
         self.base_templates = base_templates
         self.hybrid_manager = hybrid_manager
@@ -121,9 +153,19 @@ class AsyncTemplateRenderer:
         self.performance_optimizer = (
             performance_optimizer or get_performance_optimizer()
         )
-        self._render_cache: dict[str, tuple[str, float]] = {}
+        self._render_cache = RenderCache(
+            max_entries=max_cache_entries or self.MAX_CACHE_ENTRIES,
+            max_bytes=max_cache_bytes or self.MAX_CACHE_BYTES,
+            ttl_jitter=self.CACHE_TTL_JITTER,
+        )
+        # Redis cache key -> template name, for dependency invalidation of
+        # entries that only live in Redis. Bounded like the memory cache.
+        self._redis_keys: OrderedDict[str, str] = OrderedDict()
         self._template_watchers: dict[str, float] = {}
-        self._performance_metrics: dict[str, list[float]] = {}
+        self._performance_metrics = RenderTimeTracker(self.MAX_TRACKED_TEMPLATES)
+        # Renders that overran their budget, by what was served instead.
+        self._budget_overruns = {"stale": 0, "placeholder": 0, "error": 0}
+        self._listen_for_changes()
 
     async def initialize(self) -> None:
         """Initialize the async renderer."""
@@ -133,6 +175,7 @@ class AsyncTemplateRenderer:
             except Exception:
                 self.base_templates = Templates()
                 await self.base_templates.init()
+            self._listen_for_changes()
 
         if not self.hybrid_manager:
             try:
@@ -148,8 +191,7 @@ class AsyncTemplateRenderer:
         start_time = time.time()
 
         try:
-            await self._optimize_render_context(render_context)
-            context_size = len(str(render_context.context))
+            context_size = await self._optimize_render_context(render_context)
 
             validation_result = await self._validate_if_requested(
                 render_context, start_time
@@ -163,9 +205,17 @@ class AsyncTemplateRenderer:
 
             cached_result = await self._try_get_cached(render_context, start_time)
             if cached_result:
+                self._record_render(
+                    render_context,
+                    cached_result.render_time,
+                    context_size,
+                    cache_hit=True,
+                )
                 return cached_result
 
-            content = await self._execute_render_strategy(render_context)
+            content = await self._execute_within_budget(render_context)
+            if content is None:
+                return self._serve_over_budget(render_context, start_time)
             result = await self._finalize_render_result(
                 render_context, content, validation_result, context_size, start_time
             )
@@ -177,16 +227,40 @@ class AsyncTemplateRenderer:
                 str(e), render_time=time.time() - start_time, status_code=500
             )
 
-    async def _optimize_render_context(self, render_context: RenderContext) -> None:
-        """Apply performance optimizations to render context."""
+    async def _optimize_render_context(self, render_context: RenderContext) -> int:
+        """Apply performance optimizations to render context.
+
+        Returns the estimated context size. The context is fingerprinted
+        only to derive a cache key from ``cache_context_keys``; a context
+        that cannot be fingerprinted is rendered without caching.
+        """
         optimized_context = await self.performance_optimizer.optimize_render_context(
             render_context.template_name, render_context.context
         )
         render_context.context = optimized_context
 
-        context_size = len(str(render_context.context))
+        context_size = estimate_size(render_context.context)
+        if render_context.cache_key is None and (
+            render_context.cache_context_keys is not None
+        ):
+            with suppress(UnfingerprintableError):
+                fingerprint = context_fingerprint(
+                    render_context.context,
+                    render_context.cache_context_keys,
+                    render_context.request,
+                )
+                render_context.cache_key = (
+                    f"render:{render_context.template_name}:{fingerprint.digest}"
+                )
 
-        if not render_context.enable_streaming:
+        if render_context.deferred_blocks:
+            render_context.enable_streaming = True
+            render_context.mode = RenderMode.STREAMING
+        elif (
+            # Block, fragment and HTMX renders return their part as a string.
+            render_context.mode == RenderMode.STANDARD
+            and not render_context.enable_streaming
+        ):
             render_context.enable_streaming = (
                 self.performance_optimizer.should_enable_streaming(
                     render_context.template_name, context_size
@@ -195,10 +269,7 @@ class AsyncTemplateRenderer:
             if render_context.enable_streaming:
                 render_context.mode = RenderMode.STREAMING
 
-        if render_context.cache_key and render_context.cache_ttl == 300:
-            render_context.cache_ttl = self.performance_optimizer.get_optimal_cache_ttl(
-                render_context.template_name
-            )
+        return context_size
 
     async def _validate_if_requested(
         self, render_context: RenderContext, start_time: float
@@ -237,6 +308,50 @@ class AsyncTemplateRenderer:
 
         return await self._render_standard(render_context)
 
+    async def _execute_within_budget(
+        self, render_context: RenderContext
+    ) -> str | AsyncIterator[str] | None:
+        """Run the render strategy; None if it overran ``render_budget``."""
+        if render_context.render_budget is None:
+            return await self._execute_render_strategy(render_context)
+        try:
+            async with asyncio.timeout(render_context.render_budget) as budget:
+                return await self._execute_render_strategy(render_context)
+        except TimeoutError:
+            if not budget.expired():
+                raise
+        return None
+
+    def _serve_over_budget(
+        self, render_context: RenderContext, start_time: float
+    ) -> RenderResult:
+        """Stale cached output, the placeholder, or a 504 for an overrun."""
+        render_time = time.time() - start_time
+        self._track_performance(render_context.template_name, render_time)
+        stale = (
+            self._render_cache.peek(render_context.cache_key)
+            if render_context.cache_key
+            else None
+        )
+        if stale is None and render_context.budget_placeholder is None:
+            self._budget_overruns["error"] += 1
+            result = self._create_error_result(
+                f"Render budget of {render_context.render_budget}s exceeded",
+                status_code=504,
+                render_time=render_time,
+            )
+            result.budget_exceeded = True
+            return result
+
+        self._budget_overruns["stale" if stale is not None else "placeholder"] += 1
+        return RenderResult(
+            content=stale if stale is not None else render_context.budget_placeholder,
+            render_time=render_time,
+            cache_hit=stale is not None,
+            template_path=render_context.template_name,
+            budget_exceeded=True,
+        )
+
     async def _finalize_render_result(
         self,
         render_context: RenderContext,
@@ -253,27 +368,66 @@ class AsyncTemplateRenderer:
             template_path=render_context.template_name,
         )
 
-        if render_context.cache_key and isinstance(content, str):
-            await self._cache_result(render_context, result)
+        if isinstance(content, str):
+            if render_context.cache_key:
+                await self._cache_result(render_context, result)
+            self._track_performance(render_context.template_name, result.render_time)
+            self._record_render(
+                render_context, result.render_time, context_size, len(content)
+            )
+        else:
+            result.content = self._measured_stream(
+                render_context, content, context_size, start_time
+            )
 
-        self._track_performance(render_context.template_name, result.render_time)
+        return result
 
-        performance_metrics = PerformanceMetrics(
-            render_time=result.render_time,
-            cache_hit=result.cache_hit,
-            template_size=len(render_context.template_name),
-            context_size=context_size,
-            fragment_count=1 if render_context.fragment_name else 0,
-            memory_usage=0,
-            concurrent_renders=1,
-        )
+    async def _measured_stream(
+        self,
+        render_context: RenderContext,
+        chunks: AsyncIterator[str],
+        context_size: int,
+        start_time: float,
+    ) -> AsyncIterator[str]:
+        """Yield ``chunks``, then record the render time and size of all of them.
+
+        A stream's render is recorded once it is complete: its setup time
+        alone would make a slow template look fast, and the optimizer would
+        turn streaming off for it again.
+        """
+        output_size = 0
+        async for chunk in chunks:
+            output_size += len(chunk)
+            yield chunk
+        render_time = time.time() - start_time
+        self._track_performance(render_context.template_name, render_time)
+        self._record_render(render_context, render_time, context_size, output_size)
+
+    def _record_render(
+        self,
+        render_context: RenderContext,
+        render_time: float,
+        context_size: int,
+        output_size: int = 0,
+        cache_hit: bool = False,
+    ) -> None:
+        """Feed a render to the optimizer, whose decisions tune later renders.
 
+        Cache hits render nothing and leave ``output_size`` unknown (0).
+        """
         self.performance_optimizer.record_render(
-            render_context.template_name, performance_metrics
+            render_context.template_name,
+            PerformanceMetrics(
+                render_time=render_time,
+                cache_hit=cache_hit,
+                template_size=output_size,
+                context_size=context_size,
+                fragment_count=1 if render_context.fragment_name else 0,
+                memory_usage=0,
+                concurrent_renders=1,
+            ),
         )
 
-        return result
-
     async def _validate_before_render(
         self, render_context: RenderContext
     ) -> TemplateValidationResult:
@@ -314,13 +468,15 @@ class AsyncTemplateRenderer:
 
     def _check_memory_cache(self, render_context: RenderContext) -> RenderResult | None:
         """Check memory cache for cached result."""
-        cache_key = render_context.cache_key
-        if cache_key in self._render_cache:
-            content, timestamp = self._render_cache[cache_key]
-            if time.time() - timestamp < render_context.cache_ttl:
-                return RenderResult(content=content, cache_hit=True)
-            else:
-                del self._render_cache[cache_key]
+        if render_context.cache_key is None:
+            return None
+        content = self._render_cache.get(
+            render_context.cache_key,
+            # Expired output stays around as the fallback for budgeted renders.
+            keep_stale=render_context.render_budget is not None,
+        )
+        if content is not None:
+            return RenderResult(content=content, cache_hit=True)
 
         return None
 
@@ -380,11 +536,9 @@ class AsyncTemplateRenderer:
         template = self.base_templates.app.env.get_template(
             render_context.template_name
         )
-        # render_block exists in Jinja2 runtime but not in type stubs
-        rendered = template.render_block(
-            render_context.block_name, render_context.context
+        return await render_block_async(
+            template, render_context.block_name, render_context.context
         )
-        return t.cast(str, rendered)
 
     async def _render_htmx(self, render_context: RenderContext) -> str:
         """Render template optimized for HTMX responses."""
@@ -422,8 +576,21 @@ class AsyncTemplateRenderer:
         self, template: t.Any, render_context: RenderContext
     ) -> AsyncIterator[str]:
         """Internal async generator for streaming template chunks."""
+        if render_context.deferred_blocks:
+            # Out-of-band swaps are applied by htmx only.
+            request = render_context.request
+            chunks = stream_deferred_blocks(
+                template,
+                render_context.context,
+                render_context.deferred_blocks,
+                render_context.deferred_placeholder,
+                out_of_order=request is not None
+                and request.headers.get("HX-Request") == "true",
+            )
+        else:
+            chunks = template.generate_async(render_context.context)
         # Generate template content in chunks
-        async for chunk in template.generate_async(render_context.context):
+        async for chunk in chunks:
             # Yield chunks of specified size
             if len(chunk) > render_context.chunk_size:
                 for i in range(0, len(chunk), render_context.chunk_size):
@@ -437,31 +604,38 @@ class AsyncTemplateRenderer:
         """Cache the rendered result."""
         if not render_context.cache_key or not isinstance(result.content, str):
             return
+        ttl = render_context.cache_ttl
+        if ttl is None:
+            ttl = self.performance_optimizer.get_optimal_cache_ttl(
+                render_context.template_name
+            )
 
         if self.cache_strategy in (CacheStrategy.MEMORY, CacheStrategy.HYBRID):
-            self._render_cache[render_context.cache_key] = (result.content, time.time())
+            self._render_cache.set(
+                render_context.cache_key,
+                result.content,
+                ttl,
+                render_context.template_name,
+                compute_time=result.render_time,
+            )
 
         if self.cache_strategy in (CacheStrategy.REDIS, CacheStrategy.HYBRID):
+            self._redis_keys[render_context.cache_key] = render_context.template_name
+            self._redis_keys.move_to_end(render_context.cache_key)
+            if len(self._redis_keys) > self._render_cache.max_entries:
+                self._redis_keys.popitem(last=False)
             with suppress(Exception):
                 cache = await depends.resolve("fastblocks", "cache")
                 if cache:
                     await cache.set(
                         render_context.cache_key,
                         result.content,
-                        ttl=render_context.cache_ttl,
+                        ttl=round(jittered_ttl(ttl, self.CACHE_TTL_JITTER)),
                     )
 
     def _track_performance(self, template_name: str, render_time: float) -> None:
         """Track rendering performance metrics."""
-        if template_name not in self._performance_metrics:
-            self._performance_metrics[template_name] = []
-
-        metrics = self._performance_metrics[template_name]
-        metrics.append(render_time)
-
-        # Keep only last 100 measurements
-        if len(metrics) > 100:
-            metrics.pop(0)
+        self._performance_metrics.record(template_name, render_time)
 
     def _create_error_result(
         self,
@@ -534,10 +708,13 @@ class AsyncTemplateRenderer:
 
         # Handle streaming responses
         if isinstance(result.content, AsyncIterator):
+            headers = result.headers
+            if render_context.deferred_blocks:
+                headers = _with_vary(headers, "HX-Request")
             return StreamingResponse(
                 result.content,
                 status_code=result.status_code,
-                headers=result.headers,
+                headers=headers,
                 media_type=result.content_type,
             )
 
@@ -579,28 +756,27 @@ class AsyncTemplateRenderer:
         self, template_name: str | None = None
     ) -> dict[str, t.Any]:
         """Get performance metrics for templates."""
-        if template_name and template_name in self._performance_metrics:
-            metrics = self._performance_metrics[template_name]
+        stats = self._performance_metrics.get(template_name) if template_name else None
+        if template_name and stats is not None:
             return {
                 "template": template_name,
-                "avg_render_time": sum(metrics) / len(metrics),
-                "min_render_time": min(metrics),
-                "max_render_time": max(metrics),
-                "render_count": len(metrics),
-                "recent_times": metrics[-10:],  # Last 10 renders
+                **stats.summary(),
+                "recent_times": list(stats.recent),  # Last 10 renders
             }
 
         # Return aggregate metrics
-        all_metrics = {}
-        for tmpl_name, times in self._performance_metrics.items():
-            all_metrics[tmpl_name] = {
-                "avg_render_time": sum(times) / len(times),
-                "min_render_time": min(times),
-                "max_render_time": max(times),
-                "render_count": len(times),
-            }
+        return {
+            tmpl_name: tmpl_stats.summary()
+            for tmpl_name, tmpl_stats in self._performance_metrics.items()
+        }
 
-        return all_metrics
+    def get_cache_stats(self) -> dict[str, int]:
+        """Get size, hit and eviction counters of the in-memory render cache."""
+        return self._render_cache.stats()
+
+    def get_budget_stats(self) -> dict[str, int]:
+        """Count renders that overran their budget, by what was served."""
+        return self._budget_overruns | {"exceeded": sum(self._budget_overruns.values())}
 
     async def get_performance_stats(self) -> dict[str, t.Any]:
         """Get comprehensive performance statistics from the optimizer."""
@@ -619,6 +795,10 @@ class AsyncTemplateRenderer:
         """Get performance optimization recommendations."""
         return self.performance_optimizer.get_optimization_recommendations()
 
+    def explain_decisions(self, template_name: str) -> dict[str, t.Any] | None:
+        """Streaming and cache TTL decisions for ``template_name``, and why."""
+        return self.performance_optimizer.explain(template_name)
+
     async def export_performance_metrics(self) -> dict[str, t.Any]:
         """Export comprehensive performance metrics for monitoring."""
         return self.performance_optimizer.export_metrics()
@@ -626,13 +806,70 @@ class AsyncTemplateRenderer:
     def clear_cache(self, template_pattern: str | None = None) -> None:
         """Clear render cache, optionally for specific template pattern."""
         if template_pattern:
-            keys_to_remove = [
-                key for key in self._render_cache.keys() if template_pattern in key
-            ]
-            for key in keys_to_remove:
-                del self._render_cache[key]
+            for key in self._render_cache:
+                if template_pattern in key:
+                    self._render_cache.pop(key)
         else:
             self._render_cache.clear()
+            self._redis_keys.clear()
+
+    async def invalidate_templates(self, template_names: t.Iterable[str]) -> int:
+        """Drop cached renders of exactly ``template_names``.
+
+        Returns:
+            Number of cache keys dropped.
+        """
+        names = set(template_names)
+        keys = set(self._render_cache.invalidate_templates(names))
+        redis_keys = [k for k, name in self._redis_keys.items() if name in names]
+        await self._delete_redis_keys(redis_keys)
+        return len(keys.union(redis_keys))
+
+    async def invalidate_cache_prefixes(self, prefixes: t.Iterable[str]) -> int:
+        """Drop cached renders whose keys start with ``<prefix>:``.
+
+        Block renders are cached under ``block:<block id>:<fingerprint>``,
+        so ``block:<block id>`` drops every cached context of one block.
+
+        Returns:
+            Number of cache keys dropped.
+        """
+        prefixes = set(prefixes)
+        keys = set(self._render_cache.invalidate_prefixes(prefixes))
+        redis_keys = [k for k in self._redis_keys if key_prefix(k) in prefixes]
+        await self._delete_redis_keys(redis_keys)
+        return len(keys.union(redis_keys))
+
+    async def _delete_redis_keys(self, keys: list[str]) -> None:
+        """Forget ``keys`` and delete them from Redis in one concurrent batch."""
+        for key in keys:
+            del self._redis_keys[key]
+        if keys:
+            with suppress(Exception):
+                cache = await depends.resolve("fastblocks", "cache")
+                if cache:
+                    await asyncio.gather(
+                        *(cache.delete(key) for key in keys), return_exceptions=True
+                    )
+
+    async def invalidate_template(self, template_name: str) -> set[str]:
+        """Invalidate a changed template and everything that depends on it.
+
+        Template, bytecode and source caches are cleared through the
+        dependency graph of ``base_templates``; rendered output of the same
+        templates is dropped here.
+        """
+        affected = {template_name}
+        if self.base_templates is not None:
+            affected = await self.base_templates.invalidate_template(template_name)
+        await self.invalidate_templates(affected)
+        return affected
+
+    def _listen_for_changes(self) -> None:
+        """Drop rendered output when ``base_templates`` sees a template change."""
+        listeners = getattr(self.base_templates, "change_listeners", None)
+        if listeners is not None and self.invalidate_templates not in listeners:
+            listeners.append(self.invalidate_templates)
 
     async def watch_template_changes(self, template_name: str) -> bool:
         """Check if template has changed since last render."""
@@ -651,6 +888,7 @@ class AsyncTemplateRenderer:
                         last_mtime = self._template_watchers[template_name]
                         if current_mtime > last_mtime:
                             self._template_watchers[template_name] = current_mtime
+                            await self.invalidate_template(template_name)
                             return True
                     else:
                         self._template_watchers[template_name] = current_mtime
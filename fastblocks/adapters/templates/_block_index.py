@@ -0,0 +1,127 @@
+"""Persisted index of the blocks discovered in each template.
+
+``BlockRenderer`` discovers a template's blocks by parsing its source. The
+results are kept here keyed by a checksum of that source and written to a
+JSON file, so after a restart a template whose source is unchanged has its
+blocks registered from the index without being parsed again. A template
+whose checksum differs is parsed and its entry replaced. Templates found
+lazily are written in batches (see ``save_due``) rather than one by one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+import typing as t
+from contextlib import suppress
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+BLOCK_INDEX_FORMAT_VERSION = 1
+
+
+def source_checksum(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class IndexedBlock:
+    """What discovery records about one block of a template."""
+
+    block_name: str
+    variables: list[str] = field(default_factory=list)
+    htmx_attrs: dict[str, str] = field(default_factory=dict)
+    parent_template: str | None = None
+
+
+class BlockIndex:
+    """Template name -> (source checksum, discovered blocks)."""
+
+    # Minimum seconds between saves requested through ``save_due``.
+    SAVE_INTERVAL: float = 30.0
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self.path = Path(path) if path else None
+        self._entries: dict[str, tuple[str, list[IndexedBlock]]] = {}
+        self.dirty = False
+        self._last_save = time.monotonic()
+
+    def __contains__(self, template_name: object) -> bool:
+        return template_name in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, template_name: str, checksum: str) -> list[IndexedBlock] | None:
+        """Indexed blocks of ``template_name`` if its source is unchanged."""
+        entry = self._entries.get(template_name)
+        if entry is None or entry[0] != checksum:
+            return None
+        return entry[1]
+
+    def put(
+        self, template_name: str, checksum: str, blocks: list[IndexedBlock]
+    ) -> None:
+        self._entries[template_name] = (checksum, blocks)
+        self.dirty = True
+
+    @property
+    def save_due(self) -> bool:
+        """Whether entries changed and ``SAVE_INTERVAL`` has passed."""
+        return self.dirty and time.monotonic() - self._last_save >= self.SAVE_INTERVAL
+
+    async def load(self) -> None:
+        """Read the index file; a missing or unreadable file leaves it empty."""
+        if self.path is None:
+            return
+        with suppress(OSError, ValueError, TypeError, KeyError):
+            data = json.loads(await asyncio.to_thread(self.path.read_text))
+            if data.get("format") != BLOCK_INDEX_FORMAT_VERSION:
+                return
+            self._entries = {
+                name: (
+                    entry["checksum"],
+                    [IndexedBlock(**block) for block in entry["blocks"]],
+                )
+                for name, entry in data["templates"].items()
+            }
+            self.dirty = False
+
+    async def save(self) -> None:
+        """Write the index if it changed since it was loaded or saved."""
+        self._last_save = time.monotonic()
+        if self.path is None or not self.dirty:
+            return
+        data: dict[str, t.Any] = {
+            "format": BLOCK_INDEX_FORMAT_VERSION,
+            "templates": {
+                name: {
+                    "checksum": checksum,
+                    "blocks": [asdict(block) for block in blocks],
+                }
+                for name, (checksum, blocks) in self._entries.items()
+            },
+        }
+        with suppress(OSError):
+            await asyncio.to_thread(self._write, self.path, json.dumps(data))
+            self.dirty = False
+
+    @staticmethod
+    def _write(path: Path, text: str) -> None:
+        # Write then rename so a concurrent reader never sees a partial file.
+        # The temporary name is unique, so concurrent writers (several
+        # workers sharing the file) never write to the same one.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+                tmp_file.write(text)
+            os.replace(tmp_name, path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp_name)
+            raise
@@ -21,6 +21,7 @@ import typing as t
 from contextlib import suppress
 from dataclasses import dataclass, field
 from enum import Enum
+from pathlib import Path
 from uuid import UUID
 
 # Oneiric imports
@@ -40,12 +41,14 @@ class AdapterStatus:
 # Oneiric resolver for dependency injection
 depends = Resolver()
 from jinja2 import Environment, meta
-from jinja2.nodes import Block, Extends, Include
+from jinja2.nodes import Block, Extends, Include, Template
 from starlette.requests import Request
 from starlette.responses import HTMLResponse
 
 from ._advanced_manager import HybridTemplatesManager
 from ._async_renderer import AsyncTemplateRenderer, RenderContext, RenderMode
+from ._block_index import BlockIndex, IndexedBlock, source_checksum
+from ._fingerprint import UnfingerprintableError, context_fingerprint
 
 
 class BlockUpdateMode(Enum):
@@ -83,7 +86,15 @@ class BlockDefinition:
     update_mode: BlockUpdateMode = BlockUpdateMode.REPLACE
     trigger: BlockTrigger = BlockTrigger.MANUAL
     cache_key: str | None = None
-    cache_ttl: int = 300
+    # None uses the optimizer's TTL for the template.
+    cache_ttl: int | None = None
+    # Context keys the block output depends on; None fingerprints the whole
+    # context for the render cache key.
+    cache_context_keys: set[str] | None = None
+    # Seconds the block may take to render; when exceeded its last cached
+    # output, or else ``budget_placeholder``, is served instead.
+    render_budget: float | None = None
+    budget_placeholder: str | None = None
     htmx_attrs: dict[str, str] = field(default_factory=dict)
     css_selector: str | None = None
     auto_refresh: int | None = None  # Refresh interval in seconds
@@ -100,6 +111,8 @@ class BlockRenderRequest:
     update_mode: BlockUpdateMode = BlockUpdateMode.REPLACE
     headers: dict[str, str] = field(default_factory=dict)
     validate: bool = False
+    # Overrides BlockDefinition.render_budget for this render.
+    render_budget: float | None = None
 
 
 @dataclass
@@ -114,6 +127,7 @@ class BlockRenderResult:
     cache_hit: bool = False
     render_time: float = 0.0
     dependencies: list[str] = field(default_factory=list)
+    budget_exceeded: bool = False
 
 
 class BlockRegistry:
@@ -123,10 +137,23 @@ class BlockRegistry:
         self._blocks: dict[str, BlockDefinition] = {}
         self._block_hierarchy: dict[str, list[str]] = {}
         self._template_blocks: dict[str, list[str]] = {}
+        # Block name -> block ids, in registration order.
+        self._blocks_by_name: dict[str, list[str]] = {}
+        # Reverse of BlockDefinition.dependencies: block id -> dependent ids.
+        self._dependents: dict[str, set[str]] = {}
+        # Fragment name -> block id found by a partial-name lookup.
+        self._partial_matches: dict[str, str | None] = {}
 
     def register_block(self, block_def: BlockDefinition) -> None:
         """Register a block definition."""
         self._blocks[block_def.name] = block_def
+        self._partial_matches.clear()
+        if block_def.block_name:
+            block_ids = self._blocks_by_name.setdefault(block_def.block_name, [])
+            if block_def.name not in block_ids:
+                block_ids.append(block_def.name)
+        for dependency in block_def.dependencies:
+            self._dependents.setdefault(dependency, set()).add(block_def.name)
 
         # Track blocks by template
         if block_def.template_name not in self._template_blocks:
@@ -139,10 +166,55 @@ class BlockRegistry:
                 self._block_hierarchy[block_def.parent_template] = []
             self._block_hierarchy[block_def.parent_template].append(block_def.name)
 
+    def unregister_block(self, block_id: str) -> None:
+        """Remove a block definition registered with ``register_block``."""
+        block_def = self._blocks.pop(block_id, None)
+        if block_def is None:
+            return
+        self._partial_matches.clear()
+        for index, key in (
+            (self._blocks_by_name, block_def.block_name),
+            (self._template_blocks, block_def.template_name),
+            (self._block_hierarchy, block_def.parent_template),
+        ):
+            block_ids = index.get(key) if key else None
+            if block_ids is not None:
+                block_ids[:] = [i for i in block_ids if i != block_id]
+                if not block_ids:
+                    del index[key]
+        for dependency in block_def.dependencies:
+            self._dependents.get(dependency, set()).discard(block_id)
+
     def get_block(self, block_id: str) -> BlockDefinition | None:
         """Get block definition by ID."""
         return self._blocks.get(block_id)
 
+    def find_fragment(self, fragment_name: str) -> BlockDefinition | None:
+        """Find the block for a fragment by block id, then by block name.
+
+        Falls back to the first block whose block or template name contains
+        ``fragment_name``, looked up in the name indexes and remembered
+        until the next registration.
+        """
+        block_def = self._blocks.get(fragment_name)
+        if block_def is not None:
+            return block_def
+        for block_id in self._blocks_by_name.get(fragment_name, ()):
+            block_def = self._blocks.get(block_id)
+            if block_def is not None and block_def.block_name == fragment_name:
+                return block_def
+        if fragment_name not in self._partial_matches:
+            self._partial_matches[fragment_name] = self._find_partial(fragment_name)
+        block_id = self._partial_matches[fragment_name]
+        return None if block_id is None else self._blocks.get(block_id)
+
+    def _find_partial(self, fragment_name: str) -> str | None:
+        for index in (self._blocks_by_name, self._template_blocks):
+            for name, block_ids in index.items():
+                if fragment_name in name and block_ids:
+                    return block_ids[0]
+        return None
+
     def get_blocks_for_template(self, template_name: str) -> list[BlockDefinition]:
         """Get all blocks for a template."""
         block_ids = self._template_blocks.get(template_name, [])
@@ -157,6 +229,29 @@ class BlockRegistry:
             self._blocks[block_id] for block_id in child_ids if block_id in self._blocks
         ]
 
+    def get_dependents(self, block_id: str) -> set[str]:
+        """Blocks that depend on ``block_id`` directly.
+
+        That is blocks listing it in ``dependencies`` and blocks of templates
+        extending or including the template that defines it.
+        """
+        dependents = set(self._dependents.get(block_id, ()))
+        block_def = self._blocks.get(block_id)
+        if block_def is not None:
+            dependents.update(self._block_hierarchy.get(block_def.template_name, ()))
+        return dependents
+
+    def affected_by(self, block_ids: t.Iterable[str]) -> set[str]:
+        """All blocks depending on ``block_ids``, transitively, in one traversal."""
+        affected: set[str] = set()
+        pending = list(block_ids)
+        while pending:
+            for dependent in self.get_dependents(pending.pop()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    pending.append(dependent)
+        return affected
+
     def list_blocks(self) -> list[BlockDefinition]:
         """List all registered blocks."""
         return list(self._blocks.values())
@@ -166,26 +261,47 @@ class BlockRegistry:
         self._blocks.clear()
         self._block_hierarchy.clear()
         self._template_blocks.clear()
+        self._blocks_by_name.clear()
+        self._dependents.clear()
+        self._partial_matches.clear()
 
 
 class BlockRenderer:
     """Specialized renderer for template blocks and fragments."""
 
+    # Fragments of one composition rendered at the same time.
+    MAX_CONCURRENT_FRAGMENTS: int = 8
+
     def __init__(
         self,
         async_renderer: AsyncTemplateRenderer | None = None,
         hybrid_manager: HybridTemplatesManager | None = None,
+        max_concurrent_fragments: int | None = None,
+        block_index_path: str | Path | None = None,
     ) -> None:
         self.async_renderer = async_renderer
         self.hybrid_manager = hybrid_manager
+        self.max_concurrent_fragments = (
+            max_concurrent_fragments or self.MAX_CONCURRENT_FRAGMENTS
+        )
         self.registry = BlockRegistry()
-        self._render_cache: dict[str, tuple[str, float]] = {}
+        # Blocks are discovered per template on first use (see
+        # ensure_template_blocks) and cached in a persisted BlockIndex.
+        self._block_index_path = block_index_path
+        self._block_index: BlockIndex | None = None
+        self._discoveries: dict[str, asyncio.Future[bool]] = {}
+        # Template name -> ids of the blocks its discovery registered.
+        self._discovered_blocks: dict[str, list[str]] = {}
+        self._full_discovery: asyncio.Future[None] | None = None
+        self._discovered_all = False
+        self._listen_for_changes()
 
     async def initialize(self) -> None:
         """Initialize the block renderer."""
         if not self.async_renderer:
             self.async_renderer = AsyncTemplateRenderer()
             await self.async_renderer.initialize()
+            self._listen_for_changes()
 
         if not self.hybrid_manager:
             try:
@@ -196,64 +312,198 @@ class BlockRenderer:
                 self.hybrid_manager = HybridTemplatesManager()
                 await self.hybrid_manager.initialize()
 
-        # Auto-discover blocks from templates
-        await self._discover_blocks()
-
-    async def _discover_blocks(self) -> None:
-        """Auto-discover blocks from template files."""
-        if not self.async_renderer or not self.async_renderer.base_templates:
-            return
+    def _listen_for_changes(self) -> None:
+        """Rediscover the blocks of templates whose source changed."""
+        base_templates = getattr(self.async_renderer, "base_templates", None)
+        listeners = getattr(base_templates, "change_listeners", None)
+        if isinstance(listeners, list) and self.forget_templates not in listeners:
+            listeners.append(self.forget_templates)
+
+    async def forget_templates(self, template_names: t.Iterable[str]) -> None:
+        """Drop discovered blocks of ``template_names``; next use rediscovers."""
+        for template_name in template_names:
+            self._discoveries.pop(template_name, None)
+            block_ids = self._discovered_blocks.pop(template_name, ())
+            for block_id in block_ids:
+                self.registry.unregister_block(block_id)
+            self._discovered_all = False
+            self._full_discovery = None
+
+    def _template_env(self) -> Environment | None:
+        base_templates = getattr(self.async_renderer, "base_templates", None)
+        env = getattr(getattr(base_templates, "app", None), "env", None)
+        return env if getattr(env, "loader", None) is not None else None
+
+    async def _get_block_index(self) -> BlockIndex:
+        if self._block_index is None:
+            path = self._block_index_path
+            if path is None:
+                base_templates = getattr(self.async_renderer, "base_templates", None)
+                config = getattr(base_templates, "config", None)
+                settings = getattr(config, "templates", None)
+                configured = getattr(settings, "block_index", None)
+                path = configured if isinstance(configured, str) else None
+            self._block_index = BlockIndex(path)
+            await self._block_index.load()
+        return self._block_index
+
+    async def ensure_template_blocks(self, template_name: str) -> list[BlockDefinition]:
+        """Discover the blocks of ``template_name`` on first use.
+
+        Concurrent callers share one discovery; later calls return at once
+        until the template changes. A discovery that failed, or ran before
+        the environment existed, is tried again by the next call.
+        """
+        await asyncio.shield(self._discovery(template_name))
+        return self.registry.get_blocks_for_template(template_name)
+
+    def _discovery(self, template_name: str, save: bool = True) -> asyncio.Future[bool]:
+        discovery = self._discoveries.get(template_name)
+        if discovery is None:
+            discovery = self._discoveries[template_name] = asyncio.ensure_future(
+                self._discover_template(template_name, save)
+            )
+            discovery.add_done_callback(
+                lambda done: self._forget_failed(template_name, done)
+            )
+        return discovery
 
-        env = self.async_renderer.base_templates.app.env  # type: ignore[union-attr]
-        if not env.loader:
+    def _forget_failed(
+        self, template_name: str, discovery: asyncio.Future[bool]
+    ) -> None:
+        if (
+            discovery.cancelled()
+            or discovery.exception() is not None
+            or not discovery.result()
+        ) and self._discoveries.get(template_name) is discovery:
+            del self._discoveries[template_name]
+
+    async def _discover_template(self, template_name: str, save: bool = True) -> bool:
+        """Register the blocks of ``template_name``; False if that failed."""
+        env = self._template_env()
+        if env is None:
+            return False
+        if not await self._analyze_template_blocks(template_name, env):
+            return False
+        if save:
+            index = await self._get_block_index()
+            if index.save_due:
+                await index.save()
+        return True
+
+    async def shutdown(self) -> None:
+        """Write blocks discovered since the block index was last saved."""
+        if self._block_index is not None:
+            await self._block_index.save()
+
+    async def discover_blocks(self) -> None:
+        """Discover the blocks of every template the loader lists.
+
+        Not needed for rendering, which discovers templates lazily; useful
+        for tooling that lists all blocks. Concurrent callers share one
+        discovery, which waits for templates already being discovered and
+        writes the block index once.
+        """
+        env = self._template_env()
+        if env is None:
             return
+        if self._full_discovery is None:
+            self._full_discovery = asyncio.ensure_future(self._discover_all(env))
+        await asyncio.shield(self._full_discovery)
 
+    async def _discover_all(self, env: Environment) -> None:
         with suppress(Exception):
-            template_names = await asyncio.get_event_loop().run_in_executor(
-                None, env.loader.list_templates
-            )
-
+            loader = t.cast(t.Any, env.loader)
+            if hasattr(loader, "list_templates_async"):
+                template_names = await loader.list_templates_async()
+            else:
+                template_names = await asyncio.to_thread(loader.list_templates)
             for template_name in template_names:
-                await self._analyze_template_blocks(template_name, env)
+                await asyncio.shield(self._discovery(template_name, save=False))
+        self._discovered_all = True
+        await (await self._get_block_index()).save()
 
     async def _analyze_template_blocks(
         self, template_name: str, env: Environment
-    ) -> None:
-        """Analyze template and register its blocks."""
+    ) -> bool:
+        """Register the blocks of a template; False if it cannot be read.
+
+        The template is parsed only if its source changed since it was last
+        indexed.
+        """
         with suppress(Exception):
-            source, _, _ = env.loader.get_source(env, template_name)  # type: ignore[union-attr]
-            parsed = env.parse(source, template_name)
-
-            # Find all block nodes
-            for node in parsed.find_all(Block):
-                block_def = BlockDefinition(
-                    name=f"{template_name}:{node.name}",
-                    template_name=template_name,
-                    block_name=node.name,
-                    css_selector=f"#{node.name.replace('_', '-')}",
+            loader = t.cast(t.Any, env.loader)
+            if hasattr(loader, "get_source_async"):
+                source, _, _ = await loader.get_source_async(env, template_name)
+            else:
+                source, _, _ = await asyncio.to_thread(
+                    loader.get_source, env, template_name
                 )
-
-                # Extract variables used in this block
-                # find_undeclared_variables accepts Block nodes at runtime
-                block_def.variables = meta.find_undeclared_variables(
-                    t.cast(t.Any, node)
+            if isinstance(source, bytes):
+                source = source.decode()
+
+            index = await self._get_block_index()
+            checksum = source_checksum(source)
+            blocks = index.get(template_name, checksum)
+            if blocks is None:
+                blocks = self._parse_template_blocks(template_name, source, env)
+                index.put(template_name, checksum, blocks)
+
+            discovered = self._discovered_blocks.setdefault(template_name, [])
+            for block in blocks:
+                block_id = f"{template_name}:{block.block_name}"
+                if self.registry.get_block(block_id) is not None:
+                    continue
+                discovered.append(block_id)
+                self.registry.register_block(
+                    BlockDefinition(
+                        name=block_id,
+                        template_name=template_name,
+                        block_name=block.block_name,
+                        parent_template=block.parent_template,
+                        variables=set(block.variables),
+                        htmx_attrs=dict(block.htmx_attrs),
+                        css_selector=f"#{block.block_name.replace('_', '-')}",
+                    )
                 )
+            return True
+        return False
+
+    def _parse_template_blocks(
+        self, template_name: str, source: str, env: Environment
+    ) -> list[IndexedBlock]:
+        """Parse a template and describe its blocks."""
+        parsed = env.parse(source, template_name)
+
+        # Last extended or included template, recorded as the blocks' parent
+        parent_template = None
+        for node in t.cast(t.Any, parsed.find_all((Extends, Include))):
+            # Template attribute value extraction at runtime
+            if hasattr(node, "template") and hasattr(node.template, "value"):
+                parent_template = node.template.value
 
-                # Check for HTMX attributes in block content
-                block_def.htmx_attrs = self._extract_htmx_attrs(source, node.name)
-
-                self.registry.register_block(block_def)
+        return [
+            IndexedBlock(
+                block_name=node.name,
+                # find_undeclared_variables needs a Template root node
+                variables=sorted(
+                    meta.find_undeclared_variables(
+                        Template(node.body).set_environment(env)
+                    )
+                ),
+                htmx_attrs=self._extract_htmx_attrs(source, node.name),
+                parent_template=parent_template,
+            )
+            for node in parsed.find_all(Block)
+        ]
 
-            # Find extends and includes for hierarchy
-            for node in t.cast(t.Any, parsed.find_all((Extends, Include))):
-                # Template attribute value extraction at runtime
-                if hasattr(node, "template") and hasattr(node.template, "value"):
-                    parent_template = node.template.value
-                    # Register dependency relationship
-                    for block_def in self.registry.get_blocks_for_template(
-                        template_name
-                    ):
-                        block_def.parent_template = parent_template
+    async def _get_block_lazily(self, block_id: str) -> BlockDefinition | None:
+        """Look up a block, discovering its template (``template:block``)."""
+        block_def = self.registry.get_block(block_id)
+        if block_def is None and ":" in block_id:
+            await self.ensure_template_blocks(block_id.rpartition(":")[0])
+            block_def = self.registry.get_block(block_id)
+        return block_def
 
     def _extract_htmx_attrs(self, source: str, block_name: str) -> dict[str, str]:
         """Extract HTMX attributes from block content."""
@@ -299,10 +549,18 @@ class BlockRenderer:
 
         start_time = time.time()
 
-        block_def = self.registry.get_block(request.block_id)
+        block_def = await self._get_block_lazily(request.block_id)
         if not block_def:
             raise ValueError(f"Block '{request.block_id}' not found")
 
+        # Contexts that cannot be fingerprinted render uncached.
+        cache_key = None
+        with suppress(UnfingerprintableError):
+            fingerprint = context_fingerprint(
+                request.context, block_def.cache_context_keys, request.request
+            )
+            cache_key = f"block:{request.block_id}:{fingerprint.digest}"
+
         # Build render context
         render_context = RenderContext(
             template_name=block_def.template_name,
@@ -311,8 +569,14 @@ class BlockRenderer:
             mode=RenderMode.BLOCK,
             block_name=block_def.block_name,
             validate_template=request.validate,
-            cache_key=f"block:{request.block_id}:{hash(str(request.context))}",
+            cache_key=cache_key,
             cache_ttl=block_def.cache_ttl,
+            render_budget=(
+                block_def.render_budget
+                if request.render_budget is None
+                else request.render_budget
+            ),
+            budget_placeholder=block_def.budget_placeholder,
         )
 
         # Render the block
@@ -330,6 +594,7 @@ class BlockRenderer:
             cache_hit=result.cache_hit,
             render_time=time.time() - start_time,
             dependencies=list(block_def.dependencies),
+            budget_exceeded=result.budget_exceeded,
         )
 
     def _build_htmx_headers(
@@ -375,35 +640,34 @@ class BlockRenderer:
         context: dict[str, t.Any] | None = None,
         request: Request | None = None,
     ) -> HTMLResponse:
-        """Render a composition of multiple fragments."""
+        """Render a composition of multiple fragments.
+
+        Fragments render concurrently, at most ``max_concurrent_fragments``
+        at a time, and are joined in the order given. Fragments without a
+        registered block are skipped; failed ones become an HTML comment.
+        """
         if not context:
             context = {}
 
-        rendered_fragments = []
+        semaphore = asyncio.Semaphore(self.max_concurrent_fragments)
 
-        for fragment_name in fragments:
+        async def render_fragment(fragment_name: str) -> str | None:
+            block_def = await self._find_fragment_lazily(fragment_name)
+            if block_def is None:
+                return None
             try:
-                # Find block definition for this fragment
-                matching_blocks = [
-                    block
-                    for block in self.registry.list_blocks()
-                    if fragment_name in block.name or block.block_name == fragment_name
-                ]
-
-                if matching_blocks:
-                    block_def = matching_blocks[0]
-                    request_obj = BlockRenderRequest(
-                        block_id=block_def.name, context=context, request=request
+                async with semaphore:
+                    result = await self.render_block(
+                        BlockRenderRequest(
+                            block_id=block_def.name, context=context, request=request
+                        )
                     )
-
-                    result = await self.render_block(request_obj)
-                    rendered_fragments.append(result.content)
-
             except Exception:
-                # Skip failed fragments but continue with others
-                rendered_fragments.append(
-                    f"<!-- Fragment {fragment_name} failed to render -->"
-                )
+                return f"<!-- Fragment {fragment_name} failed to render -->"
+            return result.content
+
+        results = await asyncio.gather(*map(render_fragment, fragments))
+        rendered_fragments = [content for content in results if content is not None]
 
         # Combine all fragments
         combined_content = "\n".join(rendered_fragments)
@@ -412,9 +676,23 @@ class BlockRenderer:
             content=combined_content, headers={"HX-Composition": composition_name}
         )
 
+    async def _find_fragment_lazily(self, fragment_name: str) -> BlockDefinition | None:
+        """Find a fragment's block, discovering templates as needed.
+
+        A ``template:block`` id discovers just that template; a bare block
+        name can live in any template, so it triggers a full discovery once.
+        """
+        block_def = self.registry.find_fragment(fragment_name)
+        if block_def is None and ":" in fragment_name:
+            block_def = await self._get_block_lazily(fragment_name)
+        if block_def is None and not self._discovered_all:
+            await self.discover_blocks()
+            block_def = self.registry.find_fragment(fragment_name)
+        return block_def
+
     async def get_block_dependencies(self, block_id: str) -> list[str]:
         """Get dependencies for a block (other blocks it depends on)."""
-        block_def = self.registry.get_block(block_id)
+        block_def = await self._get_block_lazily(block_id)
         if not block_def:
             return []
 
@@ -429,35 +707,45 @@ class BlockRenderer:
 
         # Add parent template dependencies
         if block_def.parent_template:
-            parent_blocks = self.registry.get_blocks_for_template(
-                block_def.parent_template
-            )
+            parent_blocks = await self.ensure_template_blocks(block_def.parent_template)
             dependencies.extend([block.name for block in parent_blocks])
 
         return dependencies
 
     async def invalidate_dependent_blocks(self, block_id: str) -> list[str]:
-        """Invalidate blocks that depend on the given block."""
-        invalidated = []
-
-        # Find blocks that depend on this one
-        for block_def in self.registry.list_blocks():
-            if (
-                block_id in block_def.dependencies
-                or block_id in await self.get_block_dependencies(block_def.name)
-            ):
-                # Clear cache for dependent block
-                cache_keys_to_remove = [
-                    key
-                    for key in self._render_cache.keys()
-                    if f"block:{block_def.name}" in key
-                ]
-                for key in cache_keys_to_remove:
-                    del self._render_cache[key]
-
-                invalidated.append(block_def.name)
-
-        return invalidated
+        """Invalidate blocks that depend on the given block.
+
+        The affected blocks come from one traversal of the registry's reverse
+        dependency index, plus the blocks of templates that include or extend
+        the block's template. Their cached renders are then dropped in one
+        batch.
+
+        Returns:
+            Ids of the invalidated blocks, sorted.
+        """
+        affected = self.registry.affected_by([block_id])
+
+        block_def = self.registry.get_block(block_id)
+        template_name = block_def.template_name if block_def else block_id
+        get_template_dependents = getattr(
+            self.hybrid_manager, "get_template_dependents", None
+        )
+        if get_template_dependents is not None:
+            with suppress(Exception):
+                for template in await get_template_dependents(template_name):
+                    affected.update(
+                        block.name
+                        for block in self.registry.get_blocks_for_template(template)
+                    )
+            affected |= self.registry.affected_by(affected)
+        affected.discard(block_id)
+
+        if affected and self.async_renderer is not None:
+            await self.async_renderer.invalidate_cache_prefixes(
+                f"block:{name}" for name in affected
+            )
+
+        return sorted(affected)
 
     def register_htmx_block(
         self,
@@ -559,7 +847,7 @@ class BlockRenderer:
 
     async def get_block_info(self, block_id: str) -> dict[str, t.Any]:
         """Get detailed information about a block."""
-        block_def = self.registry.get_block(block_id)
+        block_def = await self._get_block_lazily(block_id)
         if not block_def:
             return {}
 
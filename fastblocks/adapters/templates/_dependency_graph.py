@@ -0,0 +1,233 @@
+"""Template dependency graph for targeted invalidation and prefetch.
+
+Every template compiled by an environment is scanned for ``extends``,
+``include``, ``import`` and ``from ... import`` tags with constant template
+names. The edges are kept in both directions:
+
+- *dependencies* (parents, includes, imports) drive prefetching: when a child
+  template is requested, everything it pulls in is loaded concurrently
+  instead of being discovered one level at a time during rendering.
+- *dependents* drive invalidation: when a base layout changes, exactly the
+  templates that extend, include or import it (transitively) are dropped
+  from the template, bytecode, source and render caches.
+
+The graph is updated incrementally on each compile, so it covers templates
+from every loader in the chain without a separate scan. A template compiled
+again from different source has changed (a reload after its ``uptodate``
+check failed, or after a sync rewrote it), which is what triggers the
+invalidation. Templates served
+from a precompiled bundle or a warm bytecode cache are not parsed; their
+edges are filled in from source the first time they are prefetched.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import typing as t
+from collections.abc import Callable, Iterable
+from contextlib import suppress
+
+from jinja2 import nodes
+
+
+def extract_dependencies(ast: nodes.Template) -> set[str]:
+    """Return the template names a parsed template extends, includes or imports.
+
+    Only constant names are recorded; dynamic names (``[% extends layout %]``)
+    cannot be known before rendering and are left to the loader.
+    """
+    found: set[str] = set()
+    for node in ast.find_all(
+        (nodes.Extends, nodes.Include, nodes.Import, nodes.FromImport)
+    ):
+        found.update(_constant_names(node.template))  # type: ignore[attr-defined]
+    return found
+
+
+def _constant_names(expr: nodes.Expr) -> list[str]:
+    if isinstance(expr, nodes.Const) and isinstance(expr.value, str):
+        return [expr.value]
+    if isinstance(expr, nodes.Const) and isinstance(expr.value, list | tuple):
+        return [v for v in expr.value if isinstance(v, str)]
+    if isinstance(expr, nodes.List | nodes.Tuple):
+        return [
+            item.value
+            for item in expr.items
+            if isinstance(item, nodes.Const) and isinstance(item.value, str)
+        ]
+    return []
+
+
+class TemplateDependencyGraph:
+    """Bidirectional, incrementally maintained template dependency graph."""
+
+    def __init__(self) -> None:
+        self._dependencies: dict[str, set[str]] = {}
+        self._dependents: dict[str, set[str]] = {}
+        self._filenames: dict[str, str | None] = {}
+        self._digests: dict[str, bytes] = {}
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._dependencies
+
+    def __len__(self) -> int:
+        return len(self._dependencies)
+
+    def update(
+        self, name: str, dependencies: Iterable[str], filename: str | None = None
+    ) -> None:
+        """Replace the recorded dependencies of ``name``.
+
+        Edges that disappeared since the previous compile are removed, so a
+        template that stops extending a layout is no longer invalidated by it.
+        """
+        new = set(dependencies)
+        old = self._dependencies.get(name, set())
+        for parent in old - new:
+            children = self._dependents.get(parent)
+            if children is not None:
+                children.discard(name)
+                if not children:
+                    del self._dependents[parent]
+        for parent in new - old:
+            self._dependents.setdefault(parent, set()).add(name)
+        self._dependencies[name] = new
+        self._filenames[name] = filename
+
+    def discard(self, name: str) -> None:
+        """Forget ``name`` and its outgoing edges; dependents keep their edges."""
+        self.update(name, ())
+        del self._dependencies[name]
+        self._filenames.pop(name, None)
+        self._digests.pop(name, None)
+
+    def clear(self) -> None:
+        self._dependencies.clear()
+        self._dependents.clear()
+        self._filenames.clear()
+        self._digests.clear()
+
+    def record_source(self, name: str, source: str) -> bool:
+        """Remember a digest of ``name``'s source.
+
+        Returns:
+            True if a different source was recorded for ``name`` before.
+        """
+        digest = hashlib.blake2b(
+            source.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        previous = self._digests.get(name)
+        self._digests[name] = digest
+        return previous is not None and previous != digest
+
+    def filename(self, name: str) -> str | None:
+        """Filename the loader reported for ``name`` when it was last compiled."""
+        return self._filenames.get(name)
+
+    def dependencies(self, name: str) -> set[str]:
+        """Templates ``name`` extends, includes or imports directly."""
+        return set(self._dependencies.get(name, ()))
+
+    def dependents(self, name: str) -> set[str]:
+        """Templates that extend, include or import ``name`` directly."""
+        return set(self._dependents.get(name, ()))
+
+    def ancestors(self, name: str) -> set[str]:
+        """All templates ``name`` needs to render, transitively."""
+        return self._walk(name, self._dependencies)
+
+    def descendants(self, name: str) -> set[str]:
+        """All templates whose output depends on ``name``, transitively."""
+        return self._walk(name, self._dependents)
+
+    def affected_by(self, name: str) -> set[str]:
+        """``name`` plus its descendants: what a change to ``name`` invalidates."""
+        return self.descendants(name) | {name}
+
+    @staticmethod
+    def _walk(start: str, edges: dict[str, set[str]]) -> set[str]:
+        seen: set[str] = set()
+        pending = list(edges.get(start, ()))
+        while pending:
+            current = pending.pop()
+            if current in seen or current == start:
+                continue
+            seen.add(current)
+            pending.extend(edges.get(current, ()))
+        return seen
+
+
+def track_dependencies(
+    template_env: t.Any,
+    graph: TemplateDependencyGraph,
+    on_change: Callable[[str], t.Any] | None = None,
+) -> None:
+    """Record each template's dependencies in ``graph`` as it is parsed.
+
+    Wraps ``template_env._parse``, the single point every loader's compile
+    goes through, so the graph stays current across the whole loader chain.
+
+    Args:
+        template_env: Jinja2 Environment instance
+        graph: Graph to update
+        on_change: Called with the name of a template compiled again from
+            changed source
+    """
+    parse = template_env._parse
+
+    def _parse_and_track(source: str, name: t.Any, filename: t.Any) -> t.Any:
+        ast = parse(source, name, filename)
+        if isinstance(name, str):
+            changed = graph.record_source(name, source)
+            graph.update(name, extract_dependencies(ast), filename)
+            if changed and on_change is not None:
+                on_change(name)
+        return ast
+
+    template_env._parse = _parse_and_track
+
+
+async def _ensure_tracked(
+    template_env: t.Any, name: str, graph: TemplateDependencyGraph
+) -> None:
+    if name in graph or template_env.loader is None:
+        return
+    with suppress(Exception):
+        source, filename, _ = await template_env.loader.get_source_async(
+            template_env, name
+        )
+        if isinstance(source, bytes):
+            source = source.decode()
+        graph.record_source(name, source)
+        graph.update(name, extract_dependencies(template_env.parse(source)), filename)
+
+
+async def prefetch_dependencies(
+    template_env: t.Any, name: str, graph: TemplateDependencyGraph
+) -> t.Any:
+    """Load ``name`` and then everything it depends on, one level at a time.
+
+    Each level of parents and includes is fetched with a single
+    ``asyncio.gather``, so a child three layouts deep costs three concurrent
+    rounds instead of one sequential load per template during rendering.
+    Missing dependencies are ignored here and surface when rendering.
+
+    Returns:
+        The loaded template for ``name``.
+    """
+    template = await template_env.get_template_async(name)
+    await _ensure_tracked(template_env, name, graph)
+    seen = {name}
+    level = graph.dependencies(name) - seen
+    while level:
+        seen |= level
+        await asyncio.gather(
+            *(template_env.get_template_async(dep) for dep in level),
+            return_exceptions=True,
+        )
+        await asyncio.gather(
+            *(_ensure_tracked(template_env, dep, graph) for dep in level)
+        )
+        level = set().union(*(graph.dependencies(dep) for dep in level)) - seen
+    return template
@@ -5,6 +5,10 @@ This module provides advanced caching capabilities including:
 - Hierarchical cache invalidation with dependencies
 - Performance monitoring and analytics
 - Multi-tier caching with automatic promotion/demotion
+- zlib-compressed storage of rendered output in the COLD tier
+- TTL jitter and probabilistic early refresh (XFetch) of expiring entries
+- An optional shared-memory cache holding one copy of rendered output for
+  all worker processes of a host
 - Predictive cache preloading
 
 Requirements:
@@ -18,18 +22,30 @@ Created: 2025-01-12
 
 import asyncio
 import builtins
+import heapq
+import sys
 import time
-from collections import defaultdict, deque
-from collections.abc import Awaitable, Callable
+import zlib
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Awaitable, Callable, Iterable
 from contextlib import suppress
 from dataclasses import dataclass, field
 from enum import Enum
+from types import BuiltinFunctionType, CodeType, FunctionType, MethodType, ModuleType
 from typing import Any
 from uuid import UUID
 
+from jinja2 import Environment
+from markupsafe import Markup
+
 # Oneiric imports
 from oneiric.core.resolution import Resolver
 
+from ._access_trace import AccessTrace
+from ._frequency_sketch import FrequencySketch
+from ._render_cache import RenderTimeStats, jittered_ttl, refresh_early
+from ._shared_cache import SharedRenderCache
+
 # Oneiric resolver for dependency injection
 depends = Resolver()
 
@@ -39,10 +55,87 @@ class CacheTier(Enum):
 
     HOT = "hot"  # Frequently accessed, in-memory
     WARM = "warm"  # Moderately accessed, memory/redis hybrid
-    COLD = "cold"  # Rarely accessed, redis only
+    COLD = "cold"  # Rarely accessed, compressed in memory
     FROZEN = "frozen"  # Archive tier, slow but persistent
 
 
+# Tiers in eviction order: memory pressure evicts from the first non-empty
+# tier, least recently used entry first.
+EVICTION_ORDER = (CacheTier.FROZEN, CacheTier.COLD, CacheTier.WARM, CacheTier.HOT)
+
+
+# Objects referenced by cached values but owned elsewhere; their size is not
+# charged to the entry.
+SHARED_TYPES: tuple[type, ...] = (
+    type,
+    ModuleType,
+    BuiltinFunctionType,
+    MethodType,
+    Enum,
+    Environment,
+)
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None))
+# Values the COLD tier stores compressed: rendered output and raw bytes.
+# Other objects stay as they are, so their identity is preserved.
+_COMPRESSIBLE_TYPES = (str, Markup, bytes)
+
+
+def estimate_size(value: Any, max_objects: int = 10_000, max_items: int = 256) -> int:
+    """Approximate number of bytes ``value`` holds, following references.
+
+    Walks containers, instance attributes and function code objects. Each
+    object is counted once, so cycles and shared references are safe, and
+    ``SHARED_TYPES`` are not counted at all. The walk is bounded: at most
+    ``max_items`` children of any one object are visited, the rest
+    extrapolated from those, and after ``max_objects`` objects the remaining
+    ones count only their own size.
+    """
+    seen: set[int] = set()
+    total = 0.0
+    visited = 0
+    stack: list[tuple[Any, float]] = [(value, 1.0)]
+    while stack:
+        obj, weight = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj, 64) * weight
+        visited += 1
+        if visited >= max_objects or isinstance(obj, _ATOMIC_TYPES):
+            continue
+        children = _referents(obj)
+        if len(children) > max_items:
+            weight *= len(children) / max_items
+            children = children[:: len(children) // max_items][:max_items]
+        stack.extend((child, weight) for child in children)
+    return int(total)
+
+
+def _referents(obj: Any) -> list[Any]:
+    if isinstance(obj, dict):
+        return [item for pair in obj.items() for item in pair]
+    if isinstance(obj, list | tuple | set | frozenset | deque):
+        return list(obj)
+    if isinstance(obj, FunctionType):
+        # Not __globals__: the defining module is shared.
+        return [obj.__code__, obj.__defaults__, obj.__kwdefaults__]
+    if isinstance(obj, CodeType):
+        return [obj.co_code, *obj.co_consts]
+    children: list[Any] = []
+    with suppress(Exception):
+        children.append(vars(obj))
+    for slot in _slots(type(obj)):
+        with suppress(AttributeError):
+            children.append(getattr(obj, slot))
+    return children
+
+
+def _slots(cls: type) -> Iterable[str]:
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        yield from (slots,) if isinstance(slots, str) else slots
+
+
 @dataclass
 class CacheMetrics:
     """Cache performance metrics."""
@@ -54,6 +147,11 @@ class CacheMetrics:
     invalidations: int = 0
     tier_promotions: int = 0
     tier_demotions: int = 0
+    admission_rejections: int = 0
+    early_refreshes: int = 0
+    shared_hits: int = 0
+    compressions: int = 0
+    decompressions: int = 0
     memory_usage: int = 0
 
     @property
@@ -82,7 +180,8 @@ class CacheEntry:
     dependencies: set[str] = field(default_factory=set)
     tags: set[str] = field(default_factory=set)
     size: int = 0
-    ttl: int | None = None
+    ttl: float | None = None
+    compute_time: float = 0.0  # Seconds the value took to load
 
     @property
     def age(self) -> float:
@@ -100,6 +199,46 @@ class CacheEntry:
         self.access_count += 1
 
 
+@dataclass(slots=True)
+class _Compressed:
+    """A COLD-tier value held as zlib-compressed bytes."""
+
+    data: bytes
+    kind: type
+    size: int  # Entry size of the uncompressed value
+
+    def restore(self) -> Any:
+        raw = zlib.decompress(self.data)
+        if self.kind is bytes:
+            return raw
+        return self.kind(raw.decode("utf-8", "surrogatepass"))
+
+
+@dataclass(slots=True)
+class AccessStats:
+    """Fixed-size hit counter and get-latency histogram for a tier or tag.
+
+    ``hits`` counts every hit; ``latency`` holds the sampled gets only.
+    """
+
+    hits: int = 0
+    latency: RenderTimeStats = field(default_factory=RenderTimeStats)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "sampled": self.latency.count,
+            "avg_get_time": self.latency.average,
+            "p50_get_time": self.latency.percentile(0.5),
+            "p95_get_time": self.latency.percentile(0.95),
+        }
+
+
+_MISSING = object()
+# Value of a local entry whose value is held in the shared cache.
+_SHARED = object()
+
+
 @dataclass
 class CacheStats:
     """Comprehensive cache statistics."""
@@ -123,137 +262,315 @@ class EnhancedCacheManager:
     MODULE_ID: UUID = UUID("01937d89-b123-4567-89ab-123456789def")
     MODULE_STATUS: str = "stable"
 
+    # Cap on tags with access statistics.
+    MAX_TRACKED_TAGS: int = 256
+    # Background scheduler: maintenance runs in slices of at most
+    # MAINTENANCE_SLICE seconds, every MIN..MAX_MAINTENANCE_INTERVAL seconds
+    # (longer while idle, shortest under memory pressure).
+    MAINTENANCE_SLICE: float = 0.002
+    MIN_MAINTENANCE_INTERVAL: float = 1.0
+    MAX_MAINTENANCE_INTERVAL: float = 60.0
+    MEMORY_PRESSURE_RATIO: float = 0.9
+    MAX_CONCURRENT_WARMING: int = 4
+    # Share of max_memory_entries held by the admission window.
+    ADMISSION_WINDOW_RATIO: float = 0.01
+    # COLD-tier compression: values of at least COMPRESSION_MIN_SIZE bytes
+    # are kept compressed if that saves at least a tenth of their size.
+    COMPRESSION_LEVEL: int = 6
+    COMPRESSION_MIN_SIZE: int = 512
+    MAX_COMPRESSION_RATIO: float = 0.9
+
     def __init__(
         self,
         max_memory_entries: int = 1000,
+        max_memory_bytes: int | None = None,
         hot_tier_size: int = 100,
         warm_tier_size: int = 300,
         promotion_threshold: int = 5,
         demotion_idle_time: int = 3600,
+        sample_every: int = 100,
+        admission_filter: bool = True,
+        access_trace: AccessTrace | None = None,
+        compress_cold: bool = True,
+        ttl_jitter: float = 0.1,
+        early_expiry_beta: float = 1.0,
+        shared_cache: SharedRenderCache | None = None,
     ) -> None:
         """Initialize enhanced cache manager.
 
         Args:
             max_memory_entries: Maximum entries to keep in memory
+            max_memory_bytes: Maximum estimated bytes of cached values, if any
             hot_tier_size: Maximum entries in hot tier
             warm_tier_size: Maximum entries in warm tier
             promotion_threshold: Access count threshold for promotion
             demotion_idle_time: Seconds of idle time before demotion
+            sample_every: Time and record a detailed event for one in this
+                many gets; 0 disables sampling
+            admission_filter: Admit entries by access frequency (TinyLFU)
+                rather than recency alone
+            access_trace: Trace of the templates used, saved on shutdown
+                for warming them on the next startup
+            compress_cold: Keep str and bytes values of the COLD tier
+                compressed, decompressing them on promotion
+            ttl_jitter: Largest fraction TTLs are shortened by on insert, so
+                entries set together do not expire together
+            early_expiry_beta: XFetch factor for refreshing entries before
+                they expire, scaled by their compute time; 0 disables it
+            shared_cache: Host-local cache holding the str and bytes values
+                of every worker process; entries keep only their metadata
+                here, and local misses are looked up there
         """
         self.max_memory_entries = max_memory_entries
+        self.max_memory_bytes = max_memory_bytes
         self.hot_tier_size = hot_tier_size
         self.warm_tier_size = warm_tier_size
         self.promotion_threshold = promotion_threshold
         self.demotion_idle_time = demotion_idle_time
+        self.sample_every = sample_every
+        self.access_trace = access_trace
+        self.compress_cold = compress_cold
+        self.ttl_jitter = ttl_jitter
+        self.early_expiry_beta = early_expiry_beta
+        self.shared_cache = shared_cache
 
         # Internal data structures
         self.entries: dict[str, CacheEntry] = {}
+        # Segmented LRU: per tier, keys from least to most recently used.
+        # Eviction, promotion and demotion are O(1).
+        self._tier_lru: dict[CacheTier, OrderedDict[str, None]] = {
+            tier: OrderedDict() for tier in CacheTier
+        }
+        # TinyLFU admission: new COLD entries wait in a small LRU window;
+        # when it overflows its oldest entry stays only if it has been
+        # requested more often than the COLD entry it would displace.
+        # Entries reach WARM and HOT the same way once those are full.
+        self.sketch = FrequencySketch(max_memory_entries) if admission_filter else None
+        self._window: OrderedDict[str, None] = OrderedDict()
+        self.window_size = max(1, int(max_memory_entries * self.ADMISSION_WINDOW_RATIO))
+        # Keys whose hits reached promotion_threshold. Hits only queue them;
+        # the maintenance scheduler moves them up a tier.
+        self._promotions: dict[str, None] = {}
+        # Sampled (key, time) of hits.
         self.access_history: deque[tuple[str, float]] = deque(maxlen=10000)
         self.dependency_graph: dict[str, set[str]] = defaultdict(set)
         self.tag_index: dict[str, set[str]] = defaultdict(set)
+        # (expiry time, key) of entries with a TTL; stale pairs for replaced
+        # or deleted entries are skipped when popped.
+        self._expiry_heap: list[tuple[float, str]] = []
         self.warming_queue: asyncio.Queue[
             tuple[str, Callable[[str], Awaitable[Any]]]
         ] = asyncio.Queue()
 
-        # Performance tracking
+        # Performance tracking: counters on every get, latency histograms
+        # and detailed events for the sampled ones.
         self.metrics = CacheMetrics()
         self.performance_history: deque[dict[str, Any]] = deque(maxlen=1000)
+        self.get_latency = RenderTimeStats()
+        self.tier_stats: dict[CacheTier, AccessStats] = {
+            tier: AccessStats() for tier in CacheTier
+        }
+        self.tag_stats: OrderedDict[str, AccessStats] = OrderedDict()
+        self._gets = 0
 
         # Background tasks
-        self._maintenance_task: asyncio.Task[None] | None = None
-        self._warming_task: asyncio.Task[None] | None = None
+        self._scheduler_task: asyncio.Task[None] | None = None
+        self._warming_tasks: set[asyncio.Task[None]] = set()
+        self._wakeup = asyncio.Event()
+        self.maintenance_interval = self.MIN_MAINTENANCE_INTERVAL
 
         # Register with ACB
         with suppress(Exception):
             depends.set(self)
 
     async def initialize(self) -> None:
-        """Initialize cache manager and start background tasks."""
-        # Start maintenance task
-        self._maintenance_task = asyncio.create_task(self._maintenance_loop())
-
-        # Start cache warming task
-        self._warming_task = asyncio.create_task(self._warming_loop())
+        """Initialize cache manager and start the background scheduler."""
+        if self._scheduler_task is None or self._scheduler_task.done():
+            self._scheduler_task = asyncio.create_task(self._scheduler_loop())
 
     async def get(self, key: str, default: Any = None) -> Any:
-        """Get value from cache with tier management."""
-        start_time = time.time()
-
-        try:
-            if key in self.entries:
-                entry = self.entries[key]
-
-                # Check TTL expiration
-                if self._is_expired(entry):
-                    await self._remove_entry(key)
-                    self.metrics.misses += 1
-                    return default
-
-                # Update access statistics
-                entry.touch()
-                self.access_history.append((key, time.time()))
+        """Get value from cache with tier management.
 
-                # Consider promotion
-                await self._consider_promotion(entry)
+        Every get updates counters only; one in ``sample_every`` is also
+        timed into the latency histograms and recorded as a detailed event.
+        """
+        self._gets += 1
+        if self.sample_every and not self._gets % self.sample_every:
+            return await self._sampled_get(key, default)
+        return await self._get(key, default)
+
+    async def _get(self, key: str, default: Any) -> Any:
+        if self.sketch is not None:
+            self.sketch.increment(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            if self.shared_cache is not None:
+                # Output another worker rendered.
+                value = self.shared_cache.get(key)
+                if value is not None:
+                    self.metrics.hits += 1
+                    self.metrics.shared_hits += 1
+                    return value
+            self.metrics.misses += 1
+            return default
+
+        # Check TTL expiration
+        if entry.ttl is not None:
+            if self._is_expired(entry):
+                await self._remove_entry(key)
+                self.metrics.misses += 1
+                return default
+            # A miss for this caller only, who recomputes the entry early.
+            if refresh_early(
+                entry.created_at + entry.ttl,
+                entry.compute_time,
+                time.time(),
+                self.early_expiry_beta,
+            ):
+                self.metrics.early_refreshes += 1
+                self.metrics.misses += 1
+                return default
 
-                self.metrics.hits += 1
-                return entry.value
-            else:
+        shared_value = None
+        if entry.value is _SHARED:
+            shared_value = self.shared_cache.get(key)  # type: ignore[union-attr]
+            if shared_value is None:
+                # Overwritten or deleted by another worker.
+                await self._remove_entry(key)
                 self.metrics.misses += 1
                 return default
 
-        finally:
-            # Track performance
-            operation_time = time.time() - start_time
-            self.performance_history.append(
-                {
-                    "operation": "get",
-                    "key": key,
-                    "time": operation_time,
-                    "hit": key in self.entries,
-                    "timestamp": time.time(),
-                }
-            )
+        # Update access statistics
+        entry.touch()
+        self._segment(entry).move_to_end(key)
+        self.metrics.hits += 1
+        self.tier_stats[entry.tier].hits += 1
+        for tag in entry.tags:
+            self._tag_stats(tag).hits += 1
+
+        # Consider promotion
+        if (
+            entry.access_count >= self.promotion_threshold
+            and entry.tier != CacheTier.HOT
+            and key not in self._promotions
+        ):
+            self._promotions[key] = None
+            self._wakeup.set()
+
+        if shared_value is not None:
+            return shared_value
+        if isinstance(entry.value, _Compressed):
+            # Decompressed once: WARM keeps the value uncompressed. The
+            # scheduler trims WARM back to size.
+            self._move_to_tier(entry, CacheTier.WARM)
+            self.metrics.tier_promotions += 1
+            self._wakeup.set()
+        return entry.value
+
+    async def _sampled_get(self, key: str, default: Any) -> Any:
+        start_time = time.perf_counter()
+        value = await self._get(key, _MISSING)
+        operation_time = time.perf_counter() - start_time
+
+        hit = value is not _MISSING
+        self.get_latency.add(operation_time)
+        entry = self.entries.get(key) if hit else None
+        if entry is not None:
+            self.tier_stats[entry.tier].latency.add(operation_time)
+            for tag in entry.tags:
+                self._tag_stats(tag).latency.add(operation_time)
+            self.access_history.append((key, entry.last_accessed))
+        self.performance_history.append(
+            {
+                "operation": "get",
+                "key": key,
+                "time": operation_time,
+                "hit": hit,
+                "timestamp": time.time(),
+            }
+        )
+        return value if hit else default
+
+    def _tag_stats(self, tag: str) -> AccessStats:
+        stats = self.tag_stats.get(tag)
+        if stats is None:
+            if len(self.tag_stats) >= self.MAX_TRACKED_TAGS:
+                self.tag_stats.popitem(last=False)
+            stats = self.tag_stats[tag] = AccessStats()
+        return stats
 
     async def set(
         self,
         key: str,
         value: Any,
-        ttl: int | None = None,
+        ttl: float | None = None,
         dependencies: set[str] | None = None,
         tags: set[str] | None = None,
         tier: CacheTier | None = None,
+        size: int | None = None,
+        compute_time: float = 0.0,
     ) -> None:
-        """Set value in cache with metadata."""
-        # Calculate entry size (approximate)
-        size = self._calculate_size(value)
+        """Set value in cache with metadata.
+
+        ``size`` declares the bytes the value holds; by default it is
+        estimated once here. ``ttl`` is shortened by up to ``ttl_jitter``.
+        ``compute_time`` is the seconds the value took to compute; gets
+        refresh slow entries earlier before they expire. With a shared cache,
+        str and bytes values that fit it are stored there instead.
+        """
+        if ttl:
+            ttl = jittered_ttl(ttl, self.ttl_jitter)
+        if self.shared_cache is not None and self.shared_cache.set(key, value, ttl):
+            value, size = _SHARED, 0
+        elif size is None:
+            size = self._calculate_size(value)
+
+        tier = tier or CacheTier.COLD
+        if tier == CacheTier.HOT:
+            tier = self._admitted_tier(key, CacheTier.HOT, CacheTier.WARM)
+        if tier == CacheTier.WARM:
+            tier = self._admitted_tier(key, CacheTier.WARM, CacheTier.COLD)
 
         # Create cache entry
         entry = CacheEntry(
             key=key,
             value=value,
-            tier=tier or CacheTier.COLD,
+            tier=tier,
             dependencies=dependencies or set(),
             tags=tags or set(),
             size=size,
             ttl=ttl,
+            compute_time=compute_time,
         )
 
-        # Store entry
+        # Store entry, replacing any previous one
+        if key in self.entries:
+            self._detach_entry(key)
         self.entries[key] = entry
+        self.metrics.memory_usage += size
+        if tier == CacheTier.COLD and self.sketch is not None:
+            self._window[key] = None
+        elif tier == CacheTier.COLD:
+            self._add_to_cold(entry)
+        else:
+            self._tier_lru[tier][key] = None
+            self._enforce_tier_size(tier)
 
         # Update indexes
         self._update_dependency_graph(key, dependencies or set())
         self._update_tag_index(key, tags or set())
+        if ttl is not None:
+            self._schedule_expiry(entry)
 
         # Manage memory usage
         await self._manage_memory()
-
-        # Update metrics
-        self.metrics.memory_usage += size
+        while len(self._window) > self.window_size:
+            self._add_to_cold(self.entries[self._window.popitem(last=False)[0]])
 
     async def delete(self, key: str) -> bool:
-        """Delete entry from cache."""
+        """Delete entry from cache, and from the shared cache for all workers."""
+        if self.shared_cache is not None:
+            self.shared_cache.delete(key)
         if key in self.entries:
             await self._remove_entry(key)
             return True
@@ -300,6 +617,7 @@ class EnhancedCacheManager:
                 await self.warming_queue.put((key, loader_func))
 
         self.metrics.warming_operations += len(keys)
+        self._wakeup.set()
 
     async def get_stats(self) -> CacheStats:
         """Get comprehensive cache statistics."""
@@ -328,28 +646,27 @@ class EnhancedCacheManager:
 
     async def get_performance_report(self) -> dict[str, Any]:
         """Get detailed performance report."""
-        if not self.performance_history:
+        total_operations = self.metrics.hits + self.metrics.misses
+        if not total_operations:
             return {"message": "No performance data available"}
 
-        # Calculate averages
-        recent_operations = list(self.performance_history)[-100:]  # Last 100 operations
-        avg_get_time = sum(
-            op["time"] for op in recent_operations if op["operation"] == "get"
-        ) / max(1, sum(1 for op in recent_operations if op["operation"] == "get"))
-
-        # Hit ratio trend
-        hits = sum(1 for op in recent_operations if op.get("hit"))
-        hit_ratio = hits / len(recent_operations) if recent_operations else 0
-
         return {
-            "avg_get_time": avg_get_time,
-            "hit_ratio": hit_ratio,
-            "total_operations": len(self.performance_history),
-            "recent_operations": len(recent_operations),
+            "avg_get_time": self.get_latency.average,
+            "p95_get_time": self.get_latency.percentile(0.95),
+            "hit_ratio": self.metrics.hit_ratio,
+            "total_operations": total_operations,
+            "recent_operations": len(self.performance_history),
             "cache_efficiency": self.metrics.efficiency,
             "memory_usage": self.metrics.memory_usage,
             "tier_promotions": self.metrics.tier_promotions,
             "tier_demotions": self.metrics.tier_demotions,
+            "shared_hits": self.metrics.shared_hits,
+            "compressions": self.metrics.compressions,
+            "decompressions": self.metrics.decompressions,
+            "tiers": {
+                tier.value: stats.summary() for tier, stats in self.tier_stats.items()
+            },
+            "tags": {tag: stats.summary() for tag, stats in self.tag_stats.items()},
         }
 
     async def optimize_tiers(self) -> dict[str, int]:
@@ -374,21 +691,16 @@ class EnhancedCacheManager:
                 await self._demote_entry(entry)
                 demotions += 1
 
+        self._enforce_tier_size(CacheTier.HOT)
         self.metrics.tier_promotions += promotions
         self.metrics.tier_demotions += demotions
 
         return {
             "promotions": promotions,
             "demotions": demotions,
-            "hot_tier_count": sum(
-                1 for e in self.entries.values() if e.tier == CacheTier.HOT
-            ),
-            "warm_tier_count": sum(
-                1 for e in self.entries.values() if e.tier == CacheTier.WARM
-            ),
-            "cold_tier_count": sum(
-                1 for e in self.entries.values() if e.tier == CacheTier.COLD
-            ),
+            "hot_tier_count": len(self._tier_lru[CacheTier.HOT]),
+            "warm_tier_count": len(self._tier_lru[CacheTier.WARM]),
+            "cold_tier_count": len(self._tier_lru[CacheTier.COLD]) + len(self._window),
         }
 
     async def clear(self, pattern: str | None = None) -> int:
@@ -414,21 +726,8 @@ class EnhancedCacheManager:
     def _calculate_size(self, value: Any) -> int:
         """Calculate approximate size of cached value."""
         try:
-            import sys
-
-            return sys.getsizeof(value)
+            return estimate_size(value)
         except Exception:
-            # Fallback estimation
-            if isinstance(value, str):
-                return len(value.encode("utf-8"))
-            elif isinstance(value, list | tuple):
-                return sum(self._calculate_size(item) for item in value)
-            elif isinstance(value, dict):
-                return sum(
-                    self._calculate_size(k) + self._calculate_size(v)
-                    for k, v in value.items()
-                )
-
             return 64  # Default estimate
 
     def _is_expired(self, entry: CacheEntry) -> bool:
@@ -442,11 +741,14 @@ class EnhancedCacheManager:
         if key not in self.entries:
             return
 
-        entry = self.entries[key]
+        self._detach_entry(key)
+        self.metrics.evictions += 1
 
-        # Update metrics
+    def _detach_entry(self, key: str) -> None:
+        """Drop ``key`` from the entries, tier LRUs and indexes."""
+        entry = self.entries.pop(key)
         self.metrics.memory_usage -= entry.size
-        self.metrics.evictions += 1
+        del self._segment(entry)[key]
 
         # Clean up indexes
         for dep in entry.dependencies:
@@ -459,9 +761,6 @@ class EnhancedCacheManager:
             if not self.tag_index[tag]:
                 del self.tag_index[tag]
 
-        # Remove entry
-        del self.entries[key]
-
     def _update_dependency_graph(
         self, key: str, dependencies: builtins.set[str]
     ) -> None:
@@ -474,115 +773,327 @@ class EnhancedCacheManager:
         for tag in tags:
             self.tag_index[tag].add(key)
 
-    async def _consider_promotion(self, entry: CacheEntry) -> None:
-        """Consider promoting entry to higher tier."""
-        if entry.access_count >= self.promotion_threshold:
-            await self._promote_entry(entry)
-
     async def _promote_entry(self, entry: CacheEntry) -> None:
         """Promote entry to higher tier."""
         if entry.tier == CacheTier.COLD:
-            entry.tier = CacheTier.WARM
+            self._move_to_tier(
+                entry, self._admitted_tier(entry.key, CacheTier.WARM, CacheTier.COLD)
+            )
         elif entry.tier == CacheTier.WARM:
-            entry.tier = CacheTier.HOT
+            self._move_to_tier(
+                entry, self._admitted_tier(entry.key, CacheTier.HOT, CacheTier.WARM)
+            )
         # HOT is the highest tier
 
     async def _demote_entry(self, entry: CacheEntry) -> None:
         """Demote entry to lower tier."""
         if entry.tier == CacheTier.HOT:
-            entry.tier = CacheTier.WARM
+            self._move_to_tier(entry, CacheTier.WARM)
         elif entry.tier == CacheTier.WARM:
-            entry.tier = CacheTier.COLD
+            self._move_to_tier(entry, CacheTier.COLD)
         # COLD is the lowest active tier
 
-    async def _manage_memory(self) -> None:
-        """Manage memory usage by evicting entries."""
-        if len(self.entries) <= self.max_memory_entries:
+    def _segment(self, entry: CacheEntry) -> OrderedDict[str, None]:
+        """The LRU holding ``entry``: the admission window or its tier's."""
+        if entry.key in self._window:
+            return self._window
+        return self._tier_lru[entry.tier]
+
+    def _admitted_tier(
+        self, key: str, tier: CacheTier, fallback: CacheTier
+    ) -> CacheTier:
+        """``tier`` if ``key`` may enter it, else ``fallback``.
+
+        A full tier admits a key only if the sketch has seen it more often
+        than the tier's least recently used entry, which it then displaces.
+        """
+        limit = self.hot_tier_size if tier == CacheTier.HOT else self.warm_tier_size
+        lru = self._tier_lru[tier]
+        if self.sketch is None or len(lru) < limit or not lru or key in lru:
+            return tier
+        if self.sketch.estimate(key) > self.sketch.estimate(next(iter(lru))):
+            return tier
+        self.metrics.admission_rejections += 1
+        return fallback
+
+    def _move_to_tier(self, entry: CacheEntry, tier: CacheTier) -> None:
+        """Move ``entry`` to the most recently used end of ``tier``.
+
+        The tier may be left over-full; callers enforce its size.
+        """
+        del self._segment(entry)[entry.key]
+        entry.tier = tier
+        if tier == CacheTier.COLD:
+            self._add_to_cold(entry)
+            return
+        if isinstance(entry.value, _Compressed):
+            self._decompress(entry)
+        self._tier_lru[tier][entry.key] = None
+
+    def _add_to_cold(self, entry: CacheEntry) -> None:
+        """Append ``entry`` to the COLD LRU, compressing its value."""
+        self._tier_lru[CacheTier.COLD][entry.key] = None
+        if self.compress_cold:
+            self._compress(entry)
+
+    def _compress(self, entry: CacheEntry) -> None:
+        value = entry.value
+        if type(value) not in _COMPRESSIBLE_TYPES:
             return
+        if isinstance(value, bytes):
+            raw = value
+        else:
+            raw = value.encode("utf-8", "surrogatepass")
+        if len(raw) < self.COMPRESSION_MIN_SIZE:
+            return
+        data = zlib.compress(raw, self.COMPRESSION_LEVEL)
+        if len(data) > len(raw) * self.MAX_COMPRESSION_RATIO:
+            return
+        compressed = _Compressed(data, type(value), entry.size)
+        size = sys.getsizeof(compressed) + sys.getsizeof(data)
+        self.metrics.memory_usage += size - entry.size
+        self.metrics.compressions += 1
+        entry.value = compressed
+        entry.size = size
+
+    def _decompress(self, entry: CacheEntry) -> None:
+        compressed = entry.value
+        entry.value = compressed.restore()
+        self.metrics.memory_usage += compressed.size - entry.size
+        self.metrics.decompressions += 1
+        entry.size = compressed.size
+
+    def _enforce_tier_size(self, tier: CacheTier) -> None:
+        """Demote the least recently used entries of an over-full tier.
+
+        Entries demoted from HOT can overfill WARM, which is enforced next.
+        """
+        limit = {
+            CacheTier.HOT: self.hot_tier_size,
+            CacheTier.WARM: self.warm_tier_size,
+        }.get(tier)
+        lru = self._tier_lru[tier]
+        while limit is not None and len(lru) > limit:
+            entry = self.entries[next(iter(lru))]
+            self._move_to_tier(
+                entry, CacheTier.WARM if tier == CacheTier.HOT else CacheTier.COLD
+            )
+            self.metrics.tier_demotions += 1
+        if tier == CacheTier.HOT:
+            self._enforce_tier_size(CacheTier.WARM)
 
-        # Sort entries by tier and access patterns for eviction
-        entries_by_priority = sorted(
-            self.entries.values(),
-            key=lambda e: (e.tier.value, e.access_count, -e.idle_time),
-        )
+    async def _manage_memory(self) -> None:
+        """Manage memory usage by evicting entries.
 
-        # Evict least important entries
-        to_evict = len(self.entries) - self.max_memory_entries
-        for entry in entries_by_priority[:to_evict]:
-            await self._remove_entry(entry.key)
+        Evicts the least recently used entries of the coldest non-empty tier
+        until the cache is back under ``max_memory_entries`` and
+        ``max_memory_bytes``.
+        """
+        while len(self.entries) > self.max_memory_entries or (
+            self.max_memory_bytes is not None
+            and self.entries
+            and self.metrics.memory_usage > self.max_memory_bytes
+        ):
+            await self._remove_entry(self._eviction_victim())
+
+    def _eviction_victim(self) -> str:
+        """Key to evict: the LRU entry of the coldest non-empty tier.
+
+        With the admission filter, an overflowing window's oldest entry and
+        the COLD tier's LRU entry compete: the one the sketch has seen less
+        often is evicted and the other kept in COLD.
+        """
+        frozen = self._tier_lru[CacheTier.FROZEN]
+        if frozen:
+            return next(iter(frozen))
+        cold = self._tier_lru[CacheTier.COLD]
+        window = self._window
+        if self.sketch is not None and cold and len(window) > self.window_size:
+            candidate = next(iter(window))
+            victim = next(iter(cold))
+            if self.sketch.estimate(candidate) <= self.sketch.estimate(victim):
+                self.metrics.admission_rejections += 1
+                return candidate
+            del window[candidate]
+            self._add_to_cold(self.entries[candidate])
+            return victim
+        for lru in (cold, window):
+            if lru:
+                return next(iter(lru))
+        lru = next(
+            self._tier_lru[tier] for tier in EVICTION_ORDER if self._tier_lru[tier]
+        )
+        return next(iter(lru))
 
-    async def _maintenance_loop(self) -> None:
-        """Background maintenance loop."""
+    def _schedule_expiry(self, entry: CacheEntry) -> None:
+        heapq.heappush(
+            self._expiry_heap, (entry.created_at + (entry.ttl or 0), entry.key)
+        )
+        # Rebuild when stale pairs outnumber live ones; amortized O(1).
+        if len(self._expiry_heap) > 2 * len(self.entries) + 64:
+            self._expiry_heap = [
+                (e.created_at + e.ttl, e.key)
+                for e in self.entries.values()
+                if e.ttl is not None
+            ]
+            heapq.heapify(self._expiry_heap)
+
+    async def _scheduler_loop(self) -> None:
+        """Run maintenance and warming from one background task.
+
+        Sleeps ``maintenance_interval`` between rounds, or until warming work
+        is queued. The interval doubles after a round with nothing to do,
+        halves after one that found work, and drops to the minimum under
+        memory pressure.
+        """
         while True:
             try:
-                # Remove expired entries
-                expired_keys = [
-                    key
-                    for key, entry in self.entries.items()
-                    if self._is_expired(entry)
-                ]
-
-                for key in expired_keys:
-                    await self._remove_entry(key)
-
-                # Optimize tiers
-                await self.optimize_tiers()
-
-                # Memory cleanup
-                await self._manage_memory()
-
-                # Sleep for 60 seconds
-                await asyncio.sleep(60)
-
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), self.maintenance_interval
+                    )
+                self._wakeup.clear()
+                self._start_warming()
+                handled = await self.run_maintenance()
+                self.maintenance_interval = self._next_interval(handled)
             except asyncio.CancelledError:
                 break
             except Exception:
                 # Continue on errors
-                await asyncio.sleep(60)
+                self.maintenance_interval = self.MAX_MAINTENANCE_INTERVAL
 
-    async def _warming_loop(self) -> None:
-        """Background cache warming loop."""
-        while True:
-            try:
-                # Wait for warming request
-                key, loader_func = await self.warming_queue.get()
+    def _next_interval(self, handled: int) -> float:
+        if self._under_memory_pressure():
+            return self.MIN_MAINTENANCE_INTERVAL
+        if handled:
+            return max(self.MIN_MAINTENANCE_INTERVAL, self.maintenance_interval / 2)
+        return min(self.MAX_MAINTENANCE_INTERVAL, self.maintenance_interval * 2)
 
+    def _under_memory_pressure(self) -> bool:
+        if len(self.entries) >= self.MEMORY_PRESSURE_RATIO * self.max_memory_entries:
+            return True
+        return self.max_memory_bytes is not None and (
+            self.metrics.memory_usage
+            >= self.MEMORY_PRESSURE_RATIO * self.max_memory_bytes
+        )
+
+    async def run_maintenance(self) -> int:
+        """Expire, promote, demote and evict entries; returns how many were handled.
+
+        Work is done in slices of at most ``MAINTENANCE_SLICE`` seconds with
+        a yield to the event loop in between, so requests are never held up
+        by a whole-cache pass. Expired entries come off a heap ordered by
+        expiry time, entries to promote from the queue hits add them to, and
+        idle entries from the least recently used end of the HOT and WARM
+        segments. Over-full tiers are then demoted back to size.
+        """
+        handled = 0
+        more = True
+        while more:
+            deadline = time.perf_counter() + self.MAINTENANCE_SLICE
+            count, more = await self._maintenance_slice(deadline)
+            handled += count
+            if more:
+                await asyncio.sleep(0)
+        self._enforce_tier_size(CacheTier.HOT)
+        await self._manage_memory()
+        return handled
+
+    async def _maintenance_slice(self, deadline: float) -> tuple[int, bool]:
+        """Handle entries until done or ``deadline``; returns (count, more)."""
+        handled = 0
+        now = time.time()
+        heap = self._expiry_heap
+        while heap and heap[0][0] < now:
+            if time.perf_counter() >= deadline:
+                return handled, True
+            expires_at, key = heapq.heappop(heap)
+            entry = self.entries.get(key)
+            if (
+                entry is not None
+                and entry.ttl is not None
+                and entry.created_at + entry.ttl == expires_at
+            ):
+                await self._remove_entry(key)
+                handled += 1
+
+        promotions = self._promotions
+        while promotions:
+            if time.perf_counter() >= deadline:
+                return handled, True
+            key = next(iter(promotions))
+            del promotions[key]
+            entry = self.entries.get(key)
+            # Skipped if replaced since it was queued.
+            if (
+                entry is not None
+                and entry.tier != CacheTier.HOT
+                and entry.access_count >= self.promotion_threshold
+            ):
+                await self._promote_entry(entry)
+                self.metrics.tier_promotions += 1
+                handled += 1
+
+        # WARM first, so entries just demoted from HOT wait for a later run.
+        for tier in (CacheTier.WARM, CacheTier.HOT):
+            lru = self._tier_lru[tier]
+            while lru:
+                entry = self.entries[next(iter(lru))]
+                if entry.idle_time <= self.demotion_idle_time:
+                    break
+                if time.perf_counter() >= deadline:
+                    return handled, True
+                await self._demote_entry(entry)
+                self.metrics.tier_demotions += 1
+                handled += 1
+        return handled, False
+
+    def _start_warming(self) -> None:
+        """Start warming workers, up to ``MAX_CONCURRENT_WARMING``."""
+        while (
+            not self.warming_queue.empty()
+            and len(self._warming_tasks) < self.MAX_CONCURRENT_WARMING
+        ):
+            task = asyncio.create_task(self._warming_worker())
+            self._warming_tasks.add(task)
+            task.add_done_callback(self._warming_tasks.discard)
+
+    async def _warming_worker(self) -> None:
+        """Load queued keys until the warming queue is empty."""
+        while not self.warming_queue.empty():
+            key, loader_func = self.warming_queue.get_nowait()
+            try:
                 # Check if still needed
                 if key not in self.entries:
                     with suppress(Exception):
+                        start_time = time.perf_counter()
                         value = await loader_func(key)
                         await self.set(
                             key,
                             value,
                             tier=CacheTier.WARM,  # Warmed entries start in WARM tier
+                            compute_time=time.perf_counter() - start_time,
                         )
-
-                # Mark task as done
+            finally:
                 self.warming_queue.task_done()
 
-            except asyncio.CancelledError:
-                break
-            except Exception:
-                # Continue on errors
-                await asyncio.sleep(1)
-
     async def shutdown(self) -> None:
         """Shutdown cache manager and cleanup resources."""
-        if self._maintenance_task:
-            self._maintenance_task.cancel()
-            try:
-                await self._maintenance_task
-            except asyncio.CancelledError:
-                pass
-
-        if self._warming_task:
-            self._warming_task.cancel()
-            try:
-                await self._warming_task
-            except asyncio.CancelledError:
-                pass
+        tasks = [*self._warming_tasks]
+        if self._scheduler_task:
+            tasks.append(self._scheduler_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.access_trace is not None:
+            await self.access_trace.save()
 
         self.entries.clear()
+        self._expiry_heap.clear()
+        for lru in self._tier_lru.values():
+            lru.clear()
+        self._window.clear()
+        self._promotions.clear()
         self.dependency_graph.clear()
         self.tag_index.clear()
 
@@ -0,0 +1,273 @@
+"""Structural, deterministic fingerprints of template contexts.
+
+Render and block cache keys used to be derived from ``str(context)``, which
+stringifies every value (query results, ORM objects) and differs between
+processes wherever a value's repr embeds a memory address or hash
+randomization changes ordering. ``ContextFingerprinter`` instead hashes
+values incrementally with BLAKE2b, so the same data gives the same key in
+every worker:
+
+- scalars hash their type tag and canonical bytes;
+- mappings, lists, tuples and dataclasses hash their items in order; sets
+  hash theirs sorted by digest, as their order depends on the hash seed;
+- other objects hash ``__fingerprint__()`` when defined, their public
+  attributes (``__dict__`` and ``__slots__``) otherwise; functions, classes
+  and modules hash their qualified name, and requests their method and URL;
+- objects without attributes hash their repr, unless it is the default one
+  or embeds a memory address: those raise ``UnfingerprintableError``, and
+  renders of such contexts are not cached.
+
+Each container's digest is memoized by object identity, so a large list
+shared by several renders of one request is hashed once. Values are
+assumed not to change while a request renders. Fingerprinting walks the
+whole context, so ``estimate_size`` is used where only its size is needed.
+"""
+
+from __future__ import annotations
+
+import re
+import typing as t
+from collections.abc import Collection, Iterable, Mapping
+from dataclasses import dataclass, fields, is_dataclass
+from datetime import date, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from hashlib import blake2b
+from pathlib import PurePath
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from uuid import UUID
+
+from starlette.requests import HTTPConnection
+
+DIGEST_SIZE = 16
+# Bytes ``estimate_size`` counts for a number, and for any other object.
+SCALAR_SIZE = 8
+ITEM_SIZE = 64
+# ASGI scope key holding the fingerprinter shared by one request's renders.
+SCOPE_KEY = "fastblocks.context_fingerprints"
+
+_TEXT_TYPES = (Decimal, date, time, timedelta, UUID, PurePath)
+_CONTAINER_TYPES = (list, tuple, dict, set, frozenset)
+# Reprs like ``<Foo object at 0x7f...>`` differ per object and per process.
+_ADDRESS = re.compile(r"0x[0-9a-fA-F]{6,}")
+
+
+class UnfingerprintableError(TypeError):
+    """A context value has no state that is stable across processes."""
+
+
+@dataclass(frozen=True, slots=True)
+class Fingerprint:
+    """Digest of a context and the number of bytes hashed to produce it."""
+
+    digest: str
+    size: int
+
+
+class ContextFingerprinter:
+    """Fingerprints contexts, memoizing container digests by identity."""
+
+    def __init__(self) -> None:
+        # id -> (object, digest, size); the object is kept alive so its id
+        # cannot be reused by another value while the memo exists.
+        self._memo: dict[int, tuple[object, bytes, int]] = {}
+        self._active: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._memo)
+
+    def clear(self) -> None:
+        self._memo.clear()
+
+    def fingerprint(
+        self, context: Mapping[str, t.Any], keys: Iterable[str] | None = None
+    ) -> Fingerprint:
+        """Fingerprint ``context``, or only its ``keys`` when given.
+
+        Args:
+            context: Template context
+            keys: Context keys the output depends on; missing keys are skipped
+        """
+        if keys is not None:
+            # Sorted: ``keys`` may be a set, ordered by the hash seed.
+            context = {key: context[key] for key in sorted(keys) if key in context}
+        digest, size = self._digest(context)
+        return Fingerprint(digest.hex(), size)
+
+    def _digest(self, value: t.Any) -> tuple[bytes, int]:
+        scalar = _encode_scalar(value)
+        if scalar is not None:
+            return blake2b(scalar, digest_size=DIGEST_SIZE).digest(), len(scalar)
+        key = id(value)
+        memo = self._memo.get(key)
+        if memo is not None:
+            return memo[1], memo[2]
+        if key in self._active:
+            return blake2b(b"cycle", digest_size=DIGEST_SIZE).digest(), 0
+        self._active.add(key)
+        try:
+            hasher = blake2b(digest_size=DIGEST_SIZE)
+            size = self._feed(hasher, value)
+        finally:
+            self._active.discard(key)
+        digest = hasher.digest()
+        self._memo[key] = (value, digest, size)
+        return digest, size
+
+    def _feed(self, hasher: t.Any, value: t.Any) -> int:
+        hasher.update(_type_tag(value))
+        if isinstance(value, HTTPConnection):
+            return self._feed_items(
+                hasher, (getattr(value, "method", "WS"), str(value.url))
+            )
+        if isinstance(value, Mapping):
+            return self._feed_digests(
+                hasher, (self._pair(k, v) for k, v in value.items())
+            )
+        if isinstance(value, (set, frozenset)):
+            return self._feed_digests(hasher, sorted(self._digest(v) for v in value))
+        if isinstance(value, (list, tuple)):
+            return self._feed_items(hasher, value)
+        if hasattr(value, "__fingerprint__"):
+            return self._feed_items(hasher, (value.__fingerprint__(),))
+        if is_dataclass(value):
+            return self._feed_items(
+                hasher, (getattr(value, f.name) for f in fields(value))
+            )
+        if isinstance(
+            value,
+            (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType),
+        ):
+            return self._feed_items(hasher, (_qualified_name(value),))
+        state = _public_state(value)
+        if state is not None:
+            return self._feed_items(hasher, (state,))
+        text = repr(value)
+        if type(value).__repr__ is object.__repr__ or _ADDRESS.search(text):
+            raise UnfingerprintableError(
+                f"{type(value).__qualname__} values cannot be fingerprinted"
+            )
+        return self._feed_items(hasher, (text,))
+
+    def _pair(self, key: t.Any, value: t.Any) -> tuple[bytes, int]:
+        key_digest, key_size = self._digest(key)
+        value_digest, value_size = self._digest(value)
+        return key_digest + value_digest, key_size + value_size
+
+    def _feed_items(self, hasher: t.Any, items: Iterable[t.Any]) -> int:
+        total = 0
+        for item in items:
+            digest, size = self._digest(item)
+            hasher.update(digest)
+            total += size
+        return total
+
+    @staticmethod
+    def _feed_digests(hasher: t.Any, digests: Iterable[tuple[bytes, int]]) -> int:
+        total = 0
+        for digest, size in digests:
+            hasher.update(digest)
+            total += size
+        return total
+
+
+def _encode_scalar(value: t.Any) -> bytes | None:
+    """Type-tagged canonical bytes for immutable leaf values, else None."""
+    if value is None:
+        return b"N"
+    if isinstance(value, bool):
+        return b"T" if value else b"F"
+    if isinstance(value, Enum):
+        return _type_tag(value) + repr(value.value).encode()
+    if isinstance(value, str):
+        return b"s" + value.encode("utf-8", "surrogatepass")
+    if isinstance(value, int):
+        return b"i" + str(value).encode()
+    if isinstance(value, float):
+        return b"f" + repr(value).encode()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return b"b" + bytes(value)
+    if isinstance(value, _TEXT_TYPES):
+        return _type_tag(value) + str(value).encode()
+    return None
+
+
+def _type_tag(value: t.Any) -> bytes:
+    cls = type(value)
+    return f"{cls.__module__}.{cls.__qualname__}:".encode()
+
+
+def _public_state(value: t.Any) -> dict[str, t.Any] | None:
+    """Public ``__dict__`` and ``__slots__`` attributes, or None if it has none."""
+    attributes = getattr(value, "__dict__", None)
+    slots = [
+        name
+        for cls in type(value).__mro__
+        for name in _slot_names(cls)
+        if not name.startswith("_")
+    ]
+    if attributes is None and not slots:
+        return None
+    state = {k: v for k, v in (attributes or {}).items() if not k.startswith("_")}
+    for name in slots:
+        # Unset slots raise AttributeError.
+        if name not in state and hasattr(value, name):
+            state[name] = getattr(value, name)
+    return state
+
+
+def _slot_names(cls: type) -> tuple[str, ...]:
+    slots = cls.__dict__.get("__slots__", ())
+    return (slots,) if isinstance(slots, str) else tuple(slots)
+
+
+def _qualified_name(value: t.Any) -> str:
+    module = getattr(value, "__module__", None) or ""
+    name = getattr(value, "__qualname__", None) or getattr(value, "__name__", "")
+    return f"{module}.{name}"
+
+
+def estimate_size(context: Mapping[str, t.Any]) -> int:
+    """Rough size of ``context`` in bytes, without walking nested values.
+
+    A container counts as its length times the size of its first item, so
+    a list of rows costs one look at one row rather than a full traversal.
+    """
+    size = 0
+    for key, value in context.items():
+        size += len(key)
+        if isinstance(value, _CONTAINER_TYPES) and value:
+            first = next(iter(value.values() if isinstance(value, dict) else value))
+            size += len(value) * _shallow_size(first)
+        else:
+            size += _shallow_size(value)
+    return size
+
+
+def _shallow_size(value: t.Any) -> int:
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, _CONTAINER_TYPES):
+        return ITEM_SIZE * len(value)
+    if value is None or isinstance(value, (int, float)):
+        return SCALAR_SIZE
+    return ITEM_SIZE
+
+
+def fingerprinter_for(request: HTTPConnection | None) -> ContextFingerprinter:
+    """Return the fingerprinter scoped to ``request``, or a fresh one."""
+    if request is None:
+        return ContextFingerprinter()
+    fingerprinter = request.scope.get(SCOPE_KEY)
+    if fingerprinter is None:
+        fingerprinter = request.scope[SCOPE_KEY] = ContextFingerprinter()
+    return t.cast(ContextFingerprinter, fingerprinter)
+
+
+def context_fingerprint(
+    context: Mapping[str, t.Any],
+    keys: Collection[str] | None = None,
+    request: HTTPConnection | None = None,
+) -> Fingerprint:
+    """Fingerprint ``context`` with the request's memo when there is one."""
+    return fingerprinter_for(request).fingerprint(context, keys)
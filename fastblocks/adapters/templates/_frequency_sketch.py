@@ -0,0 +1,88 @@
+"""Approximate access frequencies for cache admission (TinyLFU).
+
+``EnhancedCacheManager`` asks the sketch whether a newcomer has been
+requested more often than the entry it would displace, so a scan over many
+pages requested once cannot push out entries that are requested again and
+again. The sketch is a count-min sketch of small saturating counters that
+are periodically halved, so it holds recent popularity in fixed memory.
+"""
+
+from __future__ import annotations
+
+import typing as t
+
+# Halves a counter byte; applied to the whole table with bytes.translate.
+_HALVE = bytes(count >> 1 for count in range(256))
+
+# Per-row odd 64-bit multipliers for multiply-shift hashing.
+_MULTIPLIERS = (
+    0xC3A5C85C97CB3127,
+    0xB492B66FBE98F273,
+    0x9AE16A3B2F90404F,
+    0xCBF29CE484222325,
+)
+_MASK64 = (1 << 64) - 1
+
+
+class FrequencySketch:
+    """Count-min sketch with four rows of counters saturating at 15.
+
+    Each row has four counters per cache entry, rounded up to a power of
+    two. After ``sample_size`` increments every counter is halved, which
+    keeps the estimates about recent traffic.
+    """
+
+    ROWS: int = 4
+    MAX_COUNT: int = 15
+
+    def __init__(self, capacity: int, sample_size: int | None = None) -> None:
+        """Initialize a sketch for a cache of ``capacity`` entries.
+
+        Args:
+            capacity: Entries the cache holds; sizes the counter rows
+            sample_size: Increments between halvings (10x capacity by default)
+        """
+        capacity = max(capacity, 1)
+        self.width = 1 << max(4, (4 * capacity - 1).bit_length())
+        # Multiply-shift keeps the top bits of a 64-bit product.
+        self._shift = 64 - self.width.bit_length() + 1
+        self._counts = bytearray(self.ROWS * self.width)
+        self.sample_size = sample_size or 10 * capacity
+        self._additions = 0
+
+    def increment(self, key: t.Hashable) -> None:
+        counts = self._counts
+        added = False
+        for index in self._indexes(key):
+            if counts[index] < self.MAX_COUNT:
+                counts[index] += 1
+                added = True
+        if added:
+            self._additions += 1
+            if self._additions >= self.sample_size:
+                self._age()
+
+    def estimate(self, key: t.Hashable) -> int:
+        counts = self._counts
+        first, second, third, fourth = self._indexes(key)
+        return min(counts[first], counts[second], counts[third], counts[fourth])
+
+    def _indexes(self, key: t.Hashable) -> tuple[int, int, int, int]:
+        # One hash() per key, spread over each row by the top bits of its
+        # own product: rows of a multiply-shift family collide independently,
+        # unlike low bits, which depend only on the low bits of the hash.
+        # str hashes vary with PYTHONHASHSEED, so collisions differ between
+        # processes.
+        hashed = hash(key)
+        shift, width = self._shift, self.width
+        first, second, third, fourth = _MULTIPLIERS
+        return (
+            ((hashed * first) & _MASK64) >> shift,
+            width + (((hashed * second) & _MASK64) >> shift),
+            2 * width + (((hashed * third) & _MASK64) >> shift),
+            3 * width + (((hashed * fourth) & _MASK64) >> shift),
+        )
+
+    def _age(self) -> None:
+        self._counts = bytearray(self._counts.translate(_HALVE))
+        self._additions //= 2
@@ -0,0 +1,291 @@
+"""Native async rendering of a single template block (HTMX partials).
+
+``Template.render_block`` does not exist in Jinja2 and the synchronous
+workarounds block the event loop while async filters run. Here the block's
+own async render function runs on a context prepared the way a full render
+would prepare it:
+
+1. The template's root render function runs until it first looks up a
+   block. By then every ``extends`` in the chain has added its parent's
+   blocks to ``context.blocks``, so ``super()`` resolves through the whole
+   layout chain, and top-level ``[% set %]`` statements that precede the
+   extends or the first block have assigned their variables.
+2. The requested block's render function then runs on that context.
+
+Output produced before the first block lookup (the opening markup of the
+root layout) is discarded; block bodies are never run in step 1.
+
+``render_target_block`` uses the same path to answer an HTMX request whose
+``HX-Target`` names a block with just that block's output.
+``stream_deferred_blocks`` streams a page while its slow blocks render
+concurrently, and for HTMX requests sends them after the rest of the page
+as out-of-band swaps.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import typing as t
+from collections.abc import AsyncIterator
+from contextlib import suppress
+
+
+class _BlockLookup(Exception):
+    """Raised when the root render reaches its first block call."""
+
+
+class _StopAtFirstBlock(dict[str, list[t.Any]]):
+    """``Context.blocks`` that stops rendering at the first block call.
+
+    ``extends`` still registers the parent's blocks through ``setdefault``.
+    """
+
+    def __getitem__(self, key: str) -> list[t.Any]:
+        raise _BlockLookup(key)
+
+
+async def _drain(events: t.Any) -> None:
+    async for _ in _events(events):
+        pass
+
+
+async def block_context(template: t.Any, context: dict[str, t.Any]) -> t.Any:
+    """Return a render context for ``template`` with its full block chain.
+
+    Args:
+        template: Compiled Jinja2 template
+        context: Template variables
+    """
+    render_context = template.new_context(context)
+    render_context.blocks = _StopAtFirstBlock(render_context.blocks)
+    with suppress(_BlockLookup):
+        await _drain(template.root_render_func(render_context))
+    render_context.blocks = dict(render_context.blocks.items())
+    return render_context
+
+
+async def render_block_async(
+    template: t.Any, block_name: str, context: dict[str, t.Any]
+) -> str:
+    """Render one block of ``template`` without rendering the whole page.
+
+    Args:
+        template: Compiled Jinja2 template (async environment)
+        block_name: Name of the block, defined by the template or a parent
+        context: Template variables
+
+    Raises:
+        KeyError: If no template in the chain defines ``block_name``
+    """
+    try:
+        render_context = await block_context(template, context)
+    except Exception:
+        return str(template.environment.handle_exception())
+    return await _render_block(template, render_context, block_name)
+
+
+def target_block_name(block_names: t.Iterable[str], target: str) -> str | None:
+    """Map an ``HX-Target`` element id to the block that renders it.
+
+    A block matches when its name equals the id, or equals it with ``-``
+    read as ``_`` (the ``#block-name`` selectors ``BlockRenderer`` assigns).
+    Returns None when no block or more than one block matches.
+    """
+    target = target.removeprefix("#")
+    matches = [
+        name
+        for name in block_names
+        if name == target or name.replace("_", "-") == target
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+
+async def find_target_block(
+    template: t.Any, target: str, context: dict[str, t.Any]
+) -> str | None:
+    """Name of the block an ``HX-Target`` id maps to, without rendering it."""
+    try:
+        render_context = await block_context(template, context)
+    except Exception:
+        return None
+    return target_block_name(render_context.blocks, target)
+
+
+async def render_target_block(
+    template: t.Any, target: str, context: dict[str, t.Any]
+) -> tuple[str, str] | None:
+    """Render only the block an ``HX-Target`` id maps to.
+
+    Returns:
+        ``(block_name, content)``, or None when the target maps to no block
+        or ambiguously to several, in which case the caller renders the page.
+    """
+    try:
+        render_context = await block_context(template, context)
+    except Exception:
+        return None
+    block_name = target_block_name(render_context.blocks, target)
+    if block_name is None:
+        return None
+    return block_name, await _render_block(template, render_context, block_name)
+
+
+def block_dom_id(block_name: str) -> str:
+    """Element id of a block, as in the ``#block-name`` selectors."""
+    return block_name.replace("_", "-")
+
+
+async def stream_deferred_blocks(
+    template: t.Any,
+    context: dict[str, t.Any],
+    deferred: t.Iterable[str],
+    placeholder: str = "",
+    max_concurrency: int = 8,
+    out_of_order: bool = True,
+) -> AsyncIterator[str]:
+    """Stream ``template`` while its ``deferred`` blocks render concurrently.
+
+    The deferred blocks start rendering when the page first reaches a block,
+    on a copy of the page's context, so the template's top-level code runs
+    once. With ``out_of_order`` (for HTMX requests) the page streams at once
+    with each deferred block replaced by ``<div id="block-name">placeholder
+    </div>``, and each block is appended as soon as it is ready as a
+    ``<div id="block-name" hx-swap-oob="true">`` fragment, which htmx swaps
+    into its placeholder. Only htmx applies those swaps, so for other
+    requests the page streams in order, waiting at each deferred block for
+    its output.
+
+    Deferred names that no template in the chain defines are ignored.
+    Deferred blocks should not be nested inside one another.
+
+    Args:
+        template: Compiled Jinja2 template (async environment)
+        context: Template variables
+        deferred: Names of the blocks to render concurrently
+        placeholder: Markup shown in place of a block until it arrives
+        max_concurrency: Most deferred blocks rendering at once
+        out_of_order: Send the blocks after the page as out-of-band swaps
+    """
+    environment = template.environment
+    shell_context = template.new_context(context)
+    # Sync templates cannot wait for a block in place; they render as usual.
+    names = (
+        list(dict.fromkeys(deferred)) if out_of_order or environment.is_async else []
+    )
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks: dict[str, asyncio.Task[str]] = {}
+    stand_ins: list[t.Callable[[t.Any], t.Any]] = []
+
+    async def render_deferred(render_context: t.Any, name: str) -> str:
+        try:
+            async with semaphore:
+                return await _render_block(template, render_context, name)
+        except Exception:
+            return f"<!-- Block {name} failed to render -->"
+
+    def start_deferred() -> None:
+        # By the first block call the extends chain has registered every
+        # block and the top-level code has run.
+        render_context = shell_context.derived()
+        for name in names:
+            stack = render_context.blocks.get(name, ())
+            stack = [block for block in stack if block not in stand_ins]
+            if stack:
+                render_context.blocks[name] = stack
+                tasks[name] = asyncio.create_task(render_deferred(render_context, name))
+
+    for name in names:
+        if out_of_order:
+            markup = f'<div id="{block_dom_id(name)}">{placeholder}</div>'
+            stand_ins.append(_static_block(markup, environment.is_async))
+        else:
+            stand_ins.append(_awaited_block(tasks, name))
+        shell_context.blocks[name] = [
+            stand_ins[-1],
+            *shell_context.blocks.get(name, ()),
+        ]
+    if names:
+        shell_context.blocks = _OnFirstLookup(shell_context, start_deferred)
+    try:
+        try:
+            async for event in _events(template.root_render_func(shell_context)):
+                yield event
+        except Exception:
+            environment.handle_exception()
+        if out_of_order:
+            names_by_task = {task: name for name, task in tasks.items()}
+            pending = set(names_by_task)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    dom_id = block_dom_id(names_by_task[task])
+                    yield f'<div id="{dom_id}" hx-swap-oob="true">{task.result()}</div>'
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+
+class _OnFirstLookup(dict[str, list[t.Any]]):
+    """``Context.blocks`` that calls ``callback`` before the first block call.
+
+    It then puts a plain dict back on the context.
+    """
+
+    def __init__(self, context: t.Any, callback: t.Callable[[], None]) -> None:
+        super().__init__(context.blocks)
+        self._context = context
+        self._callback = callback
+
+    def __getitem__(self, key: str) -> list[t.Any]:
+        self._context.blocks = dict(self.items())
+        self._callback()
+        return self._context.blocks[key]
+
+
+def _awaited_block(
+    tasks: dict[str, asyncio.Task[str]], name: str
+) -> t.Callable[[t.Any], AsyncIterator[str]]:
+    """A block render function that outputs the deferred render of ``name``."""
+
+    async def render(context: t.Any) -> AsyncIterator[str]:
+        task = tasks.get(name)
+        if task is not None:
+            yield await task
+
+    return render
+
+
+def _static_block(markup: str, is_async: bool) -> t.Callable[[t.Any], t.Any]:
+    """A block render function that outputs ``markup``."""
+    if not is_async:
+        return lambda context: iter((markup,))
+
+    async def render(context: t.Any) -> AsyncIterator[str]:
+        yield markup
+
+    return render
+
+
+async def _events(events: t.Any) -> AsyncIterator[str]:
+    if hasattr(events, "__aiter__"):
+        async for event in events:
+            yield event
+    else:
+        for event in events:
+            yield event
+
+
+async def _render_block(template: t.Any, render_context: t.Any, block_name: str) -> str:
+    environment = template.environment
+    stack = render_context.blocks.get(block_name)
+    if not stack:
+        raise KeyError(f"Block '{block_name}' not found in '{template.name}'")
+    try:
+        events = stack[0](render_context)
+        if hasattr(events, "__aiter__"):
+            return str(environment.concat([event async for event in events]))
+        return str(environment.concat(list(events)))
+    except Exception:
+        return str(environment.handle_exception())
@@ -1,6 +1,8 @@
 """Performance optimizer for FastBlocks template rendering."""
 
+import math
 import operator
+import statistics
 import time
 from collections import OrderedDict, defaultdict, deque
 from contextlib import suppress
@@ -20,6 +22,7 @@ class PerformanceMetrics:
 
     render_time: float
     cache_hit: bool
+    # Size of the rendered output in characters; 0 if unknown.
     template_size: int
     context_size: int
     fragment_count: int = 0
@@ -40,6 +43,60 @@ class PerformanceStats:
     concurrent_peak: int = 0
 
 
+@dataclass
+class Decision:
+    """One tuned setting of a template: its value, why, and its changes."""
+
+    value: Any
+    reason: str
+    changes: int = 0
+    changed_at: float = 0.0
+    # A different value is waiting out the optimizer's MIN_DECISION_HOLD.
+    held: bool = False
+
+    def update(self, value: Any, reason: str, now: float, hold: float) -> None:
+        """Take ``value`` unless the last change is less than ``hold`` ago.
+
+        The first change from the initial value is never held.
+        """
+        if value == self.value:
+            self.reason = reason
+            self.held = False
+        elif self.changes and now - self.changed_at < hold:
+            self.held = True
+        else:
+            self.value = value
+            self.reason = reason
+            self.changes += 1
+            self.changed_at = now
+            self.held = False
+
+    def explain(self) -> dict[str, Any]:
+        return {
+            "value": self.value,
+            "reason": self.reason,
+            "changes": self.changes,
+            "held": self.held,
+        }
+
+
+@dataclass
+class TemplateTuning:
+    """Streaming and cache TTL decisions for one template, with their inputs."""
+
+    streaming: Decision = field(
+        default_factory=lambda: Decision(False, "no renders recorded")
+    )
+    cache_ttl: Decision = field(
+        default_factory=lambda: Decision(
+            PerformanceOptimizer.DEFAULT_CACHE_TTL, "no renders recorded"
+        )
+    )
+    # Moving average of the rendered output's size in characters.
+    output_size: float = 0.0
+    renders: int = 0
+
+
 class PerformanceOptimizer:
     """Template rendering performance optimizer."""
 
@@ -52,12 +109,39 @@ class PerformanceOptimizer:
     # Global cap on distinct templates tracked simultaneously.
     MAX_TRACKED_TEMPLATES: int = 512
 
+    # Decisions are re-evaluated on each of a template's first
+    # EVALUATE_EVERY renders, then every EVALUATE_EVERY renders.
+    EVALUATE_EVERY: int = 16
+    # Guardrails against oscillation: a decision changes again only after
+    # MIN_DECISION_HOLD seconds, and each is switched on at an enter
+    # threshold but off only below a lower exit threshold.
+    MIN_DECISION_HOLD: float = 60.0
+    # Streaming: by p95 render time (seconds) or output size (characters).
+    STREAM_ENTER_P95: float = 0.5
+    STREAM_EXIT_P95: float = 0.3
+    STREAM_ENTER_SIZE: int = 100_000
+    STREAM_EXIT_SIZE: int = 64_000
+    # Streaming for a single render with a large context.
+    STREAM_CONTEXT_SIZE: int = 50_000
+    # Cache TTL: longer for templates whose median render time exceeds a
+    # step, if their render times are stable (coefficient of variation at
+    # most MAX_STABLE_VARIATION). A TTL steps down only once the median is
+    # below TTL_HYSTERESIS times the step.
+    DEFAULT_CACHE_TTL: int = 300
+    TTL_STEPS: tuple[tuple[float, int], ...] = ((0.2, 1800), (0.1, 900))
+    TTL_HYSTERESIS: float = 0.8
+    MIN_TTL_SAMPLES: int = 5
+    MAX_STABLE_VARIATION: float = 0.5
+    OUTPUT_SIZE_SMOOTHING: float = 0.2
+
     def __init__(self) -> None:
         """Initialize performance optimizer."""
         self.metrics_history: deque[dict[str, Any]] = deque(maxlen=1000)
         # LRU-bounded per-template sample buffer. OrderedDict preserves
         # insertion order; ``move_to_end`` on access keeps the LRU invariant.
         self.template_stats: OrderedDict[str, deque[float]] = OrderedDict()
+        # Decisions per tracked template; evicted with its samples.
+        self.tuning: dict[str, TemplateTuning] = {}
         self.cache_stats: dict[str, int] = defaultdict(int)
         self.concurrent_renders: int = 0
         self.optimization_enabled: bool = True
@@ -80,10 +164,15 @@ class PerformanceOptimizer:
         if not self.template_stats:
             return
         evicted_key, _ = self.template_stats.popitem(last=False)
+        self.tuning.pop(evicted_key, None)
         self._evictions_total += 1
 
     def record_render(self, template_name: str, metrics: PerformanceMetrics) -> None:
-        """Record template rendering metrics."""
+        """Record template rendering metrics.
+
+        Cache hits count towards the hit ratio only: how fast a cached copy
+        is served says nothing about how long the template takes to render.
+        """
         if not self.optimization_enabled:
             return
 
@@ -91,6 +180,9 @@ class PerformanceOptimizer:
         self.metrics_history.append(
             {"template": template_name, "timestamp": time.time(), "metrics": metrics}
         )
+        self._record_cache_access(template_name, metrics)
+        if metrics.cache_hit:
+            return
 
         # Update template-specific stats with LRU + per-template bounding.
         samples = self.template_stats.get(template_name)
@@ -105,7 +197,26 @@ class PerformanceOptimizer:
             self.template_stats.move_to_end(template_name)
         samples.append(metrics.render_time)
 
-        # Update cache stats
+        tuning = self.tuning.get(template_name)
+        if tuning is None:
+            tuning = self.tuning[template_name] = TemplateTuning()
+        size = metrics.template_size
+        if size and tuning.output_size:
+            tuning.output_size += self.OUTPUT_SIZE_SMOOTHING * (
+                size - tuning.output_size
+            )
+        elif size:
+            tuning.output_size = size
+        tuning.renders += 1
+        if (
+            tuning.renders <= self.EVALUATE_EVERY
+            or not tuning.renders % self.EVALUATE_EVERY
+        ):
+            self._evaluate(tuning, samples)
+
+    def _record_cache_access(
+        self, template_name: str, metrics: PerformanceMetrics
+    ) -> None:
         cache_key = f"{template_name}_cache"
         if metrics.cache_hit:
             self.cache_stats[f"{cache_key}_hits"] += 1
@@ -117,6 +228,68 @@ class PerformanceOptimizer:
             self.concurrent_renders, metrics.concurrent_renders
         )
 
+    def _evaluate(self, tuning: TemplateTuning, samples: deque[float]) -> None:
+        """Re-decide streaming and cache TTL from the recorded samples."""
+        now = time.monotonic()
+        streaming, reason = self._decide_streaming(tuning, samples)
+        tuning.streaming.update(streaming, reason, now, self.MIN_DECISION_HOLD)
+        ttl, reason = self._decide_cache_ttl(tuning, samples)
+        tuning.cache_ttl.update(ttl, reason, now, self.MIN_DECISION_HOLD)
+
+    def _decide_streaming(
+        self, tuning: TemplateTuning, samples: deque[float]
+    ) -> tuple[bool, str]:
+        if tuning.streaming.value:
+            time_limit, size_limit = self.STREAM_EXIT_P95, self.STREAM_EXIT_SIZE
+        else:
+            time_limit, size_limit = self.STREAM_ENTER_P95, self.STREAM_ENTER_SIZE
+        p95 = _percentile(samples, 0.95)
+        if p95 >= time_limit:
+            return True, f"p95 render time {p95:.3f}s >= {time_limit}s"
+        size = round(tuning.output_size)
+        if size >= size_limit:
+            return True, f"output size ~{size} chars >= {size_limit}"
+        return False, (
+            f"p95 render time {p95:.3f}s < {time_limit}s and output size "
+            f"~{size} chars < {size_limit}"
+        )
+
+    def _decide_cache_ttl(
+        self, tuning: TemplateTuning, samples: deque[float]
+    ) -> tuple[int, str]:
+        if len(samples) < self.MIN_TTL_SAMPLES:
+            return self.DEFAULT_CACHE_TTL, f"only {len(samples)} renders recorded"
+        median = statistics.median(samples)
+        mean = statistics.fmean(samples)
+        variation = statistics.pstdev(samples, mean) / mean if mean else 0.0
+        if variation > self.MAX_STABLE_VARIATION:
+            return self.DEFAULT_CACHE_TTL, (
+                f"render time varies too much (cv {variation:.2f} > "
+                f"{self.MAX_STABLE_VARIATION})"
+            )
+        for threshold, ttl in self.TTL_STEPS:
+            limit = threshold
+            if tuning.cache_ttl.value >= ttl:
+                limit *= self.TTL_HYSTERESIS
+            if median > limit:
+                return ttl, (
+                    f"median render time {median:.3f}s > {limit:.3f}s and "
+                    f"stable (cv {variation:.2f})"
+                )
+        return self.DEFAULT_CACHE_TTL, f"median render time {median:.3f}s is fast"
+
+    def explain(self, template_name: str) -> dict[str, Any] | None:
+        """Current decisions for ``template_name`` and why they were made."""
+        tuning = self.tuning.get(template_name)
+        if tuning is None:
+            return None
+        return {
+            "streaming": tuning.streaming.explain(),
+            "cache_ttl": tuning.cache_ttl.explain(),
+            "output_size": round(tuning.output_size),
+            "renders": tuning.renders,
+        }
+
     def get_performance_stats(self) -> PerformanceStats:
         """Get aggregated performance statistics."""
         if not self.metrics_history:
@@ -239,47 +412,32 @@ class PerformanceOptimizer:
         return optimized_context
 
     def should_enable_streaming(self, template_name: str, context_size: int) -> bool:
-        """Determine if streaming should be enabled for this render."""
+        """Determine if streaming should be enabled for this render.
+
+        Streams renders with a large context, and templates whose streaming
+        decision (see ``explain``) is on.
+        """
         if not self.optimization_enabled:
             return False
 
-        # Enable streaming for large contexts
-        if context_size > 50000:  # 50KB
+        if context_size > self.STREAM_CONTEXT_SIZE:
             return True
 
-        # Historical analysis
-        if template_name in self.template_stats:
-            times = self.template_stats[template_name]
-            if times and max(times) > 0.5:  # 500ms
-                return True
-
-        return False
+        tuning = self.tuning.get(template_name)
+        return tuning is not None and tuning.streaming.value is True
 
     def get_optimal_cache_ttl(self, template_name: str) -> int:
-        """Get optimal cache TTL for a template."""
-        if not self.optimization_enabled:
-            return 300  # Default 5 minutes
-
-        # Analysis based on template usage patterns
-        if template_name in self.template_stats:
-            times = self.template_stats[template_name]
-            if times:
-                avg_time = sum(times) / len(times)
-
-                # Slower templates get longer cache TTL
-                if avg_time > 0.2:
-                    return 1800  # 30 minutes
-                elif avg_time > 0.1:
-                    return 900  # 15 minutes
-
-                return 300  # 5 minutes
-
-        return 300
+        """Get the cache TTL decided for a template (see ``explain``)."""
+        tuning = self.tuning.get(template_name)
+        if not self.optimization_enabled or tuning is None:
+            return self.DEFAULT_CACHE_TTL
+        return int(tuning.cache_ttl.value)
 
     def clear_stats(self) -> None:
         """Clear all performance statistics."""
         self.metrics_history.clear()
         self.template_stats.clear()
+        self.tuning.clear()
         self.cache_stats.clear()
         self.concurrent_renders = 0
 
@@ -299,10 +457,16 @@ class PerformanceOptimizer:
                 "fastest": stats.fastest_templates,
             },
             "recommendations": self.get_optimization_recommendations(),
+            "decisions": {name: self.explain(name) for name in self.tuning},
             "timestamp": time.time(),
         }
 
 
+def _percentile(samples: deque[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
 # Global performance optimizer instance
 _performance_optimizer = None
 
@@ -0,0 +1,324 @@
+"""Ahead-of-time template compilation for FastBlocks deployments.
+
+Templates are normally lexed, parsed and turned into Python code the first
+time each worker loads them. This module moves that work into a build step:
+
+- ``compile_template_bundle`` walks the template searchpaths, applies the
+  same source rewrites the loaders apply (``{{`` -> ``[[`` delimiter
+  translation and the deployed http -> https rewrite), and compiles every
+  template in a process pool across all CPU cores.
+- The compiled code objects are written to a single zip archive (the
+  "bundle") together with a manifest of source checksums.
+- ``PrecompiledLoader`` serves templates straight from the bundle, so
+  production workers skip lexing, parsing and codegen entirely. Templates
+  missing from the bundle fall through to the regular loader chain.
+
+The bundle is tied to the interpreter and Jinja2 version that produced it;
+``TemplateBundle.load`` refuses bundles built by a different toolchain.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import marshal
+import os
+import typing as t
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+from types import CodeType
+
+import jinja2
+from jinja2_async_environment import AsyncEnvironment
+from jinja2_async_environment.loaders import AsyncBaseLoader, SourceType
+
+from ._registration import resolve_extension_classes
+from .jinja2 import (
+    DEFAULT_DELIMITERS,
+    DEFAULT_EXTENSIONS,
+    _apply_template_replacements,
+)
+
+__all__ = [
+    "BUNDLE_FORMAT_VERSION",
+    "BundleCompileResult",
+    "PrecompiledLoader",
+    "TemplateBundle",
+    "compile_template_bundle",
+    "discover_templates",
+]
+
+BUNDLE_FORMAT_VERSION = 1
+_MANIFEST_NAME = "manifest.json"
+_CODE_PREFIX = "code/"
+_TEMPLATE_EXTENSIONS = ("html", "css", "js")
+
+# Per-process environment used by compile workers (set by _init_worker).
+_worker_env: AsyncEnvironment | None = None
+
+
+def _toolchain_id() -> dict[str, str]:
+    return {
+        "python_magic": MAGIC_NUMBER.hex(),
+        "jinja2": jinja2.__version__,
+    }
+
+
+def _source_checksum(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def build_compile_environment(
+    delimiters: dict[str, str] | None = None,
+    extensions: t.Sequence[str] = (),
+) -> AsyncEnvironment:
+    """Build an environment whose codegen matches the runtime environment."""
+    env = AsyncEnvironment(
+        extensions=resolve_extension_classes([*DEFAULT_EXTENSIONS, *extensions]),
+        autoescape=True,
+        enable_async=True,
+    )
+    for delimiter, value in (delimiters or DEFAULT_DELIMITERS).items():
+        setattr(env, delimiter, value)
+    return env
+
+
+def _init_worker(delimiters: dict[str, str], extensions: tuple[str, ...]) -> None:
+    global _worker_env
+    _worker_env = build_compile_environment(delimiters, extensions)
+
+
+def _compile_source(
+    item: tuple[str, str],
+) -> tuple[str, str, bytes | None, str | None]:
+    """Compile one template in a worker process.
+
+    Returns ``(name, checksum, marshalled_code, error)``; exactly one of
+    ``marshalled_code`` and ``error`` is set.
+    """
+    name, source = item
+    checksum = _source_checksum(source)
+    env = _worker_env or build_compile_environment()
+    try:
+        code = env.compile(source, name, name)
+    except Exception as e:
+        return name, checksum, None, f"{type(e).__name__}: {e}"
+    return name, checksum, marshal.dumps(code), None
+
+
+def discover_templates(
+    searchpaths: t.Sequence[str | Path],
+    extensions: t.Sequence[str] = _TEMPLATE_EXTENSIONS,
+) -> dict[str, Path]:
+    """Map template names to files, first searchpath wins.
+
+    This mirrors the lookup order of ``FileSystemLoader``: a name that
+    exists under several searchpaths resolves to the earliest one.
+    """
+    found: dict[str, Path] = {}
+    for searchpath in map(Path, searchpaths):
+        if not searchpath.is_dir():
+            continue
+        for ext in extensions:
+            for path in sorted(searchpath.rglob(f"*.{ext}")):
+                name = path.relative_to(searchpath).as_posix()
+                found.setdefault(name, path)
+    return dict(sorted(found.items()))
+
+
+@dataclass
+class BundleCompileResult:
+    """Outcome of a bundle build."""
+
+    output: Path
+    compiled: list[str] = field(default_factory=list)
+    errors: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def compile_template_bundle(
+    searchpaths: t.Sequence[str | Path],
+    output: str | Path,
+    *,
+    delimiters: dict[str, str] | None = None,
+    extensions: t.Sequence[str] = (),
+    translate_delimiters: bool = False,
+    deployed: bool = False,
+    workers: int | None = None,
+) -> BundleCompileResult:
+    """Compile every template under ``searchpaths`` into a bundle file.
+
+    Args:
+        searchpaths: Template directories in lookup priority order.
+        output: Path of the bundle archive to write.
+        delimiters: Jinja2 delimiter settings (defaults to ``[[ ]]``/``[% %]``).
+        extensions: Extra extension import paths from ``templates.extensions``.
+        translate_delimiters: Apply the ``{{``-to-``[[`` source translation
+            used for package templates before compiling.
+        deployed: Apply the http-to-https rewrite used in deployed mode.
+        workers: Number of compile processes (defaults to the CPU count).
+
+    Returns:
+        The list of compiled template names and any per-template errors.
+        Templates that fail to compile are left out of the bundle and will
+        be compiled at runtime by the regular loaders.
+    """
+    output = Path(output)
+    result = BundleCompileResult(output=output)
+    sources: list[tuple[str, str]] = []
+    for name, path in discover_templates(searchpaths).items():
+        raw = path.read_bytes()
+        if translate_delimiters or deployed:
+            raw = _apply_template_replacements(
+                raw, deployed=deployed, translate=translate_delimiters
+            )
+        sources.append((name, raw.decode()))
+
+    compiled: dict[str, tuple[str, bytes]] = {}
+    max_workers = max(1, min(workers or os.cpu_count() or 1, len(sources) or 1))
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(dict(delimiters or DEFAULT_DELIMITERS), tuple(extensions)),
+    ) as pool:
+        chunksize = max(1, len(sources) // (max_workers * 4))
+        for name, checksum, code, error in pool.map(
+            _compile_source, sources, chunksize=chunksize
+        ):
+            if code is None:
+                result.errors[name] = error or "unknown error"
+                continue
+            compiled[name] = (checksum, code)
+            result.compiled.append(name)
+
+    manifest = {
+        "format": BUNDLE_FORMAT_VERSION,
+        **_toolchain_id(),
+        "delimiters": dict(delimiters or DEFAULT_DELIMITERS),
+        "templates": {name: checksum for name, (checksum, _) in compiled.items()},
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_output = output.with_name(f".{output.name}.tmp")
+    with zipfile.ZipFile(tmp_output, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(_MANIFEST_NAME, json.dumps(manifest, indent=2))
+        for name, (_, code) in compiled.items():
+            archive.writestr(f"{_CODE_PREFIX}{name}", code)
+    tmp_output.replace(output)
+    return result
+
+
+class TemplateBundle:
+    """Read-only view of a compiled template bundle."""
+
+    def __init__(self, manifest: dict[str, t.Any], blobs: dict[str, bytes]) -> None:
+        self.manifest = manifest
+        self._blobs = blobs
+        self._codes: dict[str, CodeType] = {}
+
+    @classmethod
+    def load(cls, path: str | Path) -> TemplateBundle:
+        """Load a bundle written by ``compile_template_bundle``.
+
+        Raises:
+            ValueError: If the bundle was built by an incompatible
+                interpreter, Jinja2 version or bundle format.
+        """
+        with zipfile.ZipFile(path) as archive:
+            manifest = json.loads(archive.read(_MANIFEST_NAME))
+            if manifest.get("format") != BUNDLE_FORMAT_VERSION:
+                msg = f"Unsupported template bundle format: {manifest.get('format')}"
+                raise ValueError(msg)
+            for key, expected in _toolchain_id().items():
+                if manifest.get(key) != expected:
+                    msg = (
+                        f"Template bundle {path} was built with {key}="
+                        f"{manifest.get(key)}, runtime has {expected}"
+                    )
+                    raise ValueError(msg)
+            blobs = {
+                name: archive.read(f"{_CODE_PREFIX}{name}")
+                for name in manifest["templates"]
+            }
+        return cls(manifest, blobs)
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.manifest["templates"])
+
+    def checksum(self, name: str) -> str | None:
+        return t.cast(str | None, self.manifest["templates"].get(name))
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._blobs
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def get_code(self, name: str) -> CodeType | None:
+        """Return the compiled code object for ``name`` (unmarshalled lazily)."""
+        code = self._codes.get(name)
+        if code is None:
+            blob = self._blobs.get(name)
+            if blob is None:
+                return None
+            code = t.cast(CodeType, marshal.loads(blob))  # nosec B302
+            self._codes[name] = code
+        return code
+
+
+class PrecompiledLoader(AsyncBaseLoader):  # type: ignore[misc]
+    """Loader that builds templates from a bundle without compiling.
+
+    Templates absent from the bundle are delegated to ``fallback``.
+    Bundled templates never report themselves stale: the bundle is an
+    immutable deploy artifact, so rebuild it to pick up template changes.
+    """
+
+    def __init__(self, bundle: TemplateBundle, fallback: t.Any | None = None) -> None:
+        super().__init__(getattr(fallback, "searchpath", None) or "templates")
+        self.bundle = bundle
+        self.fallback = fallback
+
+    async def load_async(
+        self,
+        environment: t.Any,
+        name: str,
+        env_globals: dict[str, t.Any] | None = None,
+    ) -> t.Any:
+        code = self.bundle.get_code(name)
+        if code is None:
+            if self.fallback is None:
+                raise jinja2.TemplateNotFound(name)
+            return await self.fallback.load_async(environment, name, env_globals)
+        return environment.template_class.from_code(
+            environment, code, env_globals or {}, None
+        )
+
+    async def get_source_async(
+        self,
+        environment_or_template: t.Any,
+        template: str | None = None,
+    ) -> SourceType:
+        if self.fallback is None:
+            raise jinja2.TemplateNotFound(str(template or environment_or_template))
+        if template is None:
+            return t.cast(
+                SourceType,
+                await self.fallback.get_source_async(environment_or_template),
+            )
+        return t.cast(
+            SourceType,
+            await self.fallback.get_source_async(environment_or_template, template),
+        )
+
+    async def list_templates_async(self) -> list[str]:
+        found = set(self.bundle.names)
+        if self.fallback is not None:
+            found.update(await self.fallback.list_templates_async())
+        return sorted(found)
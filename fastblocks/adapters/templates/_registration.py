@@ -1,22 +1,208 @@
 """Template filter registration system for FastBlocks adapters."""
 
+from collections.abc import Callable, Iterable, Sequence
 from contextlib import suppress
+from dataclasses import dataclass
+from importlib import import_module
+from inspect import isclass
 from typing import Any
 
+from jinja2.ext import Extension
 from oneiric.core.resolution import Resolver
 
-from ._filters import FASTBLOCKS_FILTERS
-
 # Migration from ACB to Oneiric
 depends = Resolver()
 
 
+@dataclass(frozen=True)
+class FilterGroup:
+    """A filter family provided by one module.
+
+    ``names`` is listed statically so an environment can advertise the
+    family without importing ``module`` until a template uses one of them.
+    """
+
+    name: str
+    module: str
+    mappings: tuple[str, ...]
+    names: frozenset[str]
+
+
+FILTER_GROUPS: tuple[FilterGroup, ...] = (
+    FilterGroup(
+        name="core",
+        module="fastblocks.adapters.templates._filters",
+        mappings=("FASTBLOCKS_FILTERS",),
+        names=frozenset(
+            (
+                "img_tag",
+                "image_url",
+                "style_class",
+                "icon_tag",
+                "icon_with_text",
+                "font_import",
+                "font_family",
+                "stylesheet_links",
+                "component_html",
+                "htmx_attrs",
+                "htmx_component",
+                "htmx_form",
+                "htmx_lazy_load",
+                "htmx_infinite_scroll",
+                "htmx_search",
+                "htmx_modal",
+                "htmx_img_swap",
+                "htmx_icon_toggle",
+                "htmx_ws_connect",
+                "htmx_validation_feedback",
+                "htmx_error_container",
+                "htmx_retry_trigger",
+            )
+        ),
+    ),
+    FilterGroup(
+        name="async",
+        module="fastblocks.adapters.templates._async_filters",
+        mappings=("FASTBLOCKS_ASYNC_FILTERS",),
+        names=frozenset(
+            (
+                "async_image_url",
+                "async_font_import",
+                "async_image_with_transformations",
+                "async_responsive_image",
+                "async_optimized_font_stack",
+                "async_critical_css_fonts",
+                "async_image_placeholder",
+                "async_lazy_image",
+            )
+        ),
+    ),
+    FilterGroup(
+        name="enhanced",
+        module="fastblocks.adapters.templates._enhanced_filters",
+        mappings=("ENHANCED_FILTERS", "ENHANCED_ASYNC_FILTERS"),
+        names=frozenset(
+            (
+                "cf_image_url",
+                "cf_responsive_image",
+                "twicpics_image",
+                "twicpics_smart_crop",
+                "wa_icon",
+                "wa_icon_with_text",
+                "kelp_component",
+                "kelp_card",
+                "phosphor_icon",
+                "heroicon",
+                "remix_icon",
+                "material_icon",
+                "font_face_declaration",
+                "htmx_progressive_enhancement",
+                "htmx_turbo_frame",
+                "htmx_infinite_scroll_sentinel",
+                "async_optimized_font_loading",
+            )
+        ),
+    ),
+)
+
+
+class LazyFilterMap(dict[str, Any]):
+    """``Environment.filters`` replacement that imports filter groups on demand.
+
+    The Jinja2 compiler looks filters up with ``get`` while generating code
+    and compiled templates fetch them with ``[]``, so the first template that
+    references a group member triggers the group import. Filters registered
+    explicitly always take precedence over group members of the same name.
+    """
+
+    def __init__(
+        self, filters: dict[str, Any], groups: Iterable[FilterGroup] = ()
+    ) -> None:
+        super().__init__(filters)
+        self._pending: dict[str, FilterGroup] = {}
+        self.loaded_groups: list[str] = []
+        for group in groups:
+            self.add_group(group)
+
+    def add_group(self, group: FilterGroup) -> None:
+        for name in group.names:
+            if not dict.__contains__(self, name):
+                self._pending.setdefault(name, group)
+
+    def _load(self, name: str) -> bool:
+        group = self._pending.get(name)
+        if group is None:
+            return False
+        module = import_module(group.module)
+        for mapping in group.mappings:
+            for filter_name, filter_func in getattr(module, mapping).items():
+                self.setdefault(filter_name, filter_func)
+        self._pending = {k: g for k, g in self._pending.items() if g is not group}
+        self.loaded_groups.append(group.name)
+        return True
+
+    def __missing__(self, key: str) -> Any:
+        if self._load(key) and dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return dict.__contains__(self, key) or key in self._pending
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class LazyAdapterGlobal:
+    """Template global that resolves its adapter on first use.
+
+    Attribute access, calls and truthiness are forwarded to the adapter, so
+    ``[[ images_adapter.get_img_tag(...) ]]`` and ``[% if icons_adapter %]``
+    behave as if the adapter had been resolved at startup. ``resolve`` is
+    the templates adapter's sync lookup, which reads the dependencies primed
+    by ``Templates.init``.
+    """
+
+    _unresolved = object()
+
+    def __init__(self, adapter: str, resolve: Callable[[str], Any]) -> None:
+        self._adapter_name = adapter
+        self._resolve_adapter = resolve
+        self._adapter: Any = self._unresolved
+
+    def _resolve(self) -> Any:
+        if self._adapter is self._unresolved:
+            self._adapter = None
+            with suppress(Exception):
+                self._adapter = self._resolve_adapter(self._adapter_name)
+        return self._adapter
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self._resolve()(*args, **kwargs)
+
+    def __bool__(self) -> bool:
+        return bool(self._resolve())
+
+    def __repr__(self) -> str:
+        return f"<LazyAdapterGlobal {self._adapter_name}>"
+
+
 def register_fastblocks_filters(template_env: Any) -> None:
     """Register all FastBlocks adapter filters with a Jinja2 environment.
 
     Args:
         template_env: Jinja2 Environment instance
     """
+    from ._filters import FASTBLOCKS_FILTERS
+
     for filter_name, filter_func in FASTBLOCKS_FILTERS.items():
         template_env.filters[filter_name] = filter_func
 
@@ -79,6 +265,78 @@ def register_template_globals(template_env: Any) -> None:
     template_env.globals.update(globals_dict)
 
 
+ADAPTER_GLOBALS: dict[str, str] = {
+    "images_adapter": "images",
+    "styles_adapter": "styles",
+    "icons_adapter": "icons",
+    "fonts_adapter": "fonts",
+}
+
+
+def install_lazy_filters(
+    template_env: Any, groups: Iterable[FilterGroup] = FILTER_GROUPS
+) -> LazyFilterMap:
+    """Advertise filter groups on ``template_env`` without importing them.
+
+    Args:
+        template_env: Jinja2 Environment instance
+        groups: Filter families to make available
+
+    Returns:
+        The environment's (now lazy) filter mapping
+    """
+    filters = template_env.filters
+    if not isinstance(filters, LazyFilterMap):
+        filters = LazyFilterMap(dict(filters))
+        template_env.filters = filters
+    for group in groups:
+        filters.add_group(group)
+    return filters
+
+
+def install_lazy_globals(
+    template_env: Any,
+    resolve: Callable[[str], Any],
+    enabled: Callable[[str], bool] | None = None,
+) -> None:
+    """Expose adapter globals (``images_adapter`` etc.) resolved on first use.
+
+    Unlike ``register_template_globals`` no adapter is resolved here. As
+    there, a global exists only for an enabled adapter, so templates see
+    ``Undefined`` for the others.
+
+    Args:
+        template_env: Jinja2 Environment instance
+        resolve: Returns the adapter for a name, or None
+        enabled: Whether an adapter is enabled, checked without resolving it
+    """
+    for name, adapter in ADAPTER_GLOBALS.items():
+        if enabled is None or enabled(adapter):
+            template_env.globals.setdefault(name, LazyAdapterGlobal(adapter, resolve))
+
+
+def resolve_extension_classes(paths: Sequence[str]) -> list[Any]:
+    """Expand extension import paths into extensions for ``add_extension``.
+
+    Module paths expand to every ``Extension`` subclass they define; other
+    dotted paths (``"pkg.module.ExtensionClass"``) are passed through for
+    Jinja2 to import.
+    """
+    resolved: list[Any] = []
+    for path in paths:
+        try:
+            module = import_module(path)
+        except ImportError:
+            resolved.append(path)
+            continue
+        resolved.extend(
+            v
+            for v in vars(module).values()
+            if isclass(v) and v.__name__ != "Extension" and issubclass(v, Extension)
+        )
+    return resolved
+
+
 def setup_fastblocks_template_environment(
     template_env: Any, async_mode: bool = False
 ) -> None:
@@ -0,0 +1,327 @@
+"""Bounded in-memory structures for AsyncTemplateRenderer.
+
+- ``RenderCache`` is an LRU of rendered output bounded by entry count and by
+  bytes, with per-entry TTLs and template -> keys and key prefix -> keys
+  indexes for invalidation.
+- ``RenderTimeTracker`` keeps fixed-size render-time statistics per template
+  (running aggregates, a small ring of recent samples and a log-scale
+  histogram), for a bounded number of templates.
+
+Both hold memory constant however many distinct contexts or cache keys a
+long-running worker sees.
+
+``jittered_ttl`` and ``refresh_early`` keep entries stored together from
+expiring together: TTLs are shortened by a random fraction on insert, and
+reads near expiry start recomputing early with a probability that grows as
+expiry approaches, sooner for entries that are slow to compute (XFetch).
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import sys
+import time
+import typing as t
+from collections import OrderedDict, deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class _RenderEntry:
+    content: str
+    size: int
+    expires_at: float
+    template_name: str
+    compute_time: float
+
+
+class RenderCache:
+    """LRU cache of rendered output with byte accounting and TTLs.
+
+    An entry's TTL is shortened by up to ``ttl_jitter`` of itself on insert,
+    and ``get`` misses on an entry that is about to expire with the XFetch
+    probability for its ``compute_time``, so that one caller re-renders it
+    while the others are still served.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 << 20,
+        ttl_jitter: float = 0.0,
+        early_expiry_beta: float = 1.0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_jitter = ttl_jitter
+        self.early_expiry_beta = early_expiry_beta
+        self._entries: OrderedDict[str, _RenderEntry] = OrderedDict()
+        self._keys_by_template: dict[str, set[str]] = {}
+        # Key prefix (up to the last ":") -> keys, e.g. "block:page.html:body"
+        # for the fingerprinted keys of one block.
+        self._keys_by_prefix: dict[str, set[str]] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.early_refreshes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    @staticmethod
+    def entry_size(key: str, content: str) -> int:
+        """Bytes held by an entry: the key and content string objects."""
+        return sys.getsizeof(key) + sys.getsizeof(content)
+
+    def get(
+        self, key: str, now: float | None = None, keep_stale: bool = False
+    ) -> str | None:
+        """Fresh content for ``key``.
+
+        An expired entry is a miss. It is dropped unless ``keep_stale`` is
+        set, in which case it stays available to ``peek`` until it is
+        replaced or evicted. An entry picked for early refresh is a miss
+        for this caller only.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        now = time.time() if now is None else now
+        if entry.expires_at <= now:
+            if not keep_stale:
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return None
+        if refresh_early(
+            entry.expires_at, entry.compute_time, now, self.early_expiry_beta
+        ):
+            self.early_refreshes += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.content
+
+    def peek(self, key: str) -> str | None:
+        """Content for ``key`` even if expired, without touching LRU or stats."""
+        entry = self._entries.get(key)
+        return None if entry is None else entry.content
+
+    def set(
+        self,
+        key: str,
+        content: str,
+        ttl: float,
+        template_name: str,
+        now: float | None = None,
+        compute_time: float = 0.0,
+    ) -> bool:
+        """Store ``content``; returns False if it alone exceeds ``max_bytes``.
+
+        ``compute_time`` is the seconds ``content`` took to render; it sets
+        how early the entry may be refreshed.
+        """
+        size = self.entry_size(key, content)
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return False
+        expires_at = (time.time() if now is None else now) + jittered_ttl(
+            ttl, self.ttl_jitter
+        )
+        self._entries[key] = _RenderEntry(
+            content, size, expires_at, template_name, compute_time
+        )
+        self._keys_by_template.setdefault(template_name, set()).add(key)
+        self._keys_by_prefix.setdefault(key_prefix(key), set()).add(key)
+        self.total_bytes += size
+        while (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    def pop(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._remove(key)
+        return entry.content
+
+    def invalidate_templates(self, template_names: Iterable[str]) -> list[str]:
+        """Drop every entry rendered from ``template_names``; returns the keys."""
+        keys: list[str] = []
+        for name in template_names:
+            keys.extend(self._keys_by_template.get(name, ()))
+        for key in keys:
+            self._remove(key)
+        return keys
+
+    def invalidate_prefixes(self, prefixes: Iterable[str]) -> list[str]:
+        """Drop every entry whose key prefix is in ``prefixes``; returns the keys."""
+        keys: list[str] = []
+        for prefix in prefixes:
+            keys.extend(self._keys_by_prefix.get(prefix, ()))
+        for key in keys:
+            self._remove(key)
+        return keys
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_template.clear()
+        self._keys_by_prefix.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "early_refreshes": self.early_refreshes,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        _discard_indexed(self._keys_by_template, entry.template_name, key)
+        _discard_indexed(self._keys_by_prefix, key_prefix(key), key)
+
+
+def jittered_ttl(ttl: float, jitter: float) -> float:
+    """``ttl`` shortened by a random fraction of at most ``jitter``."""
+    if not jitter:
+        return ttl
+    return ttl * (1.0 - jitter * random.random())
+
+
+def refresh_early(
+    expires_at: float, compute_time: float, now: float, beta: float = 1.0
+) -> bool:
+    """Whether a read at ``now`` should recompute the entry before it expires.
+
+    XFetch: true when ``now - compute_time * beta * log(u)`` for uniform
+    ``u`` in (0, 1] reaches ``expires_at``. The chance is negligible until
+    expiry is a few ``compute_time`` away and then grows to one, so a single
+    reader of a popular entry refreshes it ahead of the others. ``beta``
+    above 1 refreshes earlier; 0 disables it.
+    """
+    if compute_time <= 0 or beta <= 0:
+        return False
+    return now - compute_time * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def key_prefix(key: str) -> str:
+    """The part of a cache key before its last ``:``."""
+    return key.rpartition(":")[0]
+
+
+def _discard_indexed(index: dict[str, set[str]], group: str, key: str) -> None:
+    keys = index.get(group)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[group]
+
+
+# Histogram buckets are powers of two starting at 1µs: bucket ``i`` counts
+# render times in [2**(i-1), 2**i) µs, so 32 buckets reach past 30 minutes.
+_HISTOGRAM_BUCKETS = 32
+_HISTOGRAM_UNIT = 1e-6
+
+
+@dataclass(slots=True)
+class RenderTimeStats:
+    """Fixed-size render-time aggregates for one template."""
+
+    count: int = 0
+    total: float = 0.0
+    minimum: float = math.inf
+    maximum: float = 0.0
+    recent: deque[float] = field(default_factory=lambda: deque(maxlen=10))
+    histogram: list[int] = field(default_factory=lambda: [0] * _HISTOGRAM_BUCKETS)
+
+    def add(self, render_time: float) -> None:
+        self.count += 1
+        self.total += render_time
+        self.minimum = min(self.minimum, render_time)
+        self.maximum = max(self.maximum, render_time)
+        self.recent.append(render_time)
+        _, exponent = math.frexp(render_time / _HISTOGRAM_UNIT)
+        self.histogram[min(max(exponent, 0), _HISTOGRAM_BUCKETS - 1)] += 1
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the histogram bucket holding the given fraction."""
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.histogram):
+            seen += bucket
+            if seen >= threshold:
+                return min(_HISTOGRAM_UNIT * 2**index, self.maximum)
+        return self.maximum
+
+    def summary(self) -> dict[str, t.Any]:
+        return {
+            "avg_render_time": self.average,
+            "min_render_time": self.minimum,
+            "max_render_time": self.maximum,
+            "p50_render_time": self.percentile(0.5),
+            "p95_render_time": self.percentile(0.95),
+            "render_count": self.count,
+        }
+
+
+class RenderTimeTracker:
+    """Per-template ``RenderTimeStats`` for at most ``max_templates`` templates.
+
+    The least recently rendered template is dropped when the cap is reached.
+    """
+
+    def __init__(self, max_templates: int = 512) -> None:
+        self.max_templates = max_templates
+        self._stats: OrderedDict[str, RenderTimeStats] = OrderedDict()
+
+    def __contains__(self, template_name: object) -> bool:
+        return template_name in self._stats
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def get(self, template_name: str) -> RenderTimeStats | None:
+        return self._stats.get(template_name)
+
+    def items(self) -> Iterator[tuple[str, RenderTimeStats]]:
+        return iter(list(self._stats.items()))
+
+    def record(self, template_name: str, render_time: float) -> None:
+        stats = self._stats.get(template_name)
+        if stats is None:
+            if len(self._stats) >= self.max_templates:
+                self._stats.popitem(last=False)
+            stats = self._stats[template_name] = RenderTimeStats()
+        else:
+            self._stats.move_to_end(template_name)
+        stats.add(render_time)
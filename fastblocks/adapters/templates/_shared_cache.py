@@ -0,0 +1,311 @@
+"""Host-local render cache shared by the worker processes of one host.
+
+Every worker process keeps its own ``EnhancedCacheManager``, so rendered
+fragments are rendered and held once per worker. ``SharedRenderCache`` keeps
+str, ``Markup`` and bytes values in one memory-mapped file (on Linux under
+``/dev/shm``, i.e. in RAM), so workers read each other's output and a host
+holds one copy of it.
+
+The file is a fixed table of 4-way buckets of fixed-size slots. Each slot
+has a version that a writer makes odd before changing the slot and even
+after; readers take no lock and retry when the version moved while they
+copied the slot (a seqlock). Writers to the same bucket are serialized by a
+POSIX record lock on the bucket's byte range, held only for the copy.
+Values too large for a slot are not shared.
+
+The first process to open a file sets its layout; later ones map it as it
+is. Entries outlive the processes that wrote them until they expire or are
+overwritten, so use a path per release of the templates.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+import typing as t
+from pathlib import Path
+
+from markupsafe import Markup
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX
+    fcntl = None  # type: ignore[assignment]
+
+SHARED_CACHE_FORMAT_VERSION = 1
+_MAGIC = b"FBRCACHE"
+
+# magic, format version, ways per bucket, slot count, slot size
+_HEADER = struct.Struct("<8sIIII")
+_HEADER_SIZE = 64
+# version, expires at, key hash, key length, value length, value kind
+_SLOT = struct.Struct("<QdQIIB7x")
+_VERSION = struct.Struct("<Q")
+
+# Value kinds: the type a value is restored to.
+_KINDS: tuple[type, ...] = (bytes, str, Markup)
+
+
+class SharedRenderCache:
+    """Fixed-size cache of rendered output in a memory-mapped file."""
+
+    DEFAULT_SIZE: int = 64 << 20
+    SLOT_SIZE: int = 32 << 10
+    WAYS: int = 4
+    # Reads of a slot that keeps changing give up after this many tries.
+    MAX_READ_RETRIES: int = 8
+
+    def __init__(
+        self,
+        path: str | Path,
+        size: int | None = None,
+        slot_size: int | None = None,
+    ) -> None:
+        """Open or create the cache file at ``path``.
+
+        Args:
+            path: File to map; every process of the host passes the same one
+            size: Bytes of slots, if this process creates the file
+            slot_size: Bytes per slot, bounding the values that are shared
+
+        Raises:
+            OSError: The file cannot be opened or locked on this platform
+            ValueError: The file holds an incompatible cache
+        """
+        if fcntl is None:
+            raise OSError("SharedRenderCache requires POSIX file locks")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self.ways, self.slot_count, self.slot_size = self._open_layout(
+                slot_size or self.SLOT_SIZE,
+                (size or self.DEFAULT_SIZE) // (slot_size or self.SLOT_SIZE),
+            )
+            self._map = mmap.mmap(
+                self._fd, _HEADER_SIZE + self.slot_count * self.slot_size
+            )
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self.buckets = self.slot_count // self.ways
+        self.max_payload = self.slot_size - _SLOT.size
+        # Counters of this process.
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.rejections = 0
+        self.read_retries = 0
+
+    def _open_layout(self, slot_size: int, slot_count: int) -> tuple[int, int, int]:
+        """(ways, slot count, slot size) of the file, initializing it if new."""
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) == _HEADER.size and header[:8] == _MAGIC:
+                _, version, ways, slot_count, slot_size = _HEADER.unpack(header)
+                if version != SHARED_CACHE_FORMAT_VERSION:
+                    raise ValueError(f"{self.path} holds shared cache format {version}")
+                return ways, slot_count, slot_size
+            if slot_size <= _SLOT.size or slot_count < self.WAYS:
+                raise ValueError("shared cache too small for one bucket")
+            slot_count -= slot_count % self.WAYS
+            os.ftruncate(self._fd, _HEADER_SIZE + slot_count * slot_size)
+            header = _HEADER.pack(
+                _MAGIC, SHARED_CACHE_FORMAT_VERSION, self.WAYS, slot_count, slot_size
+            )
+            os.pwrite(self._fd, header, 0)
+            return self.WAYS, slot_count, slot_size
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def get(self, key: str, now: float | None = None) -> t.Any:
+        """The value stored for ``key`` by any process, or None.
+
+        Takes no lock: a slot that changes while it is copied is read again.
+        """
+        hashed, key_bytes = _hash_key(key)
+        now = time.time() if now is None else now
+        buffer = self._map
+        for offset in self._bucket_slots(hashed):
+            for _ in range(self.MAX_READ_RETRIES):
+                version, expires_at, slot_hash, key_len, value_len, kind = (
+                    _SLOT.unpack_from(buffer, offset)
+                )
+                if version & 1:
+                    self.read_retries += 1
+                    continue
+                if slot_hash != hashed:
+                    break
+                start = offset + _SLOT.size
+                data = (
+                    buffer[start : start + key_len + value_len]
+                    if key_len + value_len <= self.max_payload
+                    else b""
+                )
+                if _VERSION.unpack_from(buffer, offset)[0] != version:
+                    self.read_retries += 1
+                    continue
+                if data[:key_len] != key_bytes or expires_at <= now:
+                    break
+                self.hits += 1
+                return _restore(kind, data[key_len:])
+        self.misses += 1
+        return None
+
+    def set(
+        self, key: str, value: t.Any, ttl: float | None = None, now: float | None = None
+    ) -> bool:
+        """Store ``value`` for every process; False if it cannot be shared.
+
+        Only str, ``Markup`` and bytes values that fit a slot are stored.
+        The slot already holding ``key`` is reused, else an empty or expired
+        one, else the one of the bucket expiring first.
+        """
+        kind = _KINDS.index(type(value)) if type(value) in _KINDS else -1
+        if kind < 0:
+            self.rejections += 1
+            return False
+        raw = value if kind == 0 else value.encode("utf-8", "surrogatepass")
+        hashed, key_bytes = _hash_key(key)
+        if len(key_bytes) + len(raw) > self.max_payload:
+            self.rejections += 1
+            return False
+        now = time.time() if now is None else now
+        expires_at = math.inf if ttl is None else now + ttl
+        with self._bucket_lock(hashed):
+            offset = self._slot_for(hashed, key_bytes, now)
+            self._write_slot(offset, expires_at, hashed, key_bytes, raw, kind)
+        self.writes += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Drop ``key`` for every process; True if it was stored."""
+        hashed, key_bytes = _hash_key(key)
+        with self._bucket_lock(hashed):
+            offset = self._find(hashed, key_bytes)
+            if offset is None:
+                return False
+            self._write_slot(offset, 0.0, 0, b"", b"", 0)
+        return True
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        for bucket in range(self.buckets):
+            with self._bucket_lock(bucket):
+                for way in range(self.ways):
+                    offset = self._slot_offset(bucket * self.ways + way)
+                    if _SLOT.unpack_from(self._map, offset)[2]:
+                        self._write_slot(offset, 0.0, 0, b"", b"", 0)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "slots": self.slot_count,
+            "slot_size": self.slot_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "rejections": self.rejections,
+            "read_retries": self.read_retries,
+        }
+
+    def _slot_offset(self, slot: int) -> int:
+        return _HEADER_SIZE + slot * self.slot_size
+
+    def _bucket_slots(self, hashed: int) -> range:
+        first = self._slot_offset((hashed % self.buckets) * self.ways)
+        return range(first, first + self.ways * self.slot_size, self.slot_size)
+
+    def _bucket_lock(self, hashed: int) -> _RangeLock:
+        # Bucket numbers (``clear``) and key hashes map to the same range.
+        slots = self._bucket_slots(hashed)
+        return _RangeLock(self._fd, slots.start, self.ways * self.slot_size)
+
+    def _find(self, hashed: int, key_bytes: bytes) -> int | None:
+        for offset in self._bucket_slots(hashed):
+            _, _, slot_hash, key_len, _, _ = _SLOT.unpack_from(self._map, offset)
+            start = offset + _SLOT.size
+            if slot_hash == hashed and self._map[start : start + key_len] == key_bytes:
+                return offset
+        return None
+
+    def _slot_for(self, hashed: int, key_bytes: bytes, now: float) -> int:
+        offset = self._find(hashed, key_bytes)
+        if offset is not None:
+            return offset
+        victim, earliest = 0, math.inf
+        for offset in self._bucket_slots(hashed):
+            _, expires_at, slot_hash, _, _, _ = _SLOT.unpack_from(self._map, offset)
+            if not slot_hash or expires_at <= now:
+                return offset
+            if expires_at < earliest:
+                victim, earliest = offset, expires_at
+        return victim or self._bucket_slots(hashed).start
+
+    def _write_slot(
+        self,
+        offset: int,
+        expires_at: float,
+        hashed: int,
+        key_bytes: bytes,
+        raw: bytes,
+        kind: int,
+    ) -> None:
+        # Odd version while the slot changes; readers retry until it is even.
+        buffer = self._map
+        version = _VERSION.unpack_from(buffer, offset)[0] | 1
+        _VERSION.pack_into(buffer, offset, version)
+        start = offset + _SLOT.size
+        buffer[start : start + len(key_bytes)] = key_bytes
+        buffer[start + len(key_bytes) : start + len(key_bytes) + len(raw)] = raw
+        _SLOT.pack_into(
+            buffer,
+            offset,
+            version,
+            expires_at,
+            hashed,
+            len(key_bytes),
+            len(raw),
+            kind,
+        )
+        _VERSION.pack_into(buffer, offset, version + 1)
+
+
+class _RangeLock:
+    """Exclusive POSIX record lock on a byte range of a file."""
+
+    __slots__ = ("fd", "length", "start")
+
+    def __init__(self, fd: int, start: int, length: int) -> None:
+        self.fd = fd
+        self.start = start
+        self.length = length
+
+    def __enter__(self) -> None:
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, self.length, self.start)
+
+    def __exit__(self, *exc_info: object) -> None:
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, self.length, self.start)
+
+
+def _hash_key(key: str) -> tuple[int, bytes]:
+    """(hash, bytes) of ``key``; the hash is the same in every process."""
+    key_bytes = key.encode("utf-8", "surrogatepass")
+    digest = hashlib.blake2b(key_bytes, digest_size=8).digest()
+    # 0 marks an empty slot.
+    return int.from_bytes(digest, "little") | 1 << 63, key_bytes
+
+
+def _restore(kind: int, raw: bytes) -> t.Any:
+    value_type = _KINDS[kind]
+    if value_type is bytes:
+        return raw
+    return value_type(raw.decode("utf-8", "surrogatepass"))
@@ -0,0 +1,154 @@
+"""Streaming template responses that flush at block boundaries.
+
+``TemplateResponse`` renders the whole page before the first byte is sent, so
+time to first byte equals full render time. ``StreamingTemplateResponse``
+sends headers immediately and then the rendered output in chunks, flushing
+when rendering enters or leaves one of the configured blocks: with the
+default ``head``/``body``/``content`` blocks the document head goes out
+before the page body starts rendering.
+
+Output between flush points is coalesced into one chunk, which keeps
+per-chunk overhead low for compression middleware (``BrotliMiddleware``
+flushes its compressor once per chunk).
+"""
+
+from __future__ import annotations
+
+import typing as t
+from collections.abc import AsyncIterator, Callable, Iterable
+
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
+
+DEFAULT_FLUSH_BLOCKS: tuple[str, ...] = ("head", "body", "content")
+
+
+class _FlushMarker(str):
+    """Empty string event marking a flush point in the render stream.
+
+    Being an empty ``str``, it is harmless wherever block output is
+    concatenated instead of streamed (``super()``, ``self.block()``,
+    ``[% set %]`` captures).
+    """
+
+
+FLUSH = _FlushMarker()
+
+
+class _FlushingBlock:
+    """Block render function that emits ``FLUSH`` around its output.
+
+    Compares equal to the wrapped function so ``Context.super`` can still
+    locate it in the block stack.
+    """
+
+    __slots__ = ("func",)
+
+    def __init__(self, func: Callable[..., t.Any]) -> None:
+        self.func = func
+
+    def __eq__(self, other: object) -> bool:
+        return other is self or other is self.func
+
+    def __hash__(self) -> int:
+        return hash(self.func)
+
+    async def __call__(self, context: t.Any) -> AsyncIterator[str]:
+        yield FLUSH
+        events = self.func(context)
+        if hasattr(events, "__aiter__"):
+            async for event in events:
+                yield event
+        else:
+            for event in events:
+                yield event
+        yield FLUSH
+
+
+class _FlushingStack(list[t.Any]):
+    """Block stack created by ``extends``; wraps the first (active) block."""
+
+    def append(self, func: t.Any) -> None:
+        super().append(func if self else _FlushingBlock(func))
+
+
+class _FlushingBlocks(dict[str, list[t.Any]]):
+    """``Context.blocks`` that wraps the active function of flush blocks.
+
+    Parent templates add their blocks through ``setdefault`` while the child
+    renders, so blocks only defined by a layout are wrapped as they appear.
+    """
+
+    def __init__(self, blocks: dict[str, list[t.Any]], names: frozenset[str]) -> None:
+        super().__init__(blocks)
+        self.names = names
+        for name in names & blocks.keys():
+            stack = blocks[name]
+            self[name] = [_FlushingBlock(stack[0]), *stack[1:]]
+
+    def setdefault(self, key: str, default: t.Any = None) -> t.Any:
+        if key in self.names and key not in self:
+            default = _FlushingStack(default or ())
+        return super().setdefault(key, default)
+
+
+async def iter_template_chunks(
+    template: t.Any,
+    context: dict[str, t.Any],
+    flush_blocks: Iterable[str] = DEFAULT_FLUSH_BLOCKS,
+) -> AsyncIterator[str]:
+    """Render ``template`` and yield output chunks at block boundaries.
+
+    Args:
+        template: Compiled Jinja2 template (async environment)
+        context: Template context
+        flush_blocks: Block names whose start and end are flush points
+    """
+    render_context = template.new_context(context)
+    render_context.blocks = _FlushingBlocks(
+        render_context.blocks, frozenset(flush_blocks)
+    )
+    buffer: list[str] = []
+    try:
+        async for event in template.root_render_func(render_context):
+            if event is FLUSH:
+                if buffer:
+                    yield "".join(buffer)
+                    buffer.clear()
+            else:
+                buffer.append(event)
+    except Exception:
+        yield template.environment.handle_exception()
+    if buffer:
+        yield "".join(buffer)
+
+
+class StreamingTemplateResponse(StreamingResponse):
+    """HTML response streamed from a template, flushed at block boundaries.
+
+    The status code and headers are sent before rendering starts; an error
+    raised mid-render aborts the response body rather than turning it into
+    an error page.
+    """
+
+    media_type = "text/html"
+
+    def __init__(
+        self,
+        template: t.Any,
+        context: dict[str, t.Any],
+        status_code: int = 200,
+        headers: t.Mapping[str, str] | None = None,
+        media_type: str | None = None,
+        background: BackgroundTask | None = None,
+        flush_blocks: Iterable[str] = DEFAULT_FLUSH_BLOCKS,
+    ) -> None:
+        self.template = template
+        self.context = context
+        super().__init__(
+            iter_template_chunks(template, context, flush_blocks),
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            background=background,
+        )
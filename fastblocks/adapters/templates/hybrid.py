@@ -39,11 +39,9 @@ from starlette.requests import Request
 from starlette.responses import Response
 
 from ._advanced_manager import HybridTemplatesManager, HybridTemplatesSettings
-from ._async_filters import FASTBLOCKS_ASYNC_FILTERS
 from ._async_renderer import AsyncTemplateRenderer, RenderContext, RenderMode
 from ._block_renderer import BlockRenderer, BlockRenderRequest, BlockUpdateMode
-from ._enhanced_filters import ENHANCED_ASYNC_FILTERS, ENHANCED_FILTERS
-from ._filters import FASTBLOCKS_FILTERS
+from ._registration import install_lazy_filters
 from .jinja2 import Templates
 
 
@@ -96,27 +94,14 @@ class HybridTemplates:
         if not self.base_templates:
             return
 
-        all_filters = FASTBLOCKS_FILTERS | ENHANCED_FILTERS
-
-        all_async_filters = FASTBLOCKS_ASYNC_FILTERS | ENHANCED_ASYNC_FILTERS
-
-        # Register with main app environment
+        # Filter families are imported when a template first uses them.
         if self.base_templates.app and hasattr(self.base_templates.app.env, "filters"):
-            for name, filter_func in all_filters.items():
-                self.base_templates.app.env.filters[name] = filter_func
+            install_lazy_filters(self.base_templates.app.env)
 
-            for name, async_filter_func in all_async_filters.items():
-                self.base_templates.app.env.filters[name] = async_filter_func
-
-        # Register with admin environment if available
         if self.base_templates.admin and hasattr(
             self.base_templates.admin.env, "filters"
         ):
-            for name, filter_func in all_filters.items():
-                self.base_templates.admin.env.filters[name] = filter_func
-
-            for name, async_filter_func in all_async_filters.items():
-                self.base_templates.admin.env.filters[name] = async_filter_func
+            install_lazy_filters(self.base_templates.admin.env)
 
     # Template Validation API
     async def validate_template(
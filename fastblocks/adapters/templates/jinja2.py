@@ -32,12 +32,16 @@ Created: 2025-01-12
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import inspect
 import re
 
 # Import Oneiric registration helper
 import sys
 import typing as t
+import weakref
 from ast import literal_eval
+from collections import OrderedDict
 from contextlib import suppress
 from functools import lru_cache
 from html.parser import HTMLParser
@@ -94,22 +98,70 @@ from jinja2.ext import Extension, i18n, loopcontrols
 from jinja2.ext import debug as jinja_debug
 from jinja2_async_environment import AsyncRedisBytecodeCache
 from jinja2_async_environment.loaders import AsyncBaseLoader, SourceType
+from starlette.responses import HTMLResponse
 from starlette_async_jinja import AsyncJinja2Templates
 from fastblocks.actions.sync.strategies import SyncDirection, SyncStrategy
 from fastblocks.actions.sync.templates import sync_templates
 
+from ._access_trace import (
+    DEFAULT_WARMUP_ENTRIES,
+    AccessKind,
+    AccessTrace,
+    get_startup_warmup,
+    warm_from_trace,
+)
 from ._base import TemplatesBase, TemplatesBaseSettings
+from ._dependency_graph import (
+    TemplateDependencyGraph,
+    prefetch_dependencies,
+    track_dependencies,
+)
+from ._enhanced_cache import get_enhanced_cache
+from ._partials import find_target_block, render_target_block
+from ._registration import (
+    install_lazy_filters,
+    install_lazy_globals,
+    resolve_extension_classes,
+)
+from ._shared_cache import SharedRenderCache
+from ._streaming import DEFAULT_FLUSH_BLOCKS, StreamingTemplateResponse
 
 Cache, Storage, Models = None, None, None
 
-_TEMPLATE_REPLACEMENTS = [
-    (b"{{", b"[["),
-    (b"}}", b"]]"),
-    (b"{%", b"[%"),
-    (b"%}", b"%]"),
-]
 _HTTP_TO_HTTPS = (b"http://", b"https://")
 
+# Single-pass translator for _apply_template_replacements. Tag bodies are
+# matched possessively and may contain quoted strings, so a "}}" inside a
+# string literal never closes the tag; raw blocks are matched whole.
+_TAG_BODY = rb"""(?:[^%s"']++|%s(?!\})|"(?:[^"\\]|\\.)*+"|'(?:[^'\\]|\\.)*+')*+"""
+_TEMPLATE_TOKEN = re.compile(
+    rb"\{%(?P<raw_open>-?\s*raw\s*-?)%\}(?P<raw_body>.*?)"
+    rb"\{%(?P<raw_close>-?\s*endraw\s*-?)%\}"
+    rb"|\{\{(?P<var>" + _TAG_BODY % (rb"}", rb"\}") + rb")\}\}"
+    rb"|\{%(?P<block>" + _TAG_BODY % (rb"%", rb"%") + rb")%\}",
+    re.DOTALL,
+)  # REGEX OK: Jinja2 tag tokenizer for delimiter translation
+_TEMPLATE_TOKEN_DEPLOYED = re.compile(
+    _TEMPLATE_TOKEN.pattern + rb"|http://", re.DOTALL
+)  # REGEX OK: tag tokenizer plus insecure URL scheme
+_REPLACEMENT_CACHE_SIZE = 512
+_replacement_cache: OrderedDict[tuple[bytes, bool, bool], bytes] = OrderedDict()
+
+DEFAULT_DELIMITERS: dict[str, str] = {
+    "block_start_string": "[%",
+    "block_end_string": "%]",
+    "variable_start_string": "[[",
+    "variable_end_string": "]]",
+    "comment_start_string": "[#",
+    "comment_end_string": "#]",
+}
+# Import paths of the extensions every environment loads (see init_envs).
+DEFAULT_EXTENSIONS: tuple[str, ...] = (
+    "jinja2.ext.loopcontrols",
+    "jinja2.ext.i18n",
+    "jinja2.ext.debug",
+)
+
 _ATTR_PATTERN_CACHE: dict[str, re.Pattern[str]] = {}
 
 
@@ -122,36 +174,130 @@ def _get_attr_pattern(attr: str) -> re.Pattern[str]:
     return _ATTR_PATTERN_CACHE[attr]
 
 
+# Dependencies resolved by ``Templates.init`` before any request is served.
+# Sync constructors (loaders, settings) read from here instead of bridging
+# into async resolution from inside a running event loop.
+_resolved_dependencies: dict[str, t.Any] = {}
+
+
 def _try_resolve_sync(key: str) -> t.Any:
     """Helper to try to get a Oneiric dependency synchronously.
 
-    This is needed for __init__ methods that can't be async.
+    This is needed for __init__ methods that can't be async. It never
+    drives the event loop: dependencies only available through async
+    resolution must be primed with ``_prime_dependencies`` first.
     """
+    if key in _resolved_dependencies:
+        return _resolved_dependencies[key]
     try:
         # For fallback and testing - use depends.get if it exists
         if hasattr(depends, "get"):
             return getattr(depends, "get")(key)
+        result = depends.resolve("fastblocks", key)
+    except Exception:
+        return None
+    if inspect.isawaitable(result):
+        with suppress(AttributeError):
+            result.close()  # type: ignore[union-attr]
+    return None
+
+
+def _adapter_enabled(key: str) -> bool:
+    """Whether an adapter is registered for ``key``, without resolving it."""
+    if key in _resolved_dependencies:
+        return _resolved_dependencies[key] is not None
+    if hasattr(depends, "get"):
+        return _try_resolve_sync(key) is not None
+    with suppress(Exception):
+        return depends.resolve("fastblocks", key) is not None
+    return False
 
-        # Try to await the resolve call synchronously
-        import asyncio
 
+async def _resolve_async(key: str) -> t.Any:
+    """Resolve a Oneiric dependency on the caller's event loop."""
+    try:
+        if hasattr(depends, "get"):
+            return getattr(depends, "get")(key)
         result = depends.resolve("fastblocks", key)
-        loop = asyncio.new_event_loop()
-        try:
-            return loop.run_until_complete(result)
-        except Exception:
-            return None
+        return await result if inspect.isawaitable(result) else None
     except Exception:
         return None
 
 
-def _apply_template_replacements(source: bytes, deployed: bool = False) -> bytes:
-    for old_pattern, new_pattern in _TEMPLATE_REPLACEMENTS:
-        source = source.replace(old_pattern, new_pattern)
-    if deployed:
-        source = source.replace(*_HTTP_TO_HTTPS)
+async def _prime_dependencies(*keys: str) -> None:
+    """Resolve ``keys`` once at startup for later sync lookups.
 
-    return source
+    Only resolved values are kept: a dependency registered after startup is
+    looked up again instead of staying absent for the life of the process.
+    """
+    for key in keys:
+        if _resolved_dependencies.get(key) is None:
+            value = await _resolve_async(key)
+            if value is not None:
+                _resolved_dependencies[key] = value
+
+
+def _with_vary(headers: dict[str, str], *names: str) -> dict[str, str]:
+    """Return a copy of ``headers`` with ``names`` added to ``Vary``."""
+    current = [v.strip() for v in headers.get("Vary", "").split(",") if v.strip()]
+    known = {v.lower() for v in current}
+    current.extend(name for name in names if name.lower() not in known)
+    return headers | {"Vary": ", ".join(current)}
+
+
+def _upgrade_http(chunk: bytes, deployed: bool) -> bytes:
+    return chunk.replace(*_HTTP_TO_HTTPS) if deployed else chunk
+
+
+def _translate_token(match: re.Match[bytes], deployed: bool) -> bytes:
+    kind = match.lastgroup
+    if kind == "var":
+        return b"[[" + _upgrade_http(match["var"], deployed) + b"]]"
+    if kind == "block":
+        return b"[%" + _upgrade_http(match["block"], deployed) + b"%]"
+    if kind == "raw_close":
+        # Raw block bodies are template text, never template syntax.
+        return b"".join(
+            (
+                b"[%",
+                match["raw_open"],
+                b"%]",
+                _upgrade_http(match["raw_body"], deployed),
+                b"[%",
+                match["raw_close"],
+                b"%]",
+            )
+        )
+    return _HTTP_TO_HTTPS[1]
+
+
+def _apply_template_replacements(
+    source: bytes, deployed: bool = False, translate: bool = True
+) -> bytes:
+    """Translate ``{{ }}``/``{% %}`` tags to ``[[ ]]``/``[% %]`` in one pass.
+
+    Only real tag delimiters are rewritten: text outside tags, quoted string
+    literals inside tags and the bodies of ``{% raw %}`` blocks keep their
+    braces. When ``deployed`` is set, ``http://`` is rewritten to
+    ``https://`` everywhere. Results are memoized by content hash so
+    reloading an unchanged template skips the scan.
+    """
+    if not translate and not deployed:
+        return source
+    key = (hashlib.blake2b(source, digest_size=16).digest(), deployed, translate)
+    cached = _replacement_cache.get(key)
+    if cached is not None:
+        _replacement_cache.move_to_end(key)
+        return cached
+    if translate:
+        token = _TEMPLATE_TOKEN_DEPLOYED if deployed else _TEMPLATE_TOKEN
+        result = token.sub(lambda m: _translate_token(m, deployed), source)
+    else:
+        result = _upgrade_http(source, deployed)
+    _replacement_cache[key] = result
+    if len(_replacement_cache) > _REPLACEMENT_CACHE_SIZE:
+        _replacement_cache.popitem(last=False)
+    return result
 
 
 class BaseTemplateLoader(AsyncBaseLoader):  # type: ignore
@@ -791,16 +937,38 @@ def reload_loader() -> None:
 class TemplatesSettings(TemplatesBaseSettings):
     loader: str | None = None
     extensions: list[str] = []
-    delimiters: dict[str, str] = {
-        "block_start_string": "[%",
-        "block_end_string": "%]",
-        "variable_start_string": "[[",
-        "variable_end_string": "]]",
-        "comment_start_string": "[#",
-        "comment_end_string": "#]",
-    }
+    delimiters: dict[str, str] = dict(DEFAULT_DELIMITERS)
     globals: dict[str, t.Any] = {}
     context_processors: list[str] = []
+    # Path to a bundle built by ``python -m fastblocks compile-templates``.
+    # When set, the app environment serves bundled templates without
+    # compiling them and falls back to the regular loaders for the rest.
+    precompiled_bundle: str | None = None
+    # Stream ``render_template`` responses by default; routes can still
+    # choose per call with ``stream=``. Streamed output is flushed when
+    # rendering enters or leaves one of ``stream_flush_blocks``.
+    stream_responses: bool = False
+    stream_flush_blocks: list[str] = list(DEFAULT_FLUSH_BLOCKS)
+    # Where BlockRenderer persists the blocks it discovered in each template,
+    # keyed by source checksum, so restarts skip re-parsing. None disables it.
+    block_index: str | None = "tmp/block_index.json"
+    # Answer HTMX requests whose ``HX-Target`` id names a block of the page
+    # template (``#sidebar`` or ``#main-content`` for ``main_content``) with
+    # just that block. Routes can still choose per call with
+    # ``htmx_partial=``; ambiguous or unknown targets render the full page.
+    htmx_partials: bool = False
+    # Where the names and use counts of rendered templates and HTMX target
+    # blocks are saved. On startup the ``warmup_entries`` most used are
+    # loaded before the ``warmup`` health check reports healthy, waiting at
+    # most ``warmup_timeout`` seconds. None disables it.
+    access_trace: str | None = "tmp/access_trace.json"
+    warmup_entries: int = DEFAULT_WARMUP_ENTRIES
+    warmup_timeout: float | None = 30.0
+    # File mapped by every worker process of the host to share one copy of
+    # the enhanced cache's rendered output, e.g. under /dev/shm; use a path
+    # per release. None keeps each worker's cache to itself.
+    shared_cache: str | None = None
+    shared_cache_size: int = SharedRenderCache.DEFAULT_SIZE
 
     def __init__(self, **data: t.Any) -> None:
         from pydantic import BaseModel
@@ -824,7 +992,17 @@ class Templates(TemplatesBase):
         self.enabled_admin = get_adapter("admin")
         self.enabled_app = self._get_app_adapter()
         self._admin = None
-        self._admin_initialized = False
+        # One graph per environment: app and admin may reuse template names.
+        self.dependency_graphs: dict[str, TemplateDependencyGraph] = {}
+        self.access_trace: AccessTrace | None = None
+        self._warmup_task: asyncio.Task[t.Any] | None = None
+        self._trace_save_task: asyncio.Task[None] | None = None
+        # Called with the names invalidated after a template changed, to
+        # drop rendered output held outside this adapter.
+        self.change_listeners: list[t.Callable[[set[str]], t.Awaitable[t.Any]]] = []
+        self._invalidation_tasks: set[asyncio.Task[None]] = set()
+        # App templates render_template already prefetched.
+        self._prefetched: set[str] = set()
 
     def _get_app_adapter(self) -> t.Any:
         app_adapter = get_adapter("app")
@@ -839,34 +1017,12 @@ class Templates(TemplatesBase):
 
     @property
     def admin(self) -> AsyncJinja2Templates | None:
-        if not self._admin_initialized and self.enabled_admin:
-            import asyncio
-
-            loop = asyncio.get_event_loop()
-            if (
-                hasattr(self, "_admin_cache")
-                and hasattr(self, "admin_searchpaths")
-                and self.admin_searchpaths is not None
-            ):
-                debug("Initializing admin templates environment")
-                self._admin = loop.run_until_complete(
-                    self.init_envs(
-                        self.admin_searchpaths,
-                        admin=True,
-                        cache=self._admin_cache,
-                    ),
-                )
-            else:
-                debug(
-                    "Skipping admin templates initialization - missing cache or searchpaths"
-                )
-            self._admin_initialized = True
+        # Built eagerly by ``init``; never initialized lazily on a request.
         return self._admin
 
     @admin.setter
     def admin(self, value: AsyncJinja2Templates | None) -> None:
         self._admin = value
-        self._admin_initialized = True
 
     def get_loader(self, template_paths: list[AsyncPath]) -> ChoiceLoader:
         searchpaths: list[AsyncPath] = []
@@ -904,21 +1060,15 @@ class Templates(TemplatesBase):
         admin: bool = False,
         cache: t.Any | None = None,
     ) -> AsyncJinja2Templates:
-        _extensions: list[t.Any] = [loopcontrols, i18n, jinja_debug]
-        _imported_extensions = [
-            import_module(e)
-            for e in self.config.templates.extensions  # type: ignore[attr-defined]
+        # Configured extensions are added up front: templates loaded from
+        # the bytecode cache or a precompiled bundle are never parsed, yet
+        # need the filters and globals extensions register.
+        _extensions: list[t.Any] = [
+            loopcontrols,
+            i18n,
+            jinja_debug,
+            *resolve_extension_classes(self.config.templates.extensions),  # type: ignore[attr-defined]
         ]
-        for e in _imported_extensions:
-            _extensions.extend(
-                [
-                    v
-                    for v in vars(e).values()
-                    if isclass(v)
-                    and v.__name__ != "Extension"
-                    and issubclass(v, Extension)
-                ],
-            )
         bytecode_cache = None
         if cache is not None:
             bytecode_cache = AsyncRedisBytecodeCache(prefix="bccache", client=cache)
@@ -942,6 +1092,19 @@ class Templates(TemplatesBase):
             templates.env.loader = literal_eval(self.config.templates.loader)  # type: ignore[attr-defined]
         for delimiter, value in self.config.templates.delimiters.items():  # type: ignore[attr-defined]
             setattr(templates.env, delimiter, value)
+        graph = TemplateDependencyGraph()
+        track_dependencies(
+            templates.env,
+            graph,
+            on_change=lambda name: self.template_changed(name, admin=admin),
+        )
+        self.dependency_graphs["admin" if admin else "app"] = graph
+        # FastBlocks filter families and adapter globals are imported and
+        # resolved on first use rather than here.
+        install_lazy_filters(templates.env)
+        install_lazy_globals(templates.env, _try_resolve_sync, _adapter_enabled)
+        if not admin:
+            self._use_precompiled_bundle(templates)
         # Type cast globals dict to avoid assignment type errors
         globals_dict: dict[str, t.Any] = templates.env.globals
         globals_dict["config"] = self.config  # type: ignore[attr-defined]
@@ -963,15 +1126,129 @@ class Templates(TemplatesBase):
             globals_dict[k] = v
         return templates
 
-    def _resolve_cache(self, cache: t.Any | None) -> t.Any | None:
+    def _use_precompiled_bundle(self, templates: AsyncJinja2Templates) -> None:
+        bundle_path = getattr(self.config.templates, "precompiled_bundle", None)  # type: ignore[attr-defined]
+        if not isinstance(bundle_path, str) or not bundle_path:
+            return
+        from ._precompile import PrecompiledLoader, TemplateBundle
+
+        try:
+            bundle = TemplateBundle.load(bundle_path)
+        except (OSError, ValueError, KeyError) as e:
+            debug(f"Ignoring precompiled template bundle {bundle_path}: {e}")
+            return
+        templates.env.loader = PrecompiledLoader(bundle, templates.env.loader)
+        debug(f"Loaded {len(bundle)} precompiled templates from {bundle_path}")
+
+    def _environment_and_graph(
+        self, admin: bool
+    ) -> tuple[t.Any, TemplateDependencyGraph] | tuple[None, None]:
+        templates = self._admin if admin else self.app
+        graph = self.dependency_graphs.get("admin" if admin else "app")
+        if templates is None or graph is None:
+            return None, None
+        return templates.env, graph
+
+    async def prefetch_template(self, name: str, admin: bool = False) -> t.Any:
+        """Load ``name`` with all of its parents, includes and imports.
+
+        Templates already cached and tracked are returned as-is; their
+        dependencies were loaded with them.
+        """
+        env, graph = self._environment_and_graph(admin)
+        if env is None or graph is None:
+            return None
+        if name in graph and env.cache is not None and env.loader is not None:
+            with suppress(Exception):
+                cached = env.cache.get((weakref.ref(env.loader), name))
+                if cached is not None:
+                    return cached
+        return await prefetch_dependencies(env, name, graph)
+
+    async def invalidate_template(
+        self, name: str, admin: bool = False, recompiled: bool = False
+    ) -> set[str]:
+        """Drop ``name`` and every template depending on it from all caches.
+
+        Clears the environment's template cache, the Redis bytecode buckets
+        and the Redis source cache for exactly the affected templates.
+
+        Args:
+            name: Template whose source changed
+            admin: Whether ``name`` belongs to the admin environment
+            recompiled: ``name`` was already compiled from its new source,
+                so only the templates depending on it are dropped
+
+        Returns:
+            The invalidated template names, for dropping rendered output.
+        """
+        env, graph = self._environment_and_graph(admin)
+        affected = {name} if graph is None else graph.affected_by(name)
+        if not admin:
+            # Prefetch their new dependencies on the next render.
+            self._prefetched.difference_update(affected)
+        if env is None or graph is None:
+            return affected
+        stale = affected - {name} if recompiled else affected
+        if env.cache is not None:
+            for key in list(env.cache.keys()):
+                if key[1] in stale:
+                    with suppress(KeyError):
+                        del env.cache[key]
+        await asyncio.gather(
+            *(self._drop_cached_template(env, n, graph.filename(n)) for n in stale)
+        )
+        debug(f"Invalidated templates: {sorted(affected)}")
+        return affected
+
+    def template_changed(self, name: str, admin: bool = False) -> None:
+        """Schedule invalidation of ``name`` after its source changed.
+
+        Called from the template's compile, which cannot wait for the
+        cache deletes; outside an event loop nothing is scheduled.
+        """
+        with suppress(RuntimeError):
+            task = asyncio.get_running_loop().create_task(
+                self._invalidate_changed(name, admin)
+            )
+            self._invalidation_tasks.add(task)
+            task.add_done_callback(self._invalidation_tasks.discard)
+
+    async def _invalidate_changed(self, name: str, admin: bool) -> None:
+        affected = await self.invalidate_template(name, admin, recompiled=True)
+        for listener in self.change_listeners:
+            with suppress(Exception):
+                await listener(affected)
+
+    @staticmethod
+    async def _drop_cached_template(
+        env: t.Any, name: str, filename: str | None
+    ) -> None:
+        bcc = env.bytecode_cache
+        if bcc is not None and hasattr(bcc, "client"):
+            with suppress(Exception):
+                key = bcc.get_cache_key(name, filename or name)
+                await bcc.client.delete(bcc.get_bucket_name(key))
+        cache = _try_resolve_sync("cache")
+        if cache is not None and filename:
+            with suppress(Exception):
+                await cache.delete(Templates.get_cache_key(AsyncPath(filename)))
+
+    async def _resolve_cache(self, cache: t.Any | None) -> t.Any | None:
         if cache is None:
-            cache = _try_resolve_sync("cache")
+            cache = await _resolve_async("cache")
         return cache
 
     async def _setup_admin_templates(self, cache: t.Any | None) -> None:
         if self.enabled_admin:
             self.admin_searchpaths = await self.get_searchpaths(self.enabled_admin)
-            self._admin_cache = cache
+            if self.admin_searchpaths is not None:
+                debug("Initializing admin templates environment")
+                self._admin = await self.init_envs(
+                    self.admin_searchpaths, admin=True, cache=cache
+                )
+            else:
+                debug("Skipping admin templates initialization - missing searchpaths")
 
     def _log_loader_info(self) -> None:
         if self.app and self.app.env.loader and hasattr(self.app.env.loader, "loaders"):
@@ -1040,17 +1317,20 @@ class Templates(TemplatesBase):
         return render_component
 
     async def init(self, cache: t.Any | None = None) -> None:
-        cache = self._resolve_cache(cache)
+        # Resolve everything sync constructors need before building loaders,
+        # so nothing bridges sync-to-async once requests are being served.
+        await _prime_dependencies("storage", "cache", "config", "models")
+        cache = await self._resolve_cache(cache)
         app_adapter = self.enabled_app
         if app_adapter is None:
-            app_adapter = _try_resolve_sync("app")
+            app_adapter = await _resolve_async("app")
             if app_adapter:
                 debug("Retrieved app adapter from dependency injection")
             else:
                 try:
                     from ..app.default import App
 
-                    app_adapter = _try_resolve_sync("app") or App()
+                    app_adapter = App()
                     debug("Created app adapter by direct import")
                     register_candidate(
                         depends,
@@ -1079,11 +1359,66 @@ class Templates(TemplatesBase):
             },
         )
         self._admin = None
-        self._admin_initialized = False
         await self._setup_admin_templates(cache)
         self._log_loader_info()
         self._log_extension_info()
         await self._clear_debug_cache(cache)
+        self._attach_shared_cache()
+        await self._start_warmup()
+
+    def _attach_shared_cache(self) -> None:
+        """Back the enhanced cache with the host's shared cache, if set."""
+        settings = getattr(self.config, "templates", None)  # type: ignore[attr-defined]
+        path = getattr(settings, "shared_cache", None)
+        cache = get_enhanced_cache()
+        if not isinstance(path, str) or not path or cache.shared_cache is not None:
+            return
+        with suppress(OSError, ValueError):
+            cache.shared_cache = SharedRenderCache(
+                path, size=getattr(settings, "shared_cache_size", None)
+            )
+
+    async def _start_warmup(self) -> None:
+        """Load the access trace and warm the most used templates from it.
+
+        Warming runs in the background; until it finishes the ``warmup``
+        health check reports the worker degraded. The enhanced cache saves
+        the trace on shutdown.
+        """
+        settings = getattr(self.config, "templates", None)  # type: ignore[attr-defined]
+        path = getattr(settings, "access_trace", None)
+        if not isinstance(path, str) or not path:
+            return
+        self.access_trace = AccessTrace(path)
+        await self.access_trace.load()
+        get_enhanced_cache().access_trace = self.access_trace
+        if not len(self.access_trace):
+            return
+        get_startup_warmup().running = True
+        self._warmup_task = asyncio.create_task(
+            warm_from_trace(
+                self.access_trace,
+                {
+                    AccessKind.TEMPLATE: self.prefetch_template,
+                    AccessKind.BLOCK: self._prefetch_block_template,
+                },
+                top_n=getattr(settings, "warmup_entries", DEFAULT_WARMUP_ENTRIES),
+                timeout=getattr(settings, "warmup_timeout", None),
+            )
+        )
+
+    async def _prefetch_block_template(self, block_id: str) -> t.Any:
+        return await self.prefetch_template(block_id.rpartition(":")[0])
+
+    def _record_access(self, kind: AccessKind, name: str) -> None:
+        trace = self.access_trace
+        if trace is None:
+            return
+        trace.record(kind, name)
+        if trace.save_due and (
+            self._trace_save_task is None or self._trace_save_task.done()
+        ):
+            self._trace_save_task = asyncio.create_task(trace.save())
 
     @staticmethod
     def get_attr(html: str, attr: str) -> str | None:
@@ -1115,6 +1450,8 @@ class Templates(TemplatesBase):
         context: dict[str, t.Any] | None = None,
         status_code: int = 200,
         headers: dict[str, str] | None = None,
+        stream: bool | None = None,
+        htmx_partial: bool | None = None,
     ) -> t.Any:
         if context is None:
             context = {}
@@ -1123,6 +1460,27 @@ class Templates(TemplatesBase):
 
         templates_env = self.app
         if templates_env:
+            self._record_access(AccessKind.TEMPLATE, template)
+            if template not in self._prefetched:
+                self._prefetched.add(template)
+                with suppress(Exception):
+                    await self.prefetch_template(template)
+            settings = getattr(self.config, "templates", None)  # type: ignore[attr-defined]
+            if htmx_partial is None:
+                htmx_partial = getattr(settings, "htmx_partials", False) is True
+            if htmx_partial:
+                headers = _with_vary(headers, "HX-Request", "HX-Target")
+                partial = await self.render_htmx_target(
+                    request, template, context, status_code, headers
+                )
+                if partial is not None:
+                    return partial
+            if stream is None:
+                stream = getattr(settings, "stream_responses", False) is True
+            if stream:
+                return await self.stream_template(
+                    request, template, context, status_code, headers
+                )
             return await templates_env.TemplateResponse(
                 request=request,
                 name=template,
@@ -1130,14 +1488,83 @@ class Templates(TemplatesBase):
                 status_code=status_code,
                 headers=headers,
             )
-        from starlette.responses import HTMLResponse
-
         return HTMLResponse(
             content=f"<html><body>Template {template} not found</body></html>",
             status_code=404,
             headers=headers,
         )
 
+    async def render_htmx_target(
+        self,
+        request: t.Any,
+        template: str,
+        context: dict[str, t.Any],
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+    ) -> HTMLResponse | None:
+        """Render only the block an HTMX request targets, if there is one.
+
+        Returns None for non-HTMX, boosted and history-restore requests, and
+        when ``HX-Target`` maps to no block or to several; the caller then
+        renders the full page.
+        """
+        htmx = getattr(request, "scope", {}).get("htmx")
+        if (
+            self.app is None
+            or not htmx
+            or htmx.boosted
+            or htmx.history_restore_request
+            or not htmx.target
+        ):
+            return None
+        loaded = await self.app.env.get_template_async(template)
+        # Context processors run once per request: here only when a block
+        # matches, else in the full-page render the caller falls back to.
+        unprepared = context | {"request": request}
+        if await find_target_block(loaded, htmx.target, unprepared) is None:
+            return None
+        prepared = self.app._prepare_template_context(context, request)
+        rendered = await render_target_block(loaded, htmx.target, prepared)
+        if rendered is None:
+            return None
+        block_name, content = rendered
+        self._record_access(AccessKind.BLOCK, f"{template}:{block_name}")
+        debug(f"Rendered block {block_name!r} of {template} for #{htmx.target}")
+        return HTMLResponse(content, status_code=status_code, headers=headers)
+
+    async def stream_template(
+        self,
+        request: t.Any,
+        template: str,
+        context: dict[str, t.Any] | None = None,
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+        flush_blocks: list[str] | None = None,
+    ) -> StreamingTemplateResponse:
+        """Render ``template`` as a response streamed at block boundaries.
+
+        Headers are sent before rendering starts, so time to first byte no
+        longer waits for the whole page.
+        """
+        if self.app is None:
+            msg = "Templates not initialized"
+            raise RuntimeError(msg)
+        context = self.app._prepare_template_context(context, request)
+        loaded = await self.app.env.get_template_async(template)
+        if flush_blocks is None:
+            flush_blocks = getattr(
+                self.config.templates,  # type: ignore[attr-defined]
+                "stream_flush_blocks",
+                list(DEFAULT_FLUSH_BLOCKS),
+            )
+        return StreamingTemplateResponse(
+            loaded,
+            context,
+            status_code=status_code,
+            headers=headers,
+            flush_blocks=flush_blocks,
+        )
+
     @track_template_render
     async def render_component(
         self,
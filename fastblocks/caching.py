@@ -123,6 +123,8 @@ class CacheUtils:
         (200, 203, 204, 206, 300, 301, 404, 405, 410, 414, 501),
     )
     ONE_YEAR = 60 * 60 * 24 * 365
+    # Streamed responses larger than this are sent but not cached.
+    MAX_STREAMED_BODY = 1024 * 1024
     INVALIDATING_METHODS = frozenset((POST, PUT, PATCH, DELETE))
 
     @staticmethod
@@ -150,6 +152,7 @@ class CacheUtils:
 cacheable_methods = CacheUtils.CACHEABLE_METHODS
 cacheable_status_codes = CacheUtils.CACHEABLE_STATUS_CODES
 one_year = CacheUtils.ONE_YEAR
+max_streamed_body = CacheUtils.MAX_STREAMED_BODY
 invalidating_methods = CacheUtils.INVALIDATING_METHODS
 
 
@@ -783,6 +786,8 @@ class CacheResponder:
         self.initial_message: Message = {}
         self.is_response_cacheable = True
         self.request: Request | None = None
+        self.streamed_body: list[bytes] | None = None
+        self.streamed_size = 0
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] != "http":
@@ -815,15 +820,8 @@ class CacheResponder:
             return
         if message["type"] != "http.response.body":
             return
-        if message.get("more_body", False):
-            _safe_log(
-                self.logger,
-                "debug",
-                "response_not_cacheable reason=is_streaming",
-            )
-            self.is_response_cacheable = False
-            await send(self.initial_message)
-            await send(message)
+        if message.get("more_body", False) or self.streamed_body is not None:
+            await self._send_streamed(message, send=send)
             return
         if self.request is None:
             return
@@ -844,6 +842,42 @@ class CacheResponder:
         await send(self.initial_message)
         await send(message)
 
+    async def _send_streamed(self, message: Message, *, send: Send) -> None:
+        # Streamed chunks go out as they arrive (headers are already on the
+        # wire, so this response keeps them as-is); a copy of the body is
+        # stored once the stream completes so later requests are cache hits.
+        if self.streamed_body is None:
+            _safe_log(self.logger, "debug", "cache_stream_tee start")
+            self.streamed_body = []
+            await send(self.initial_message)
+        body = message.get("body", b"")
+        self.streamed_size += len(body)
+        if self.streamed_size > max_streamed_body:
+            _safe_log(
+                self.logger, "debug", "response_not_cacheable reason=stream_too_large"
+            )
+            self.is_response_cacheable = False
+            self.streamed_body = None
+            await send(message)
+            return
+        self.streamed_body.append(body)
+        await send(message)
+        if message.get("more_body", False) or self.request is None:
+            return
+        response = Response(
+            content=b"".join(self.streamed_body),
+            status_code=self.initial_message["status"],
+        )
+        response.raw_headers = list(self.initial_message["headers"])
+        self.streamed_body = None
+        with suppress(ResponseNotCachable):
+            await set_in_cache(
+                response,
+                request=self.request,
+                cache=self.cache,
+                rules=self.rules,
+            )
+
     async def send_then_invalidate(self, message: Message, *, send: Send) -> None:
         if self.request is None:
             return
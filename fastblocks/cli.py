@@ -727,6 +727,94 @@ def format_template(
     asyncio.run(format_file())
 
 
+async def _resolve_template_searchpaths() -> list[Path]:
+    """Ask the app's templates adapter for its filesystem searchpaths."""
+    from .adapters.templates.jinja2 import FileSystemLoader, Templates
+
+    templates = Templates()
+    await templates.init()
+    loader = templates.app.env.loader if templates.app else None
+    for child in getattr(loader, "loaders", []):
+        if isinstance(child, FileSystemLoader):
+            return [Path(str(p)) for p in child.searchpath]
+    return []
+
+
+def _display_bundle_result(result: t.Any) -> None:
+    """Report the outcome of a template bundle build."""
+    for name, error in result.errors.items():
+        console.print(f"  [yellow]skipped[/yellow] {name}: {error}")
+    color = "green" if result.ok else "yellow"
+    console.print(
+        f"[{color}]✓ Compiled {len(result.compiled)} templates into "
+        f"{result.output}[/{color}]"
+    )
+
+
+@cli.command()
+def compile_templates(
+    searchpath: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--searchpath",
+            "-s",
+            help="Template directory, in lookup order (repeatable). "
+            "Defaults to the app's configured searchpaths.",
+        ),
+    ] = None,
+    output: Annotated[
+        str, typer.Option("--output", "-o", help="Bundle file to write")
+    ] = "templates.bundle",
+    workers: Annotated[
+        int, typer.Option("--workers", "-w", help="Compile processes (0 = all CPUs)")
+    ] = 0,
+    translate_delimiters: Annotated[
+        bool,
+        typer.Option(
+            "--translate-delimiters",
+            help="Translate {{ }}/{% %} sources to [[ ]]/[% %] before compiling",
+        ),
+    ] = False,
+    deployed: Annotated[
+        bool, typer.Option("--deployed", help="Apply the deployed http->https rewrite")
+    ] = False,
+    extension: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--extension",
+            "-e",
+            help="Extra Jinja2 extension module (matches templates.extensions)",
+        ),
+    ] = None,
+) -> None:
+    """Compile all templates ahead of time into a deployable bundle.
+
+    Point ``templates.precompiled_bundle`` at the output file so workers
+    load compiled templates directly instead of compiling them at runtime.
+    """
+    from .adapters.templates._precompile import compile_template_bundle
+
+    searchpaths = [Path(p) for p in searchpath or []]
+    if not searchpaths:
+        try:
+            searchpaths = asyncio.run(_resolve_template_searchpaths())
+        except Exception as e:
+            console.print(f"[red]Could not resolve template searchpaths: {e}[/red]")
+        if not searchpaths:
+            console.print("[red]No searchpaths found; pass --searchpath[/red]")
+            raise typer.Exit(1)
+
+    result = compile_template_bundle(
+        searchpaths,
+        output,
+        extensions=extension or (),
+        translate_delimiters=translate_delimiters,
+        deployed=deployed,
+        workers=workers or None,
+    )
+    _display_bundle_result(result)
+
+
 _GRAMMARS_DIR = Path(__file__).parent / "cli" / "grammars"
 _GRAMMAR_FILES = {"vim": "vim.vim", "emacs": "emacs.el"}
 
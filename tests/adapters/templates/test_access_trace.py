@@ -0,0 +1,213 @@
+"""Tests for the access trace and warming caches from it on startup."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import typing as t
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastblocks._health_integration import HealthStatus, WarmupHealthCheck
+from fastblocks.adapters.templates import _access_trace
+from fastblocks.adapters.templates import jinja2 as jinja2_adapter
+from fastblocks.adapters.templates._access_trace import (
+    AccessKind,
+    AccessTrace,
+    WarmupProgress,
+    warm_from_trace,
+)
+from fastblocks.adapters.templates._enhanced_cache import EnhancedCacheManager
+from fastblocks.adapters.templates.jinja2 import Templates
+
+TEMPLATE = AccessKind.TEMPLATE
+
+
+@pytest.fixture
+async def cache() -> t.AsyncIterator[EnhancedCacheManager]:
+    manager = EnhancedCacheManager(sample_every=0)
+    yield manager
+    await manager.shutdown()
+
+
+@pytest.fixture
+def progress(monkeypatch: pytest.MonkeyPatch) -> WarmupProgress:
+    progress = WarmupProgress()
+    monkeypatch.setattr(_access_trace, "_startup_warmup", progress)
+    return progress
+
+
+def _trace(counts: dict[str, int], path: Path | None = None) -> AccessTrace:
+    trace = AccessTrace(path)
+    for name, count in counts.items():
+        trace.record(TEMPLATE, name, count)
+    return trace
+
+
+class TestAccessTrace:
+    def test_top_entries_by_use(self) -> None:
+        trace = _trace({"a.html": 3, "b.html": 10, "c.html": 1})
+        trace.record(AccessKind.BLOCK, "a.html:nav", 5)
+
+        assert trace.top(2) == [
+            (TEMPLATE, "b.html"),
+            (AccessKind.BLOCK, "a.html:nav"),
+        ]
+        assert trace.top(2, kinds=[TEMPLATE]) == [
+            (TEMPLATE, "b.html"),
+            (TEMPLATE, "a.html"),
+        ]
+
+    def test_is_bounded(self) -> None:
+        trace = AccessTrace(max_entries=10)
+        trace.record(TEMPLATE, "popular.html", 100)
+        for i in range(1_000):
+            trace.record(TEMPLATE, f"page{i}.html")
+        trace.record(TEMPLATE, "x" * (AccessTrace.MAX_NAME_LENGTH + 1))
+
+        assert len(trace) <= 20
+        assert trace.top(1) == [(TEMPLATE, "popular.html")]
+
+    async def test_round_trip_halves_previous_counts(self, tmp_path: Path) -> None:
+        path = tmp_path / "tmp" / "access_trace.json"
+        await _trace({"a.html": 8, "b.html": 1}, path).save()
+
+        data = json.loads(path.read_text())
+        # Names and counts only.
+        assert data["entries"] == [["template", "a.html", 8], ["template", "b.html", 1]]
+
+        trace = AccessTrace(path)
+        await trace.load()
+        assert dict(trace.counts) == {(TEMPLATE, "a.html"): 4}
+
+    async def test_concurrent_saves_leave_a_whole_file(self, tmp_path: Path) -> None:
+        path = tmp_path / "access_trace.json"
+        traces = [
+            _trace({f"page{i}-{j}.html": j + 1 for j in range(200)}, path)
+            for i in range(8)
+        ]
+
+        await asyncio.gather(*(trace.save() for trace in traces))
+
+        assert len(json.loads(path.read_text())["entries"]) == 200
+        assert [p.name for p in tmp_path.iterdir()] == ["access_trace.json"]
+
+    async def test_cache_keys_are_not_recorded(self) -> None:
+        trace = AccessTrace()
+        cache = EnhancedCacheManager(sample_every=1, access_trace=trace)
+        await cache.set("user:42:profile", "<p>private</p>")
+
+        assert await cache.get("user:42:profile") == "<p>private</p>"
+        assert len(trace) == 0
+        await cache.shutdown()
+
+    async def test_entries_of_unknown_kinds_are_dropped(self, tmp_path: Path) -> None:
+        path = tmp_path / "access_trace.json"
+        entries = [["cache_key", "user:42", 8], ["template", "a.html", 8]]
+        path.write_text(json.dumps({"format": 1, "entries": entries}))
+
+        trace = AccessTrace(path)
+        await trace.load()
+
+        assert dict(trace.counts) == {(TEMPLATE, "a.html"): 4}
+
+    async def test_unreadable_file_is_ignored(self, tmp_path: Path) -> None:
+        path = tmp_path / "access_trace.json"
+        path.write_text("not json")
+
+        trace = AccessTrace(path)
+        await trace.load()
+
+        assert len(trace) == 0
+
+
+class TestWarmFromTrace:
+    async def test_loads_top_entries_most_used_first(
+        self, cache: EnhancedCacheManager, progress: WarmupProgress
+    ) -> None:
+        trace = _trace({"a.html": 1, "b.html": 5, "c.html": 3, "d.html": 2})
+        loaded: list[str] = []
+
+        async def load(name: str) -> str:
+            loaded.append(name)
+            return name.upper()
+
+        await warm_from_trace(trace, {TEMPLATE: load}, top_n=3, concurrency=1)
+
+        assert loaded == ["b.html", "c.html", "d.html"]
+        assert (progress.queued, progress.completed) == (3, 3)
+        assert not progress.running
+
+    async def test_health_is_degraded_until_warm(
+        self, progress: WarmupProgress
+    ) -> None:
+        release = asyncio.Event()
+
+        async def load(name: str) -> str:
+            await release.wait()
+            return name
+
+        check = WarmupHealthCheck()
+        warming = asyncio.create_task(
+            warm_from_trace(_trace({"a.html": 1}), {TEMPLATE: load})
+        )
+        await asyncio.sleep(0.01)
+
+        result = await check._perform_health_check("readiness")
+        assert result.status == HealthStatus.DEGRADED
+        assert result.details == {"queued": 1, "completed": 0}
+
+        release.set()
+        await warming
+        result = await check._perform_health_check("readiness")
+        assert result.status == HealthStatus.HEALTHY
+
+    async def test_timeout_stops_waiting(self, progress: WarmupProgress) -> None:
+        release = asyncio.Event()
+
+        async def hang(name: str) -> str:
+            await release.wait()
+            return name
+
+        await warm_from_trace(_trace({"a.html": 1}), {TEMPLATE: hang}, timeout=0.05)
+
+        assert progress.timed_out and not progress.running
+        # The entry keeps loading in the background.
+        release.set()
+        await asyncio.gather(*_access_trace._background_workers)
+        assert progress.completed == 1
+
+
+class TestTemplatesWarmup:
+    async def test_warms_templates_recorded_by_the_previous_run(
+        self,
+        tmp_path: Path,
+        cache: EnhancedCacheManager,
+        progress: WarmupProgress,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        path = tmp_path / "access_trace.json"
+        await _trace({"home.html": 10, "about.html": 4, "rare.html": 2}, path).save()
+        monkeypatch.setattr(jinja2_adapter, "get_enhanced_cache", lambda: cache)
+        settings = SimpleNamespace(
+            access_trace=str(path), warmup_entries=2, warmup_timeout=1.0
+        )
+        templates = Templates(
+            config=SimpleNamespace(debug=SimpleNamespace(), templates=settings)
+        )
+        prefetched: list[str] = []
+
+        async def prefetch_template(name: str, admin: bool = False) -> str:
+            prefetched.append(name)
+            return name
+
+        monkeypatch.setattr(templates, "prefetch_template", prefetch_template)
+
+        await templates._start_warmup()
+        assert progress.running
+        assert templates._warmup_task is not None
+        await templates._warmup_task
+
+        assert prefetched == ["home.html", "about.html"]
+        assert cache.access_trace is templates.access_trace
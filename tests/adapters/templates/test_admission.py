@@ -0,0 +1,173 @@
+"""Tests for TinyLFU admission in EnhancedCacheManager."""
+
+from __future__ import annotations
+
+import random
+import time
+
+from fastblocks.adapters.templates._enhanced_cache import (
+    CacheTier,
+    EnhancedCacheManager,
+)
+from fastblocks.adapters.templates._frequency_sketch import FrequencySketch
+
+
+class TestFrequencySketch:
+    def test_estimates_counts(self) -> None:
+        sketch = FrequencySketch(1024)
+        for i in range(100):
+            for _ in range(i % 10):
+                sketch.increment(f"k{i}")
+
+        assert [sketch.estimate(f"k{i}") for i in range(10)] == list(range(10))
+        assert sketch.estimate("never") == 0
+
+    def test_counters_saturate_and_age(self) -> None:
+        sketch = FrequencySketch(16, sample_size=100)
+        for _ in range(20):
+            sketch.increment("a")
+        assert sketch.estimate("a") == FrequencySketch.MAX_COUNT
+
+        for i in range(100):
+            sketch.increment(f"other{i}")
+
+        assert sketch.estimate("a") <= FrequencySketch.MAX_COUNT // 2
+
+    def test_memory_is_fixed(self) -> None:
+        sketch = FrequencySketch(1000)
+        for i in range(100_000):
+            sketch.increment(i)
+
+        assert len(sketch._counts) == FrequencySketch.ROWS * 4096
+
+    def test_rows_collide_independently(self) -> None:
+        sketch = FrequencySketch(1000)
+        rows = [sketch._indexes(f"page:/{i}") for i in range(20_000)]
+
+        # 4096 counters a row: with rows derived from each other, keys
+        # sharing a counter in one row would share it in the others too.
+        assert len(set(rows)) == len(rows)
+        assert len({(first, third) for first, _, third, _ in rows}) > 0.99 * len(rows)
+
+
+class TestAdmission:
+    async def test_one_hit_wonders_do_not_displace_popular_entries(self) -> None:
+        cache = EnhancedCacheManager(max_memory_entries=100, sample_every=0)
+        for key in (f"popular{i}" for i in range(60)):
+            await cache.get(key)
+            await cache.set(key, key)
+            for _ in range(3):
+                await cache.get(key)
+
+        for i in range(1_000):
+            await cache.get(f"crawl{i}")
+            await cache.set(f"crawl{i}", i)
+
+        # Recency alone would keep none of them; the sketch's estimates are
+        # approximate, so the odd hash collision may still let one through.
+        kept = sum(f"popular{i}" in cache.entries for i in range(60))
+        assert kept >= 55
+        assert cache.metrics.admission_rejections > 0
+
+    async def test_window_admits_new_entries_while_there_is_room(self) -> None:
+        cache = EnhancedCacheManager(max_memory_entries=100, sample_every=0)
+        for i in range(100):
+            await cache.set(f"k{i}", i)
+
+        assert len(cache.entries) == 100
+        assert len(cache._window) == cache.window_size
+        assert cache.metrics.admission_rejections == 0
+
+    async def test_full_hot_tier_admits_by_frequency(self) -> None:
+        cache = EnhancedCacheManager(hot_tier_size=2, sample_every=0)
+        for key in ("a", "b"):
+            for _ in range(3):
+                await cache.get(key)
+            await cache.set(key, key, tier=CacheTier.HOT)
+
+        await cache.set("crawl", 1, tier=CacheTier.HOT)
+        assert cache.entries["crawl"].tier == CacheTier.WARM
+        assert list(cache._tier_lru[CacheTier.HOT]) == ["a", "b"]
+
+        for _ in range(5):
+            await cache.get("popular")
+        await cache.set("popular", 2, tier=CacheTier.HOT)
+        assert list(cache._tier_lru[CacheTier.HOT]) == ["b", "popular"]
+        assert cache.entries["a"].tier == CacheTier.WARM
+
+
+def _scan_heavy_trace(seed: int = 7) -> tuple[list[str], set[str]]:
+    """Zipf-like traffic to 600 pages alternating with crawler sweeps."""
+    rnd = random.Random(seed)
+    pages = [f"page{i}" for i in range(600)]
+    weights = [1 / (i + 1) ** 0.8 for i in range(len(pages))]
+    trace: list[str] = []
+    for sweep in range(10):
+        trace += rnd.choices(pages, weights, k=1_500)
+        trace += [f"crawl{sweep}-{i}" for i in range(1_500)]
+    return trace, set(pages)
+
+
+async def _replay(trace: list[str], popular: set[str], admission: bool) -> float:
+    """Hit ratio of the popular pages when replaying ``trace``."""
+    cache = EnhancedCacheManager(
+        max_memory_entries=750,
+        hot_tier_size=50,
+        warm_tier_size=150,
+        sample_every=0,
+        admission_filter=admission,
+    )
+    hits = requests = 0
+    for key in trace:
+        hit = await cache.get(key) is not None
+        if not hit:
+            await cache.set(key, key)
+        if key in popular:
+            requests += 1
+            hits += hit
+    return hits / requests
+
+
+class TestTraceReplay:
+    async def test_scan_heavy_workload(self) -> None:
+        trace, popular = _scan_heavy_trace()
+
+        recency_only = await _replay(trace, popular, admission=False)
+        with_filter = await _replay(trace, popular, admission=True)
+
+        assert with_filter > recency_only + 0.05
+
+
+async def _get_times(trace: list[str], rounds: int = 5) -> tuple[float, float]:
+    """Best per-get seconds over ``trace``, without and with admission.
+
+    Rounds alternate between the two caches so both see the same noise.
+    """
+    caches = [
+        EnhancedCacheManager(
+            max_memory_entries=750, sample_every=0, admission_filter=admission
+        )
+        for admission in (False, True)
+    ]
+    for cache in caches:
+        for key in trace:
+            await cache.set(key, key)
+    best = [float("inf")] * len(caches)
+    for _ in range(rounds):
+        for i, cache in enumerate(caches):
+            start = time.perf_counter()
+            for key in trace:
+                await cache.get(key)
+            best[i] = min(best[i], (time.perf_counter() - start) / len(trace))
+    return best[0], best[1]
+
+
+class TestGetBenchmark:
+    async def test_admission_overhead_per_get(self) -> None:
+        trace = _scan_heavy_trace()[0][:5_000]
+
+        recency_only, with_filter = await _get_times(trace)
+
+        # Every get, hit or miss, counts its key in the sketch. Hashing keys
+        # with blake2b made a get three to four times slower.
+        assert with_filter < 3 * recency_only
@@ -0,0 +1,114 @@
+"""Templates initialization must not bridge sync-to-async after startup.
+
+``Templates.init`` resolves dependencies and builds the admin environment on
+the running loop; afterwards neither the ``admin`` property nor the sync
+loader constructors may create or drive an event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from fastblocks.adapters.templates import jinja2 as jinja2_adapter
+from fastblocks.adapters.templates.jinja2 import Templates
+
+
+class _AsyncResolver:
+    """Resolver whose ``resolve`` is a coroutine, like the async Oneiric API."""
+
+    def __init__(self, values: dict[str, t.Any]) -> None:
+        self.values = values
+        self.calls: list[str] = []
+
+    async def resolve(self, domain: str, key: str) -> t.Any:
+        self.calls.append(key)
+        return self.values.get(key)
+
+
+@pytest.fixture
+def no_new_loops(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    created: list[str] = []
+
+    def forbidden(*_args: t.Any, **_kwargs: t.Any) -> t.NoReturn:
+        created.append("new_event_loop")
+        msg = "event loop created during template handling"
+        raise AssertionError(msg)
+
+    monkeypatch.setattr(asyncio, "new_event_loop", forbidden)
+    return created
+
+
+@pytest.fixture
+def templates(monkeypatch: pytest.MonkeyPatch) -> Templates:
+    resolver = _AsyncResolver({"storage": "storage", "cache": "cache"})
+    monkeypatch.setattr(jinja2_adapter, "depends", resolver)
+    monkeypatch.setattr(jinja2_adapter, "register_candidate", lambda *a, **k: None)
+    monkeypatch.setattr(jinja2_adapter, "_resolved_dependencies", {})
+
+    built: list[tuple[bool, t.Any]] = []
+
+    async def init_envs(
+        self: Templates, paths: t.Any, admin: bool = False, cache: t.Any = None
+    ) -> t.Any:
+        built.append((admin, cache))
+        return SimpleNamespace(admin=admin, env=SimpleNamespace(loader=None))
+
+    async def get_searchpaths(self: Templates, adapter: t.Any) -> list[str]:
+        return [f"templates/{adapter.category}"]
+
+    monkeypatch.setattr(Templates, "init_envs", init_envs)
+    monkeypatch.setattr(Templates, "get_searchpaths", get_searchpaths)
+    instance = Templates(config=SimpleNamespace(debug=SimpleNamespace()))
+    instance.enabled_app = SimpleNamespace(name="app", category="app")
+    instance.enabled_admin = SimpleNamespace(name="sqladmin", category="admin")
+    instance.built = built  # type: ignore[attr-defined]
+    instance.resolver = resolver  # type: ignore[attr-defined]
+    return instance
+
+
+class TestAsyncInit:
+    async def test_admin_env_built_during_init(
+        self, templates: Templates, no_new_loops: list[str]
+    ) -> None:
+        await templates.init()
+
+        assert templates.built == [(False, "cache"), (True, "cache")]  # type: ignore[attr-defined]
+        assert templates.admin is not None
+        assert templates.admin.admin is True
+        assert no_new_loops == []
+
+    async def test_sync_lookups_use_primed_dependencies(
+        self, templates: Templates, no_new_loops: list[str]
+    ) -> None:
+        await templates.init()
+        calls_after_init = list(templates.resolver.calls)  # type: ignore[attr-defined]
+
+        # What loader and settings constructors do on a request path.
+        assert jinja2_adapter._try_resolve_sync("storage") == "storage"
+        assert jinja2_adapter._try_resolve_sync("cache") == "cache"
+        assert templates.admin is not None
+
+        assert templates.resolver.calls == calls_after_init  # type: ignore[attr-defined]
+        assert no_new_loops == []
+
+    async def test_missing_dependencies_are_resolved_again(
+        self, templates: Templates, no_new_loops: list[str]
+    ) -> None:
+        await templates.init()
+        assert "models" not in jinja2_adapter._resolved_dependencies
+
+        # Registered after startup, e.g. by lazy adapter registration.
+        templates.resolver.values["models"] = "models"  # type: ignore[attr-defined]
+        await jinja2_adapter._prime_dependencies("models")
+
+        assert jinja2_adapter._try_resolve_sync("models") == "models"
+        assert no_new_loops == []
+
+    def test_unprimed_sync_lookup_does_not_drive_loop(
+        self, templates: Templates, no_new_loops: list[str]
+    ) -> None:
+        assert jinja2_adapter._try_resolve_sync("storage") is None
+        assert no_new_loops == []
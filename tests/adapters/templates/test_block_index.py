@@ -0,0 +1,226 @@
+"""Tests for lazy block discovery and the persisted block index."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import typing as t
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from fastblocks.adapters.templates._block_index import BlockIndex, IndexedBlock
+from fastblocks.adapters.templates._block_renderer import BlockRenderer
+
+_SOURCES = {
+    "base.html": "<html>{% block body %}{% endblock %}</html>",
+    "page.html": (
+        "{% extends 'base.html' %}"
+        '{% block body %}<div hx-get="/items">{{ items }}</div>{% endblock %}'
+    ),
+    "other.html": "{% block sidebar %}{{ user }}{% endblock %}",
+}
+
+
+class _CountingEnvironment(Environment):
+    parsed: list[str]
+
+    def parse(
+        self, source: str, name: str | None = None, filename: t.Any = None
+    ) -> t.Any:
+        self.parsed.append(t.cast(str, name))
+        return super().parse(source, name, filename)
+
+
+def _renderer(
+    sources: dict[str, str], index_path: Path | None = None
+) -> tuple[BlockRenderer, _CountingEnvironment]:
+    env = _CountingEnvironment(loader=DictLoader(sources))
+    env.parsed = []
+    app = SimpleNamespace(env=env)
+    async_renderer = SimpleNamespace(
+        base_templates=SimpleNamespace(app=app, change_listeners=[])
+    )
+
+    async def get_template_dependencies(template_name: str) -> list[str]:
+        return []
+
+    hybrid_manager = SimpleNamespace(
+        get_template_dependencies=get_template_dependencies
+    )
+    renderer = BlockRenderer(
+        t.cast(t.Any, async_renderer),
+        t.cast(t.Any, hybrid_manager),
+        block_index_path=index_path,
+    )
+    return renderer, env
+
+
+class TestLazyDiscovery:
+    async def test_initialize_parses_nothing(self) -> None:
+        renderer, env = _renderer(_SOURCES)
+        await renderer.initialize()
+
+        assert env.parsed == []
+        assert renderer.registry.list_blocks() == []
+
+    async def test_template_is_discovered_on_first_use(self) -> None:
+        renderer, env = _renderer(_SOURCES)
+
+        info = await renderer.get_block_info("page.html:body")
+
+        assert info["variables"] == ["items"]
+        # Dependencies pull in the parent layout, and nothing else.
+        assert info["dependencies"] == ["base.html:body"]
+        assert env.parsed == ["page.html", "base.html"]
+        await renderer.ensure_template_blocks("page.html")
+        assert env.parsed == ["page.html", "base.html"]
+
+    async def test_concurrent_callers_share_one_discovery(self) -> None:
+        renderer, env = _renderer(_SOURCES)
+
+        results = await asyncio.gather(
+            *(renderer.ensure_template_blocks("page.html") for _ in range(5))
+        )
+
+        assert env.parsed == ["page.html"]
+        assert all(len(blocks) == 1 for blocks in results)
+
+    async def test_bare_fragment_names_trigger_one_full_discovery(self) -> None:
+        renderer, env = _renderer(_SOURCES)
+
+        block = await renderer._find_fragment_lazily("sidebar")
+        missing = await renderer._find_fragment_lazily("nav")
+
+        assert block is not None and block.template_name == "other.html"
+        assert missing is None
+        assert sorted(env.parsed) == ["base.html", "other.html", "page.html"]
+
+    async def test_full_discovery_waits_for_templates_in_flight(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        renderer, env = _renderer(_SOURCES)
+        get_source = env.loader.get_source  # type: ignore[union-attr]
+
+        def slow_get_source(env: Environment, name: str) -> t.Any:
+            if name == "other.html":
+                time.sleep(0.2)
+            return get_source(env, name)
+
+        monkeypatch.setattr(env.loader, "get_source", slow_get_source)
+        in_flight = asyncio.ensure_future(renderer.ensure_template_blocks("other.html"))
+        await asyncio.sleep(0.01)
+
+        found = await asyncio.gather(
+            renderer._find_fragment_lazily("sidebar"),
+            renderer._find_fragment_lazily("sidebar"),
+        )
+        await in_flight
+
+        assert all(block is not None for block in found)
+        assert sorted(env.parsed) == ["base.html", "other.html", "page.html"]
+
+    async def test_discovery_without_an_environment_is_retried(self) -> None:
+        renderer, _ = _renderer(_SOURCES)
+        base_templates = renderer.async_renderer.base_templates  # type: ignore[union-attr]
+        app, base_templates.app = base_templates.app, None
+
+        assert await renderer.ensure_template_blocks("other.html") == []
+        base_templates.app = app
+        blocks = await renderer.ensure_template_blocks("other.html")
+
+        assert [block.block_name for block in blocks] == ["sidebar"]
+
+    async def test_changed_templates_are_rediscovered(self) -> None:
+        sources = dict(_SOURCES)
+        renderer, env = _renderer(sources)
+        await renderer.ensure_template_blocks("other.html")
+
+        sources["other.html"] = "{% block footer %}{{ year }}{% endblock %}"
+        # What Templates does after recompiling an edited template.
+        for listener in renderer.async_renderer.base_templates.change_listeners:  # type: ignore[union-attr]
+            await listener({"other.html"})
+        blocks = await renderer.ensure_template_blocks("other.html")
+
+        assert [block.block_name for block in blocks] == ["footer"]
+        assert renderer.registry.get_block("other.html:sidebar") is None
+        assert renderer.registry.find_fragment("sidebar") is None
+        assert env.parsed == ["other.html", "other.html"]
+
+
+class TestPersistedIndex:
+    async def test_warm_restart_skips_parsing(self, tmp_path: Path) -> None:
+        index_path = tmp_path / "tmp" / "block_index.json"
+        cold, cold_env = _renderer(_SOURCES, index_path)
+        await cold.discover_blocks()
+        assert len(cold_env.parsed) == 3
+        assert index_path.exists()
+
+        warm, warm_env = _renderer(_SOURCES, index_path)
+        await warm.discover_blocks()
+
+        assert warm_env.parsed == []
+        block = warm.registry.get_block("page.html:body")
+        assert block is not None
+        assert block.parent_template == "base.html"
+        assert block.variables == {"items"}
+
+    async def test_changed_template_is_reparsed(self, tmp_path: Path) -> None:
+        index_path = tmp_path / "block_index.json"
+        cold, _ = _renderer(_SOURCES, index_path)
+        await cold.ensure_template_blocks("other.html")
+        await cold.shutdown()
+
+        changed = _SOURCES | {"other.html": "{% block nav %}{% endblock %}"}
+        warm, warm_env = _renderer(changed, index_path)
+        blocks = await warm.ensure_template_blocks("other.html")
+
+        assert warm_env.parsed == ["other.html"]
+        assert [block.block_name for block in blocks] == ["nav"]
+
+    async def test_lazy_discoveries_are_written_in_batches(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        index_path = tmp_path / "block_index.json"
+        renderer, _ = _renderer(_SOURCES, index_path)
+        await renderer.ensure_template_blocks("other.html")
+        assert not index_path.exists()
+
+        monkeypatch.setattr(BlockIndex, "SAVE_INTERVAL", 0.0)
+        await renderer.ensure_template_blocks("base.html")
+        assert index_path.exists()
+
+    async def test_concurrent_writers_use_their_own_temp_files(
+        self, tmp_path: Path
+    ) -> None:
+        index_path = tmp_path / "block_index.json"
+        indexes = [BlockIndex(index_path) for _ in range(8)]
+        for i, index in enumerate(indexes):
+            index.put(f"t{i}.html", "abc", [IndexedBlock(block_name="b")])
+
+        await asyncio.gather(*(index.save() for index in indexes))
+
+        assert [path.name for path in tmp_path.iterdir()] == ["block_index.json"]
+        loaded = BlockIndex(index_path)
+        await loaded.load()
+        assert len(loaded) == 1
+
+    async def test_unreadable_index_is_ignored(self, tmp_path: Path) -> None:
+        index_path = tmp_path / "block_index.json"
+        index_path.write_text("{not json")
+
+        index = BlockIndex(index_path)
+        await index.load()
+
+        assert len(index) == 0
+
+    async def test_without_a_path_nothing_is_written(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.chdir(tmp_path)
+        index = BlockIndex(None)
+        index.put("t.html", "abc", [IndexedBlock(block_name="b")])
+        await index.save()
+
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,190 @@
+"""Tests for reverse-index invalidation of dependent blocks."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from fastblocks.adapters.templates import _async_renderer
+from fastblocks.adapters.templates._async_renderer import (
+    AsyncTemplateRenderer,
+    CacheStrategy,
+    RenderContext,
+    RenderResult,
+)
+from fastblocks.adapters.templates._block_renderer import (
+    BlockDefinition,
+    BlockRegistry,
+    BlockRenderer,
+)
+from fastblocks.adapters.templates._render_cache import RenderCache
+
+
+def _block(name: str, **kwargs: t.Any) -> BlockDefinition:
+    template_name, _, block_name = name.partition(":")
+    return BlockDefinition(
+        name=name, template_name=template_name, block_name=block_name, **kwargs
+    )
+
+
+def _registry() -> BlockRegistry:
+    registry = BlockRegistry()
+    registry.register_block(_block("base.html:body"))
+    registry.register_block(_block("page.html:body", parent_template="base.html"))
+    registry.register_block(_block("page.html:nav", parent_template="base.html"))
+    registry.register_block(_block("widget.html:stats", dependencies={"page.html:nav"}))
+    registry.register_block(_block("other.html:main"))
+    return registry
+
+
+class TestReverseIndex:
+    def test_direct_dependents(self) -> None:
+        registry = _registry()
+
+        assert registry.get_dependents("base.html:body") == {
+            "page.html:body",
+            "page.html:nav",
+        }
+        assert registry.get_dependents("page.html:nav") == {"widget.html:stats"}
+        assert registry.get_dependents("other.html:main") == set()
+
+    def test_affected_is_transitive(self) -> None:
+        assert _registry().affected_by(["base.html:body"]) == {
+            "page.html:body",
+            "page.html:nav",
+            "widget.html:stats",
+        }
+
+    def test_cycles_terminate(self) -> None:
+        registry = BlockRegistry()
+        registry.register_block(_block("a.html:x", dependencies={"b.html:y"}))
+        registry.register_block(_block("b.html:y", dependencies={"a.html:x"}))
+
+        assert registry.affected_by(["a.html:x"]) == {"a.html:x", "b.html:y"}
+
+
+class TestRenderCachePrefixes:
+    def test_drops_every_context_of_a_block(self) -> None:
+        cache = RenderCache()
+        cache.set("block:page.html:body:f1", "A", 60, "page.html")
+        cache.set("block:page.html:body:f2", "B", 60, "page.html")
+        cache.set("block:page.html:nav:f1", "C", 60, "page.html")
+
+        dropped = cache.invalidate_prefixes(["block:page.html:body"])
+
+        assert sorted(dropped) == ["block:page.html:body:f1", "block:page.html:body:f2"]
+        assert list(cache) == ["block:page.html:nav:f1"]
+        assert cache.invalidate_prefixes(["block:page.html:body"]) == []
+
+
+class _Cache:
+    def __init__(self) -> None:
+        self.deleted: list[str] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        pass
+
+    async def delete(self, key: str) -> None:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        self.deleted.append(key)
+
+
+def _renderer(
+    strategy: CacheStrategy = CacheStrategy.MEMORY,
+) -> AsyncTemplateRenderer:
+    return AsyncTemplateRenderer(
+        base_templates=t.cast(t.Any, object()),
+        hybrid_manager=t.cast(t.Any, object()),
+        cache_strategy=strategy,
+    )
+
+
+async def _cache(renderer: AsyncTemplateRenderer, block_id: str) -> None:
+    template_name = block_id.partition(":")[0]
+    for fingerprint in ("f1", "f2"):
+        await renderer._cache_result(
+            RenderContext(
+                template_name=template_name,
+                context={},
+                cache_key=f"block:{block_id}:{fingerprint}",
+            ),
+            RenderResult(content=block_id),
+        )
+
+
+class TestInvalidateDependentBlocks:
+    async def test_drops_cached_renders_of_dependents(self) -> None:
+        renderer = _renderer()
+        blocks = BlockRenderer(renderer, t.cast(t.Any, object()))
+        blocks.registry = _registry()
+        for block in blocks.registry.list_blocks():
+            await _cache(renderer, block.name)
+
+        invalidated = await blocks.invalidate_dependent_blocks("base.html:body")
+
+        assert invalidated == ["page.html:body", "page.html:nav", "widget.html:stats"]
+        assert {key.rpartition(":")[0] for key in renderer._render_cache} == {
+            "block:base.html:body",
+            "block:other.html:main",
+        }
+
+    async def test_templates_including_the_block_template(self) -> None:
+        async def get_template_dependents(template_name: str) -> set[str]:
+            return {"other.html"} if template_name == "widget.html" else set()
+
+        blocks = BlockRenderer(
+            _renderer(),
+            t.cast(
+                t.Any, SimpleNamespace(get_template_dependents=get_template_dependents)
+            ),
+        )
+        blocks.registry = _registry()
+
+        invalidated = await blocks.invalidate_dependent_blocks("widget.html:stats")
+
+        assert invalidated == ["other.html:main"]
+
+    async def test_redis_deletions_are_batched(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        cache = _Cache()
+
+        async def resolve(*args: t.Any) -> _Cache:
+            return cache
+
+        monkeypatch.setattr(_async_renderer.depends, "resolve", resolve)
+        renderer = _renderer(CacheStrategy.HYBRID)
+        blocks = BlockRenderer(renderer, t.cast(t.Any, object()))
+        blocks.registry = _registry()
+        for block in blocks.registry.list_blocks():
+            await _cache(renderer, block.name)
+
+        await blocks.invalidate_dependent_blocks("base.html:body")
+
+        assert len(cache.deleted) == 6
+        assert cache.peak == 6
+        assert len(renderer._redis_keys) == 4
+
+    async def test_large_registry(self) -> None:
+        registry = BlockRegistry()
+        registry.register_block(_block("base.html:body"))
+        for i in range(5_000):
+            registry.register_block(
+                _block(f"page{i}.html:body", parent_template="base.html")
+            )
+        blocks = BlockRenderer(_renderer(), t.cast(t.Any, object()))
+        blocks.registry = registry
+
+        start = time.perf_counter()
+        invalidated = await blocks.invalidate_dependent_blocks("base.html:body")
+
+        assert len(invalidated) == 5_000
+        assert time.perf_counter() - start < 1.0
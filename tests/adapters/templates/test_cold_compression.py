@@ -0,0 +1,195 @@
+"""Tests for compressed storage of the COLD tier in EnhancedCacheManager."""
+
+from __future__ import annotations
+
+import time
+import typing as t
+
+from jinja2 import Environment
+from markupsafe import Markup
+from fastblocks.adapters.templates._enhanced_cache import (
+    CacheTier,
+    EnhancedCacheManager,
+    _Compressed,
+)
+
+_PAGE = Environment(autoescape=True).from_string(
+    """<html><head><title>{{ title }}</title></head><body>
+<nav class="navbar">{% for link in links %}
+  <a class="nav-link" href="/{{ link }}" hx-get="/{{ link }}">{{ link|title }}</a>
+{%- endfor %}</nav>
+<table class="table">{% for row in rows %}
+  <tr id="row-{{ row.id }}"><td class="name">{{ row.name }}</td>
+  <td class="email">{{ row.email }}</td><td class="total">{{ row.total }}</td></tr>
+{%- endfor %}</table></body></html>"""
+)
+
+
+def _page(i: int, rows: int = 50) -> Markup:
+    """Rendered HTML of a typical listing page, about 7 KB."""
+    return Markup(
+        _PAGE.render(
+            title=f"Orders {i}",
+            links=["home", "orders", "customers", "reports"],
+            rows=[
+                {
+                    "id": j,
+                    "name": f"Customer {i}-{j}",
+                    "email": f"customer{i * rows + j}@example.com",
+                    "total": f"{(i * 31 + j * 17) % 1000}.{j % 100:02d}",
+                }
+                for j in range(rows)
+            ],
+        )
+    )
+
+
+def _manager(**kwargs: t.Any) -> EnhancedCacheManager:
+    kwargs.setdefault("admission_filter", False)
+    return EnhancedCacheManager(sample_every=0, **kwargs)
+
+
+class TestColdCompression:
+    async def test_values_round_trip(self) -> None:
+        cache = _manager(promotion_threshold=1000)
+        values: dict[str, t.Any] = {
+            "markup": _page(0),
+            "str": str(_page(1)) + "\udcff",
+            "bytes": str(_page(2)).encode(),
+            "small": "<p>small</p>",
+            "dict": {"html": str(_page(3))},
+        }
+        for key, value in values.items():
+            await cache.set(key, value)
+
+        stored = {key: cache.entries[key].value for key in values}
+        compressed = {
+            key for key, value in stored.items() if isinstance(value, _Compressed)
+        }
+        assert compressed == {"markup", "str", "bytes"}
+        for key, value in values.items():
+            restored = await cache.get(key)
+            assert restored == value and type(restored) is type(value)
+        assert stored["dict"] is values["dict"]
+
+    async def test_hits_decompress_once(self) -> None:
+        cache = _manager(promotion_threshold=1000)
+        page = _page(0)
+        await cache.set("page", page)
+        compressed_size = cache.metrics.memory_usage
+
+        assert await cache.get("page") == page
+        assert await cache.get("page") == page
+
+        # The first hit moves the entry up to WARM, uncompressed.
+        entry = cache.entries["page"]
+        assert entry.tier == CacheTier.WARM and entry.value == page
+        assert cache.metrics.memory_usage == entry.size > compressed_size
+        assert cache.metrics.decompressions == 1
+        assert cache.metrics.tier_promotions == 1
+
+    async def test_promoted_hits_keep_warm_to_size(self) -> None:
+        cache = _manager(warm_tier_size=1)
+        await cache.set("a", _page(0))
+        await cache.set("b", _page(1))
+
+        await cache.get("a")
+        await cache.get("b")
+        await cache.run_maintenance()
+
+        assert list(cache._tier_lru[CacheTier.WARM]) == ["b"]
+        assert isinstance(cache.entries["a"].value, _Compressed)
+
+    async def test_demotion_compresses(self) -> None:
+        cache = _manager(warm_tier_size=1)
+        await cache.set("a", _page(0), tier=CacheTier.WARM)
+        await cache.set("b", _page(1), tier=CacheTier.WARM)
+
+        assert isinstance(cache.entries["a"].value, _Compressed)
+        assert not isinstance(cache.entries["b"].value, _Compressed)
+        assert cache.metrics.memory_usage == sum(
+            entry.size for entry in cache.entries.values()
+        )
+
+    async def test_admission_window_stays_uncompressed(self) -> None:
+        cache = EnhancedCacheManager(max_memory_entries=200, sample_every=0)
+        for i in range(3):
+            await cache.set(f"page{i}", _page(i))
+
+        assert cache.window_size == 2
+        assert not isinstance(cache.entries["page2"].value, _Compressed)
+        assert isinstance(cache.entries["page0"].value, _Compressed)
+
+    async def test_can_be_disabled(self) -> None:
+        cache = _manager(compress_cold=False)
+        await cache.set("page", _page(0))
+
+        assert cache.entries["page"].value == _page(0)
+        assert cache.metrics.compressions == 0
+
+
+async def _entries_within(limit: int, pages: list[Markup], compress_cold: bool) -> int:
+    cache = _manager(
+        max_memory_entries=100_000,
+        max_memory_bytes=limit,
+        compress_cold=compress_cold,
+    )
+    for i, page in enumerate(pages):
+        await cache.set(f"page{i}", page)
+    return len(cache.entries)
+
+
+class TestCapacityBenchmark:
+    """Entries a byte budget holds, and the CPU cost of compressing and reading them."""
+
+    async def test_more_rendered_pages_fit_the_byte_limit(self) -> None:
+        limit = 512 << 10
+        pages = [_page(i) for i in range(1_000)]
+        plain = await _entries_within(limit, pages, compress_cold=False)
+        compressed = await _entries_within(limit, pages, compress_cold=True)
+
+        # Rendered HTML is repetitive: zlib stores a page in about an eighth
+        # of its size.
+        assert compressed > 5 * plain
+
+    async def test_compression_cost_per_page(self) -> None:
+        cache = _manager(promotion_threshold=1000)
+        pages = [_page(i) for i in range(200)]
+
+        start = time.perf_counter()
+        for i, page in enumerate(pages):
+            await cache.set(f"page{i}", page)
+        set_time = (time.perf_counter() - start) / len(pages)
+
+        start = time.perf_counter()
+        for i in range(len(pages)):
+            await cache.get(f"page{i}")
+        get_time = (time.perf_counter() - start) / len(pages)
+
+        # A page compresses in well under a millisecond and decompresses
+        # several times faster, far below the cost of rendering it again.
+        assert set_time < 0.002
+        assert get_time < 0.001
+
+    async def test_repeated_gets_cost_no_more_than_uncompressed(self) -> None:
+        pages = [_page(i) for i in range(200)]
+        get_times = []
+        for compress_cold in (False, True):
+            cache = _manager(promotion_threshold=1000, compress_cold=compress_cold)
+            for i, page in enumerate(pages):
+                await cache.set(f"page{i}", page)
+            for i in range(len(pages)):
+                await cache.get(f"page{i}")
+
+            best = float("inf")
+            for _ in range(5):
+                start = time.perf_counter()
+                for i in range(len(pages)):
+                    await cache.get(f"page{i}")
+                best = min(best, (time.perf_counter() - start) / len(pages))
+            get_times.append(best)
+        plain, compressed = get_times
+
+        # Only the first hit decompresses. Decompressing on every hit made
+        # a get of a COLD page many times slower.
+        assert compressed < 2 * plain + 5e-6
@@ -0,0 +1,248 @@
+"""Tests for streaming pages whose deferred blocks render concurrently."""
+
+from __future__ import annotations
+
+import asyncio
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from fastblocks.adapters.templates._async_renderer import AsyncTemplateRenderer
+from fastblocks.adapters.templates._partials import stream_deferred_blocks
+
+_SOURCES = {
+    "base.html": (
+        "<html>{% block nav %}menu{% endblock %}"
+        "{% block main_feed %}{% endblock %}"
+        "{% block stats %}{{ 'stats'|slow(stats_delay) }}{% endblock %}</html>"
+    ),
+    "page.html": (
+        "{% extends 'base.html' %}"
+        "{% block main_feed %}{{ 'feed'|slow(feed_delay) }}{% endblock %}"
+    ),
+    "broken.html": (
+        "{% extends 'base.html' %}{% block main_feed %}{{ 1 // 0 }}{% endblock %}"
+    ),
+}
+
+
+async def slow(value: str, delay: float | t.Callable[[], t.Awaitable[None]]) -> str:
+    if callable(delay):
+        await delay()
+    else:
+        await asyncio.sleep(delay)
+    return value
+
+
+def _meet(
+    mine: asyncio.Event, theirs: asyncio.Event
+) -> t.Callable[[], t.Awaitable[None]]:
+    """A ``slow`` delay that waits for the other block to start as well.
+
+    Two blocks using each other's events only finish when rendered
+    concurrently; rendered one after the other, the first waits forever.
+    """
+
+    async def delay() -> None:
+        mine.set()
+        await theirs.wait()
+
+    return delay
+
+
+@pytest.fixture
+def env() -> Environment:
+    env = Environment(loader=DictLoader(_SOURCES), enable_async=True)
+    env.filters["slow"] = slow
+    return env
+
+
+async def _collect(
+    chunks: t.AsyncIterator[str], sent: dict[str, asyncio.Event] | None = None
+) -> list[str]:
+    """Consume a stream, setting each ``sent`` event once its text arrives."""
+    collected: list[str] = []
+    async for chunk in chunks:
+        collected.append(chunk)
+        for text, event in (sent or {}).items():
+            if text in chunk:
+                event.set()
+    return collected
+
+
+class TestStreamDeferredBlocks:
+    async def test_shell_first_then_blocks_as_they_finish(
+        self, env: Environment
+    ) -> None:
+        feed_started, stats_started = asyncio.Event(), asyncio.Event()
+        shell_sent, stats_sent = asyncio.Event(), asyncio.Event()
+        meet_stats = _meet(feed_started, stats_started)
+        meet_feed = _meet(stats_started, feed_started)
+
+        async def feed_delay() -> None:
+            await meet_stats()
+            await stats_sent.wait()
+
+        async def stats_delay() -> None:
+            await meet_feed()
+            # Neither block can finish before the shell reaches the client.
+            await shell_sent.wait()
+
+        chunks = await asyncio.wait_for(
+            _collect(
+                stream_deferred_blocks(
+                    env.get_template("page.html"),
+                    {"feed_delay": feed_delay, "stats_delay": stats_delay},
+                    ["main_feed", "stats"],
+                    placeholder="…",
+                ),
+                {"</html>": shell_sent, ">stats<": stats_sent},
+            ),
+            5,
+        )
+
+        assert "".join(chunks) == (
+            '<html>menu<div id="main-feed">…</div><div id="stats">…</div></html>'
+            '<div id="stats" hx-swap-oob="true">stats</div>'
+            '<div id="main-feed" hx-swap-oob="true">feed</div>'
+        )
+        assert chunks.index("</html>") < min(
+            index for index, chunk in enumerate(chunks) if "hx-swap-oob" in chunk
+        )
+
+    async def test_without_deferred_blocks_matches_the_full_render(
+        self, env: Environment
+    ) -> None:
+        template = env.get_template("page.html")
+        context = {"feed_delay": 0, "stats_delay": 0}
+
+        chunks = stream_deferred_blocks(template, context, ["missing"])
+
+        assert "".join([chunk async for chunk in chunks]) == (
+            await template.render_async(context)
+        )
+
+    async def test_failed_block_is_reported_in_its_fragment(
+        self, env: Environment
+    ) -> None:
+        chunks = stream_deferred_blocks(
+            env.get_template("broken.html"), {"stats_delay": 0}, ["main_feed"]
+        )
+
+        body = "".join([chunk async for chunk in chunks])
+
+        assert body.endswith(
+            '<div id="main-feed" hx-swap-oob="true">'
+            "<!-- Block main_feed failed to render --></div>"
+        )
+
+    async def test_closing_the_stream_cancels_pending_blocks(
+        self, env: Environment
+    ) -> None:
+        cancelled = asyncio.Event()
+
+        async def hang(value: str, delay: float) -> str:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return value
+
+        env.filters["slow"] = hang
+        chunks = stream_deferred_blocks(
+            env.get_template("page.html"),
+            {"feed_delay": 10, "stats_delay": 0},
+            ["main_feed"],
+        )
+
+        # The blocks start rendering when the page reaches its first block.
+        assert [await anext(chunks), await anext(chunks)] == ["<html>", "menu"]
+        await asyncio.sleep(0)
+        await chunks.aclose()
+
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+    async def test_in_order_streams_the_full_render(self, env: Environment) -> None:
+        template = env.get_template("page.html")
+        feed_started, stats_started = asyncio.Event(), asyncio.Event()
+        # Rendered concurrently, though sent in page order.
+        context = {
+            "feed_delay": _meet(feed_started, stats_started),
+            "stats_delay": _meet(stats_started, feed_started),
+        }
+
+        chunks = await asyncio.wait_for(
+            _collect(
+                stream_deferred_blocks(
+                    template, context, ["main_feed", "stats"], out_of_order=False
+                )
+            ),
+            5,
+        )
+
+        assert "".join(chunks) == await template.render_async(context)
+
+    @pytest.mark.parametrize("out_of_order", [True, False])
+    async def test_top_level_code_runs_once(
+        self, env: Environment, out_of_order: bool
+    ) -> None:
+        calls: list[int] = []
+        env.globals["bump"] = lambda: calls.append(1) or "x"
+        template = env.from_string(
+            "{% set marker = bump() %}{% extends 'page.html' %}"
+            "{% block stats %}{{ marker }}{% endblock %}"
+        )
+
+        chunks = stream_deferred_blocks(
+            template,
+            {"feed_delay": 0},
+            ["main_feed", "stats"],
+            out_of_order=out_of_order,
+        )
+        body = "".join([chunk async for chunk in chunks])
+
+        assert calls == [1]
+        assert "x" in body and "feed" in body
+
+
+class TestRenderResponse:
+    async def test_deferred_blocks_stream(self, env: Environment) -> None:
+        renderer = AsyncTemplateRenderer(
+            base_templates=t.cast(t.Any, SimpleNamespace(app=SimpleNamespace(env=env))),
+            hybrid_manager=t.cast(t.Any, object()),
+        )
+        request = Request({"type": "http", "method": "GET", "headers": []})
+
+        response = await renderer.render_response(
+            request,
+            "page.html",
+            {"feed_delay": 0, "stats_delay": 0},
+            deferred_blocks=["stats"],
+        )
+
+        assert isinstance(response, StreamingResponse)
+        body = "".join([chunk async for chunk in response.body_iterator])
+        assert body == "<html>menufeedstats</html>"
+        assert response.headers["Vary"] == "HX-Request"
+
+    async def test_htmx_requests_get_out_of_band_swaps(self, env: Environment) -> None:
+        renderer = AsyncTemplateRenderer(
+            base_templates=t.cast(t.Any, SimpleNamespace(app=SimpleNamespace(env=env))),
+            hybrid_manager=t.cast(t.Any, object()),
+        )
+        headers = [(b"hx-request", b"true")]
+        request = Request({"type": "http", "method": "GET", "headers": headers})
+
+        response = await renderer.render_response(
+            request,
+            "page.html",
+            {"feed_delay": 0, "stats_delay": 0},
+            deferred_blocks=["stats"],
+        )
+
+        body = "".join([chunk async for chunk in response.body_iterator])
+        assert body.endswith('<div id="stats" hx-swap-oob="true">stats</div>')
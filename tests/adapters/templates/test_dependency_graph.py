@@ -0,0 +1,308 @@
+"""Tests for the template dependency graph, prefetch and invalidation."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import sys
+import types
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from fastblocks.adapters.templates import jinja2 as jinja2_adapter
+from fastblocks.adapters.templates._dependency_graph import (
+    TemplateDependencyGraph,
+    extract_dependencies,
+    prefetch_dependencies,
+    track_dependencies,
+)
+from fastblocks.adapters.templates.jinja2 import Templates
+
+_SOURCES = {
+    "base.html": "<html>{% block body %}{% endblock %}</html>",
+    "layout.html": (
+        "{% extends 'base.html' %}"
+        "{% block body %}{% include 'nav.html' %}{% endblock %}"
+    ),
+    "nav.html": "{% import 'macros.html' as m %}nav",
+    "macros.html": "{% macro x() %}x{% endmacro %}",
+    "page.html": "{% extends 'layout.html' %}{% from 'forms.html' import field %}",
+    "forms.html": "{% macro field() %}f{% endmacro %}",
+    "other.html": "{% include ['missing.html', 'nav.html'] %}{% include name %}",
+}
+# jinja2_async_environment cannot compile import tags; use extends/include.
+_ASYNC_SOURCES = {
+    "base.html": "<html>{% block body %}{% endblock %}</html>",
+    "layout.html": (
+        "{% extends 'base.html' %}"
+        "{% block body %}{% include 'nav.html' %}{% endblock %}"
+    ),
+    "nav.html": "{% include 'icons.html' %}",
+    "icons.html": "icons",
+    "page.html": (
+        "{% extends 'layout.html' %}"
+        "{% block body %}{% include 'form.html' %}{% endblock %}"
+    ),
+    "form.html": "form",
+    "other.html": "{% include 'nav.html' %}",
+}
+
+
+@pytest.fixture
+def async_env() -> types.ModuleType:
+    """Import the real jinja2_async_environment (see test_precompile)."""
+    for key in list(sys.modules):
+        if key.startswith("jinja2_async_environment"):
+            del sys.modules[key]
+    return importlib.import_module("jinja2_async_environment")
+
+
+def _tracked_env() -> tuple[Environment, TemplateDependencyGraph]:
+    env = Environment(loader=DictLoader(_SOURCES))
+    graph = TemplateDependencyGraph()
+    track_dependencies(env, graph)
+    return env, graph
+
+
+class TestExtractDependencies:
+    def test_constant_names(self) -> None:
+        env = Environment()
+        assert extract_dependencies(env.parse(_SOURCES["page.html"])) == {
+            "layout.html",
+            "forms.html",
+        }
+
+    def test_include_lists_and_dynamic_names(self) -> None:
+        env = Environment()
+        assert extract_dependencies(env.parse(_SOURCES["other.html"])) == {
+            "missing.html",
+            "nav.html",
+        }
+
+
+class TestTemplateDependencyGraph:
+    def test_compiles_update_both_directions(self) -> None:
+        env, graph = _tracked_env()
+        env.get_template("page.html").render()
+
+        assert graph.dependencies("page.html") == {"layout.html", "forms.html"}
+        assert graph.dependents("base.html") == {"layout.html"}
+        assert graph.ancestors("page.html") == {
+            "layout.html",
+            "forms.html",
+            "base.html",
+            "nav.html",
+            "macros.html",
+        }
+        assert graph.descendants("base.html") == {"layout.html", "page.html"}
+
+    def test_removed_edges_are_dropped(self) -> None:
+        graph = TemplateDependencyGraph()
+        graph.update("page.html", {"base.html"})
+        graph.update("page.html", {"other_base.html"})
+
+        assert graph.dependents("base.html") == set()
+        assert graph.affected_by("other_base.html") == {
+            "other_base.html",
+            "page.html",
+        }
+
+    def test_cycles_terminate(self) -> None:
+        graph = TemplateDependencyGraph()
+        graph.update("a.html", {"b.html"})
+        graph.update("b.html", {"a.html"})
+
+        assert graph.descendants("a.html") == {"b.html"}
+
+    def test_recompiles_report_changed_source(self) -> None:
+        sources = dict(_SOURCES)
+        changed: list[str] = []
+        env = Environment(loader=DictLoader(sources))
+        track_dependencies(env, TemplateDependencyGraph(), on_change=changed.append)
+        env.get_template("layout.html").render()
+        env.cache.clear()
+        env.get_template("layout.html").render()
+        sources["base.html"] = "<body>{% block body %}{% endblock %}</body>"
+        env.get_template("layout.html").render()
+
+        assert changed == ["base.html"]
+
+
+class TestPrefetch:
+    async def test_loads_every_dependency(self, async_env: types.ModuleType) -> None:
+        loaders = importlib.import_module("jinja2_async_environment.loaders")
+        env = async_env.AsyncEnvironment(
+            loader=loaders.AsyncDictLoader(_ASYNC_SOURCES, "templates"),
+            enable_async=True,
+        )
+        graph = TemplateDependencyGraph()
+        track_dependencies(env, graph)
+
+        await prefetch_dependencies(env, "page.html", graph)
+
+        cached = {key[1] for key in env.cache}
+        assert cached == {
+            "page.html",
+            "layout.html",
+            "form.html",
+            "base.html",
+            "nav.html",
+            "icons.html",
+        }
+
+    async def test_untracked_template_is_parsed_from_source(
+        self, async_env: types.ModuleType
+    ) -> None:
+        loaders = importlib.import_module("jinja2_async_environment.loaders")
+        env = async_env.AsyncEnvironment(
+            loader=loaders.AsyncDictLoader(_ASYNC_SOURCES, "templates"),
+            enable_async=True,
+        )
+        graph = TemplateDependencyGraph()
+        # Compiled before tracking, as with a warm bytecode cache.
+        await env.get_template_async("layout.html")
+        track_dependencies(env, graph)
+
+        await prefetch_dependencies(env, "layout.html", graph)
+
+        assert graph.dependencies("layout.html") == {"base.html", "nav.html"}
+        assert "icons.html" in {key[1] for key in env.cache}
+
+
+class _Client:
+    def __init__(self) -> None:
+        self.deleted: list[str] = []
+
+    async def delete(self, key: str) -> None:
+        self.deleted.append(key)
+
+
+class TestInvalidateTemplate:
+    async def test_drops_exactly_the_descendants(
+        self, async_env: types.ModuleType, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        loaders = importlib.import_module("jinja2_async_environment.loaders")
+        source_cache = _Client()
+        monkeypatch.setattr(
+            jinja2_adapter, "_resolved_dependencies", {"cache": source_cache}
+        )
+        env = async_env.AsyncEnvironment(
+            loader=loaders.AsyncDictLoader(_ASYNC_SOURCES, "templates"),
+            enable_async=True,
+        )
+        bcc_client = _Client()
+        # Only the invalidation API; compiles fall back to no bytecode cache.
+        env.bytecode_cache = SimpleNamespace(
+            client=bcc_client,
+            get_cache_key=lambda name, filename=None: filename or name,
+            get_bucket_name=lambda key: f"bccache:{key}",
+        )
+        graph = TemplateDependencyGraph()
+        track_dependencies(env, graph)
+        templates = Templates(config=SimpleNamespace(debug=SimpleNamespace()))
+        templates.app = t.cast(t.Any, SimpleNamespace(env=env))
+        templates.dependency_graphs["app"] = graph
+        await templates.prefetch_template("page.html")
+        await templates.prefetch_template("other.html")
+
+        affected = await templates.invalidate_template("base.html")
+
+        assert affected == {"base.html", "layout.html", "page.html"}
+        remaining = {key[1] for key in env.cache}
+        assert remaining.isdisjoint(affected)
+        assert {"nav.html", "other.html", "form.html"} <= remaining
+        assert sorted(bcc_client.deleted) == [
+            "bccache:base.html",
+            "bccache:layout.html",
+            "bccache:page.html",
+        ]
+
+
+class TestRendererInvalidation:
+    async def test_drops_only_named_templates(self) -> None:
+        from fastblocks.adapters.templates._async_renderer import (
+            AsyncTemplateRenderer,
+            RenderContext,
+            RenderResult,
+        )
+
+        renderer = AsyncTemplateRenderer(
+            base_templates=t.cast(t.Any, object()),
+            hybrid_manager=t.cast(t.Any, object()),
+        )
+        entries = (("page.html", "p1"), ("page.html", "p2"), ("nav.html", "n"))
+        for name, key in entries:
+            await renderer._cache_result(
+                RenderContext(template_name=name, context={}, cache_key=key),
+                RenderResult(content=name),
+            )
+
+        assert await renderer.invalidate_templates({"page.html", "base.html"}) == 2
+        assert set(renderer._render_cache) == {"n"}
+
+
+class TestTemplateChanges:
+    async def test_editing_a_parent_drops_its_children(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        from fastblocks.adapters.templates._async_renderer import (
+            AsyncTemplateRenderer,
+            RenderContext,
+        )
+
+        monkeypatch.setattr(jinja2_adapter, "_resolved_dependencies", {})
+        sources = dict(_ASYNC_SOURCES)
+        env = Environment(loader=DictLoader(sources), enable_async=True)
+        graph = TemplateDependencyGraph()
+        templates = Templates(config=SimpleNamespace(debug=SimpleNamespace()))
+        track_dependencies(env, graph, on_change=templates.template_changed)
+        templates.app = t.cast(t.Any, SimpleNamespace(env=env))
+        templates.dependency_graphs["app"] = graph
+        renderer = AsyncTemplateRenderer(
+            base_templates=templates, hybrid_manager=t.cast(t.Any, object())
+        )
+        for name in ("page.html", "other.html"):
+            await renderer.render(RenderContext(name, {}, cache_key=name))
+
+        sources["base.html"] = "<body>{% block body %}{% endblock %}</body>"
+        # The next render reloads the edited layout, which is out of date.
+        edited = await renderer.render(RenderContext("page.html", {}, cache_key="p"))
+        await asyncio.gather(*templates._invalidation_tasks)
+
+        assert edited.content.startswith("<body>")
+        assert set(renderer._render_cache) == {"other.html"}
+        cached = {key[1] for key in env.cache}
+        assert "page.html" not in cached
+        # Compiled from the new source already: not compiled a second time.
+        assert "base.html" in cached
+
+    async def test_templates_are_prefetched_once(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr(jinja2_adapter, "_resolved_dependencies", {})
+        prefetched: list[str] = []
+
+        async def prefetch_template(name: str, admin: bool = False) -> None:
+            prefetched.append(name)
+
+        async def template_response(**kwargs: t.Any) -> str:
+            return "page"
+
+        templates = Templates(config=SimpleNamespace(debug=SimpleNamespace()))
+        templates.app = t.cast(
+            t.Any,
+            SimpleNamespace(
+                env=Environment(loader=DictLoader(_SOURCES)),
+                TemplateResponse=template_response,
+            ),
+        )
+        monkeypatch.setattr(templates, "prefetch_template", prefetch_template)
+
+        for _ in range(3):
+            await templates.render_template(None, "page.html")
+        await templates.invalidate_template("page.html")
+        await templates.render_template(None, "page.html")
+
+        assert prefetched == ["page.html", "page.html"]
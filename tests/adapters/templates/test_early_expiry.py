@@ -0,0 +1,132 @@
+"""Tests for TTL jitter and probabilistic early refresh (XFetch)."""
+
+from __future__ import annotations
+
+import math
+import random
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from fastblocks.adapters.templates import _render_cache
+from fastblocks.adapters.templates._async_renderer import (
+    AsyncTemplateRenderer,
+    RenderContext,
+)
+from fastblocks.adapters.templates._enhanced_cache import EnhancedCacheManager
+from fastblocks.adapters.templates._render_cache import (
+    RenderCache,
+    jittered_ttl,
+    refresh_early,
+)
+
+
+@pytest.fixture(autouse=True)
+def seeded_random(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The jitter and early refresh draws repeat on every run.
+    monkeypatch.setattr(_render_cache, "random", random.Random(0))
+
+
+class TestRefreshEarly:
+    def test_probability_follows_xfetch(self) -> None:
+        # P(refresh) = exp(-remaining / (compute_time * beta)).
+        for remaining, compute_time, beta in ((1.0, 1.0, 1.0), (2.0, 0.5, 2.0)):
+            trials = 20_000
+            refreshed = sum(
+                refresh_early(remaining, compute_time, 0.0, beta) for _ in range(trials)
+            )
+            expected = math.exp(-remaining / (compute_time * beta))
+            assert abs(refreshed / trials - expected) < 0.02
+
+    def test_fast_or_distant_entries_are_not_refreshed(self) -> None:
+        assert not any(refresh_early(300.0, 0.01, 0.0) for _ in range(10_000))
+        assert not refresh_early(1.0, 0.0, 0.0)
+        assert not refresh_early(1.0, 10.0, 0.0, beta=0.0)
+
+    def test_jitter_only_shortens(self) -> None:
+        ttls = [jittered_ttl(300, 0.1) for _ in range(1_000)]
+
+        assert all(270 <= ttl <= 300 for ttl in ttls)
+        assert max(ttls) - min(ttls) > 20
+        assert jittered_ttl(300, 0.0) == 300
+
+
+class TestRenderCache:
+    def test_entries_set_together_expire_apart(self) -> None:
+        cache = RenderCache(ttl_jitter=0.1)
+        for i in range(100):
+            cache.set(f"k{i}", "x", 300, "t.html", now=0)
+
+        expiries = sorted(entry.expires_at for entry in cache._entries.values())
+        assert 270 <= expiries[0] and expiries[-1] <= 300
+        assert expiries[-1] - expiries[0] > 20
+
+    def test_early_refresh_is_one_callers_miss(self) -> None:
+        cache = RenderCache()
+        cache.set("slow", "S", 10, "t.html", now=0, compute_time=100.0)
+        cache.set("fast", "F", 10, "t.html", now=0)
+
+        results = [cache.get("slow", now=9) for _ in range(100)]
+
+        assert None in results and "S" in results
+        assert cache.early_refreshes == results.count(None)
+        # The entry stays for the others until it is replaced.
+        assert cache.peek("slow") == "S"
+        assert all(cache.get("fast", now=9) == "F" for _ in range(100))
+
+
+class TestEnhancedCacheManager:
+    async def test_ttls_are_jittered(self) -> None:
+        cache = EnhancedCacheManager(max_memory_entries=200, sample_every=0)
+        for i in range(100):
+            await cache.set(f"k{i}", i, ttl=300)
+
+        ttls = [entry.ttl for entry in cache.entries.values()]
+        assert all(ttl is not None and 270 <= ttl <= 300 for ttl in ttls)
+        assert len(set(ttls)) > 90
+
+    async def test_slow_entries_are_refreshed_early(self) -> None:
+        cache = EnhancedCacheManager(sample_every=0, ttl_jitter=0)
+        await cache.set("slow", "S", ttl=60, compute_time=60.0)
+        await cache.set("fast", "F", ttl=60, compute_time=0.001)
+
+        slow = [await cache.get("slow") for _ in range(200)]
+        fast = [await cache.get("fast") for _ in range(200)]
+
+        # exp(-60 / 60): about a third of the gets refresh the slow entry.
+        assert 20 < slow.count(None) < 120
+        assert fast.count(None) == 0
+        assert cache.metrics.early_refreshes == slow.count(None)
+
+    async def test_warming_records_compute_time(self) -> None:
+        cache = EnhancedCacheManager(sample_every=0)
+
+        async def load(key: str) -> str:
+            return key
+
+        await cache.warm_cache(["a"], load)
+        cache._start_warming()
+        await cache.warming_queue.join()
+
+        assert cache.entries["a"].compute_time > 0
+
+
+_SOURCES = {"page.html": "<p>{{ value }}</p>"}
+
+
+class TestRenderer:
+    async def test_stores_render_times_with_jitter_on(self) -> None:
+        env = Environment(loader=DictLoader(_SOURCES), enable_async=True)
+        renderer = AsyncTemplateRenderer(
+            base_templates=t.cast(t.Any, SimpleNamespace(app=SimpleNamespace(env=env))),
+            hybrid_manager=t.cast(t.Any, object()),
+        )
+        for i in range(20):
+            await renderer.render(
+                RenderContext("page.html", {"value": i}, cache_key=f"page:{i}")
+            )
+
+        entries = renderer._render_cache._entries.values()
+        assert all(entry.compute_time > 0 for entry in entries)
+        assert renderer._render_cache.ttl_jitter == renderer.CACHE_TTL_JITTER
@@ -0,0 +1,395 @@
+"""Tests for eviction and size accounting in EnhancedCacheManager."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+import typing as t
+from dataclasses import dataclass
+
+import pytest
+from jinja2 import Environment
+from fastblocks.adapters.templates import _enhanced_cache
+from fastblocks.adapters.templates._enhanced_cache import (
+    CacheTier,
+    EnhancedCacheManager,
+    estimate_size,
+)
+
+
+def _manager(**kwargs: t.Any) -> EnhancedCacheManager:
+    kwargs.setdefault("admission_filter", False)
+    return EnhancedCacheManager(promotion_threshold=1000, **kwargs)
+
+
+class TestEviction:
+    async def test_coldest_tier_goes_first(self) -> None:
+        cache = _manager(max_memory_entries=3)
+        await cache.set("hot", 1, tier=CacheTier.HOT)
+        await cache.set("warm", 2, tier=CacheTier.WARM)
+        await cache.set("cold", 3)
+
+        await cache.set("new", 4, tier=CacheTier.WARM)
+        assert set(cache.entries) == {"hot", "warm", "new"}
+
+        await cache.set("newer", 5, tier=CacheTier.HOT)
+        assert set(cache.entries) == {"hot", "new", "newer"}
+        assert cache.metrics.evictions == 2
+
+    async def test_least_recently_used_within_a_tier(self) -> None:
+        cache = _manager(max_memory_entries=3)
+        for key in ("a", "b", "c"):
+            await cache.set(key, key)
+
+        await cache.get("a")
+        await cache.set("d", "d")
+
+        assert set(cache.entries) == {"a", "c", "d"}
+
+    async def test_replacing_a_key_keeps_accounting(self) -> None:
+        cache = _manager(max_memory_entries=10)
+        await cache.set("a", "x", tags={"old"}, tier=CacheTier.HOT)
+        await cache.set("a", "y", tags={"new"})
+
+        assert cache.metrics.memory_usage == cache._calculate_size("y")
+        assert "old" not in cache.tag_index
+        assert list(cache._tier_lru[CacheTier.HOT]) == []
+        assert list(cache._tier_lru[CacheTier.COLD]) == ["a"]
+
+    async def test_tier_sizes_are_enforced_by_demotion(self) -> None:
+        cache = _manager(hot_tier_size=2, warm_tier_size=2)
+        for key in ("a", "b", "c", "d"):
+            await cache.set(key, key, tier=CacheTier.HOT)
+
+        assert list(cache._tier_lru[CacheTier.HOT]) == ["c", "d"]
+        assert list(cache._tier_lru[CacheTier.WARM]) == ["a", "b"]
+
+        await cache.set("e", "e", tier=CacheTier.HOT)
+
+        assert list(cache._tier_lru[CacheTier.WARM]) == ["b", "c"]
+        assert list(cache._tier_lru[CacheTier.COLD]) == ["a"]
+        assert cache.metrics.tier_demotions == 4
+
+    async def test_promotion_moves_between_segments(self) -> None:
+        cache = EnhancedCacheManager(promotion_threshold=1)
+        await cache.set("a", 1)
+
+        await cache.get("a")
+        # Hits only queue the promotion for the maintenance scheduler.
+        assert cache.entries["a"].tier == CacheTier.COLD
+        assert await cache.run_maintenance() == 1
+        assert cache.entries["a"].tier == CacheTier.WARM
+        await cache.get("a")
+        await cache.run_maintenance()
+
+        assert list(cache._tier_lru[CacheTier.HOT]) == ["a"]
+        assert list(cache._tier_lru[CacheTier.COLD]) == []
+        assert cache.metrics.tier_promotions == 2
+
+    async def test_promotions_respect_tier_sizes(self) -> None:
+        cache = _manager(hot_tier_size=1, warm_tier_size=1)
+        cache.promotion_threshold = 1
+        await cache.set("a", "a", tier=CacheTier.HOT)
+        await cache.set("b", "b", tier=CacheTier.WARM)
+        await cache.set("c", "c")
+
+        await cache.get("b")
+        await cache.get("c")
+        await cache.run_maintenance()
+
+        # "a", demoted last, displaces "c" from WARM.
+        assert list(cache._tier_lru[CacheTier.HOT]) == ["b"]
+        assert list(cache._tier_lru[CacheTier.WARM]) == ["a"]
+        assert list(cache._tier_lru[CacheTier.COLD]) == ["c"]
+        assert cache.metrics.tier_demotions == 2
+
+
+def _page(i: int) -> dict[str, t.Any]:
+    """About 0.8 MB of nested rendered rows."""
+    return {"rows": [{"html": f"<p>{i}-{j}</p>" * 40, "n": j} for j in range(1000)]}
+
+
+@dataclass
+class _Widget:
+    title: str
+    rows: list[str]
+
+
+class TestEstimateSize:
+    def test_counts_nested_values(self) -> None:
+        tracemalloc.start()
+        try:
+            value = _page(1)
+            allocated = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        assert 0.9 * allocated < estimate_size(value) < 1.1 * allocated
+
+    def test_objects_and_cycles(self) -> None:
+        widget = _Widget("w", ["x" * 10_000])
+        cycle: list[t.Any] = []
+        cycle.append(cycle)
+
+        assert estimate_size(widget) > 10_000
+        assert estimate_size(cycle) == sys.getsizeof(cycle)
+
+    def test_compiled_template_excludes_its_environment(self) -> None:
+        env = Environment()
+        template = env.from_string("{% for i in x %}{{ i }}{% endfor %}" * 20)
+
+        assert 1_000 < estimate_size(template) < estimate_size(env.__dict__)
+
+    def test_cost_is_bounded(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        walked: list[t.Any] = []
+        referents = _enhanced_cache._referents
+
+        def counting_referents(obj: t.Any) -> list[t.Any]:
+            walked.append(obj)
+            return referents(obj)
+
+        monkeypatch.setattr(_enhanced_cache, "_referents", counting_referents)
+        wide = list(range(1_000_000))
+        deep: list[t.Any] = []
+        for _ in range(50_000):
+            deep = [deep]
+
+        size = estimate_size(wide, max_items=256)
+
+        assert walked == [wide]
+        exact = sys.getsizeof(wide) + sum(map(sys.getsizeof, wide))
+        assert 0.9 * exact < size < 1.1 * exact
+        walked.clear()
+        estimate_size(deep, max_objects=1_000)
+        assert len(walked) < 1_000
+
+
+class TestMemoryLimit:
+    async def test_declared_size_is_used(self) -> None:
+        cache = _manager(max_memory_bytes=1_000)
+        await cache.set("a", "x", size=600)
+        await cache.set("b", "y", size=600)
+
+        assert list(cache.entries) == ["b"]
+        assert cache.metrics.memory_usage == 600
+
+    async def test_byte_limit_evicts_coldest_first(self) -> None:
+        cache = _manager(max_memory_bytes=3 * estimate_size(_page(0)))
+        await cache.set("hot", _page(0), tier=CacheTier.HOT)
+        for i in range(1, 10):
+            await cache.set(f"cold{i}", _page(i))
+
+        assert "hot" in cache.entries
+        assert len(cache.entries) == 3
+
+    async def test_traced_memory_stays_under_the_limit(self) -> None:
+        limit = 8 << 20
+        cache = _manager(max_memory_entries=10_000, max_memory_bytes=limit)
+        tracemalloc.start()
+        try:
+            for i in range(100):
+                await cache.set(f"page{i}", _page(i))
+            allocated = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        assert allocated < limit * 1.25
+
+    async def test_rss_growth_stays_near_the_limit(self) -> None:
+        psutil = pytest.importorskip("psutil")
+        process = psutil.Process(os.getpid())
+        limit = 8 << 20
+        cache = _manager(max_memory_entries=10_000, max_memory_bytes=limit)
+
+        before = process.memory_info().rss
+        # ~80 MB inserted in total.
+        for i in range(100):
+            await cache.set(f"page{i}", _page(i))
+        growth = process.memory_info().rss - before
+
+        assert growth < 2 * limit + (8 << 20)
+
+
+class TestAccessStats:
+    async def test_counters_per_tier_and_tag(self) -> None:
+        cache = _manager(sample_every=0)
+        await cache.set("a", 1, tags={"user"}, tier=CacheTier.HOT)
+        await cache.set("b", 2, tags={"user", "nav"})
+
+        for key in ("a", "a", "b", "missing"):
+            await cache.get(key)
+
+        assert cache.tier_stats[CacheTier.HOT].hits == 2
+        assert cache.tier_stats[CacheTier.COLD].hits == 1
+        assert {tag: stats.hits for tag, stats in cache.tag_stats.items()} == {
+            "user": 3,
+            "nav": 1,
+        }
+        assert (cache.metrics.hits, cache.metrics.misses) == (3, 1)
+        assert not cache.performance_history and not cache.access_history
+
+    async def test_one_in_n_gets_is_sampled(self) -> None:
+        cache = _manager(sample_every=10)
+        await cache.set("a", 1, tier=CacheTier.WARM)
+
+        for _ in range(100):
+            await cache.get("a")
+        await cache.get("missing")
+
+        assert len(cache.performance_history) == 10
+        assert cache.tier_stats[CacheTier.WARM].latency.count == 10
+        assert cache.get_latency.count == 10
+        report = await cache.get_performance_report()
+        assert report["total_operations"] == 101
+        assert report["tiers"]["warm"]["hits"] == 100
+
+    async def test_tracked_tags_are_bounded(self) -> None:
+        cache = _manager(sample_every=0)
+        for i in range(cache.MAX_TRACKED_TAGS + 10):
+            await cache.set(f"k{i}", i, tags={f"tag{i}"})
+            await cache.get(f"k{i}")
+
+        assert len(cache.tag_stats) == cache.MAX_TRACKED_TAGS
+
+    async def test_hits_do_not_allocate(self) -> None:
+        cache = _manager(sample_every=0)
+        await cache.set("a", "value", tags={"t"})
+        await cache.get("a")
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            for _ in range(10_000):
+                await cache.get("a")
+            growth = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+
+        assert growth < 1_000
+
+
+class TestScheduler:
+    async def test_expired_entries_come_off_the_heap(self) -> None:
+        cache = _manager()
+        await cache.set("gone", 1, ttl=0)
+        await cache.set("kept", 2, ttl=3600)
+        await cache.set("forever", 3)
+        await cache.set("replaced", 4, ttl=0)
+        await cache.set("replaced", 5, ttl=3600)
+        await asyncio.sleep(0.01)
+
+        assert await cache.run_maintenance() == 1
+        assert set(cache.entries) == {"kept", "forever", "replaced"}
+
+    async def test_idle_entries_move_down_one_tier_per_run(self) -> None:
+        cache = _manager(demotion_idle_time=0)
+        await cache.set("a", 1, tier=CacheTier.HOT)
+        await cache.set("b", 2, tier=CacheTier.WARM)
+        await asyncio.sleep(0.01)
+
+        assert await cache.run_maintenance() == 2
+        assert cache.entries["a"].tier == CacheTier.WARM
+        assert cache.entries["b"].tier == CacheTier.COLD
+
+    async def test_maintenance_yields_between_slices(self) -> None:
+        cache = _manager(max_memory_entries=50_000)
+        for i in range(20_000):
+            await cache.set(f"k{i}", i, ttl=0)
+        await asyncio.sleep(0.01)
+        gaps: list[float] = []
+
+        async def ticker() -> None:
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        handled = await cache.run_maintenance()
+        task.cancel()
+
+        assert handled == 20_000
+        assert len(gaps) > 10
+        assert max(gaps) < 0.05
+
+    async def test_interval_adapts(self) -> None:
+        cache = _manager(max_memory_entries=10)
+        cache.maintenance_interval = 4.0
+
+        assert cache._next_interval(0) == 8.0
+        assert cache._next_interval(3) == 2.0
+        cache.maintenance_interval = cache.MAX_MAINTENANCE_INTERVAL
+        assert cache._next_interval(0) == cache.MAX_MAINTENANCE_INTERVAL
+
+        for i in range(9):
+            await cache.set(f"k{i}", i)
+        assert cache._next_interval(0) == cache.MIN_MAINTENANCE_INTERVAL
+
+    async def test_warming_runs_concurrently_with_a_limit(self) -> None:
+        cache = _manager()
+        running = peak = 0
+
+        async def loader(key: str) -> str:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return key.upper()
+
+        await cache.initialize()
+        try:
+            start = time.perf_counter()
+            await cache.warm_cache([f"k{i}" for i in range(10)], loader)
+            await asyncio.wait_for(cache.warming_queue.join(), 1)
+            elapsed = time.perf_counter() - start
+        finally:
+            await cache.shutdown()
+
+        assert peak == cache.MAX_CONCURRENT_WARMING
+        assert elapsed < 10 * 0.05
+        assert cache.metrics.warming_operations == 10
+
+    async def test_warmed_entries_start_warm(self) -> None:
+        cache = _manager()
+
+        async def loader(key: str) -> str:
+            return key
+
+        await cache.initialize()
+        try:
+            await cache.warm_cache(["a"], loader)
+            await asyncio.wait_for(cache.warming_queue.join(), 1)
+            assert cache.entries["a"].tier == CacheTier.WARM
+        finally:
+            await cache.shutdown()
+
+
+async def _churn_time(capacity: int, operations: int = 2000) -> float:
+    cache = _manager(
+        max_memory_entries=capacity, hot_tier_size=capacity, warm_tier_size=capacity
+    )
+    tiers = (CacheTier.HOT, CacheTier.WARM, CacheTier.COLD)
+    for i in range(capacity):
+        await cache.set(f"fill{i}", i, tier=tiers[i % 3])
+
+    start = time.perf_counter()
+    for i in range(operations):
+        await cache.set(f"churn{i}", i, tier=tiers[i % 3])
+        await cache.get(f"fill{capacity - 1 - i}")
+    return (time.perf_counter() - start) / operations
+
+
+class TestChurnBenchmark:
+    async def test_per_operation_cost_is_flat(self) -> None:
+        small = await _churn_time(1_000)
+        large = await _churn_time(100_000)
+
+        # A full sort per eviction made this ~100x slower at 100k entries.
+        assert large < small * 5 + 5e-5
@@ -0,0 +1,223 @@
+"""Tests for structural context fingerprints."""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import typing as t
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from starlette.requests import Request
+from fastblocks.adapters.templates._async_renderer import (
+    AsyncTemplateRenderer,
+    RenderContext,
+    RenderResult,
+)
+from fastblocks.adapters.templates._block_renderer import (
+    BlockDefinition,
+    BlockRenderer,
+    BlockRenderRequest,
+)
+from fastblocks.adapters.templates._fingerprint import (
+    SCOPE_KEY,
+    ContextFingerprinter,
+    UnfingerprintableError,
+    context_fingerprint,
+    estimate_size,
+    fingerprinter_for,
+)
+
+
+@dataclass
+class Row:
+    id: int
+    tags: set[str]
+
+
+class Model:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._state = object()
+
+
+class Slotted:
+    __slots__ = ("_cache", "name")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._cache = object()
+
+
+class Opaque:
+    __slots__ = ()
+
+
+def _digest(context: dict[str, t.Any], **kwargs: t.Any) -> str:
+    return context_fingerprint(context, **kwargs).digest
+
+
+class TestFingerprint:
+    def test_set_order_does_not_matter(self) -> None:
+        assert _digest({"a": 1, "b": {2, 3}}) == _digest({"a": 1, "b": {3, 2}})
+
+    def test_mappings_hash_in_insertion_order(self) -> None:
+        assert _digest({"a": 1, "b": 2}) != _digest({"b": 2, "a": 1})
+        assert _digest({"a": 1, "b": 2}, keys={"b", "a"}) == _digest(
+            {"b": 2, "a": 1}, keys=["a", "b"]
+        )
+
+    def test_types_are_distinguished(self) -> None:
+        digests = {_digest({"v": v}) for v in (1, 1.0, "1", True, b"1", None, [1])}
+        assert len(digests) == 7
+
+    def test_objects_hash_public_state(self) -> None:
+        assert _digest({"m": Model("x")}) == _digest({"m": Model("x")})
+        assert _digest({"m": Model("x")}) != _digest({"m": Model("y")})
+        assert _digest({"r": Row(1, {"a"})}) == _digest({"r": Row(1, {"a"})})
+
+    def test_slotted_objects_hash_public_slots(self) -> None:
+        assert _digest({"s": Slotted("x")}) == _digest({"s": Slotted("x")})
+        assert _digest({"s": Slotted("x")}) != _digest({"s": Slotted("y")})
+
+    def test_values_identified_by_address_are_rejected(self) -> None:
+        for value in (Opaque(), object()):
+            with pytest.raises(UnfingerprintableError):
+                context_fingerprint({"v": value})
+        # A repr without an address is stable.
+        assert _digest({"v": 1j}) == _digest({"v": 1j})
+
+    def test_declared_keys(self) -> None:
+        base = {"user": "ann", "now": 1}
+        keys = ["user"]
+        assert _digest(base, keys=keys) == _digest(base | {"now": 2}, keys=keys)
+        assert _digest(base, keys=keys) != _digest(base | {"user": "bo"}, keys=keys)
+
+    def test_cycles_terminate(self) -> None:
+        items: list[t.Any] = [1]
+        items.append(items)
+        assert context_fingerprint({"items": items}).size > 0
+
+    def test_size_tracks_content(self) -> None:
+        small = context_fingerprint({"rows": ["x"] * 10}).size
+        large = context_fingerprint({"rows": ["x"] * 1000}).size
+        assert large > small * 50
+
+    def test_estimated_size_tracks_content(self) -> None:
+        small = estimate_size({"rows": ["x" * 10] * 10})
+        large = estimate_size({"rows": ["x" * 10] * 1000})
+        assert large > small * 50
+        assert estimate_size({"rows": [{"a": 1}] * 10}) > small
+        assert estimate_size({"title": "t" * 1000}) > 1000
+
+    def test_stable_across_processes(self) -> None:
+        code = (
+            "from fastblocks.adapters.templates._fingerprint import "
+            "context_fingerprint as f;"
+            "print(f({'s': {'a', 'b', 'c'}, 'd': {'x': [1.5, None]}}).digest)"
+        )
+        digests = {
+            subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                text=True,
+                check=True,
+                env=os.environ | {"PYTHONHASHSEED": seed},
+            ).stdout
+            for seed in ("1", "2")
+        }
+        assert len(digests) == 1
+
+
+class TestMemo:
+    def test_containers_are_hashed_once(self) -> None:
+        fingerprinter = ContextFingerprinter()
+        rows = [Row(i, set()) for i in range(3)]
+        first = fingerprinter.fingerprint({"rows": rows})
+        memo_size = len(fingerprinter)
+
+        assert fingerprinter.fingerprint({"rows": rows, "page": 1}) != first
+        # Only the new top-level dict was added; rows came from the memo.
+        assert len(fingerprinter) == memo_size + 1
+
+    def test_scoped_to_the_request(self) -> None:
+        scope = {"type": "http", "method": "GET", "headers": []}
+        fingerprinter = fingerprinter_for(Request(scope))
+
+        assert scope[SCOPE_KEY] is fingerprinter
+        assert fingerprinter_for(Request(scope)) is fingerprinter
+        assert fingerprinter_for(None) is not fingerprinter
+
+
+def _renderer() -> AsyncTemplateRenderer:
+    env = Environment(
+        loader=DictLoader({"p.html": "{% block b %}{{ user }}{% endblock %}"}),
+        enable_async=True,
+    )
+    return AsyncTemplateRenderer(
+        base_templates=t.cast(t.Any, SimpleNamespace(app=SimpleNamespace(env=env))),
+        hybrid_manager=t.cast(t.Any, object()),
+    )
+
+
+class TestCacheKeys:
+    async def test_declared_keys_enable_render_caching(self) -> None:
+        renderer = _renderer()
+        keys = ["user"]
+        first = await renderer.render(
+            RenderContext("p.html", {"user": "ann", "now": 1}, cache_context_keys=keys)
+        )
+        second = await renderer.render(
+            RenderContext("p.html", {"user": "ann", "now": 2}, cache_context_keys=keys)
+        )
+
+        assert not first.cache_hit
+        assert second.cache_hit
+        assert second.content == "ann"
+
+    async def test_unfingerprintable_contexts_are_not_cached(self) -> None:
+        renderer = _renderer()
+        keys = ["user"]
+        for _ in range(2):
+            result = await renderer.render(
+                RenderContext("p.html", {"user": object()}, cache_context_keys=keys)
+            )
+            assert not result.cache_hit
+
+        assert len(renderer._render_cache) == 0
+
+    async def test_uncached_renders_are_not_fingerprinted(self) -> None:
+        renderer = _renderer()
+        scope = {"type": "http", "method": "GET", "headers": []}
+        await renderer.render(
+            RenderContext("p.html", {"user": "ann"}, request=Request(scope))
+        )
+
+        assert SCOPE_KEY not in scope
+
+    async def test_block_cache_key_is_a_fingerprint(self) -> None:
+        renderer = _renderer()
+        seen: list[RenderContext] = []
+
+        async def render(render_context: RenderContext) -> RenderResult:
+            seen.append(render_context)
+            return RenderResult(content="ann")
+
+        renderer.render = render  # type: ignore[method-assign]
+        blocks = BlockRenderer(renderer, t.cast(t.Any, object()))
+        blocks.registry.register_block(
+            BlockDefinition(
+                name="p:b",
+                template_name="p.html",
+                block_name="b",
+                cache_context_keys={"user"},
+            )
+        )
+        await blocks.render_block(BlockRenderRequest("p:b", {"user": "ann", "n": 1}))
+        await blocks.render_block(BlockRenderRequest("p:b", {"user": "ann", "n": 2}))
+
+        expected = f"block:p:b:{_digest({'user': 'ann'})}"
+        assert [c.cache_key for c in seen] == [expected, expected]
@@ -0,0 +1,112 @@
+"""Tests for concurrent fragment composition in BlockRenderer."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import typing as t
+
+from fastblocks.adapters.templates._block_renderer import (
+    BlockDefinition,
+    BlockRegistry,
+    BlockRenderer,
+    BlockRenderRequest,
+    BlockRenderResult,
+    BlockUpdateMode,
+)
+
+
+class _SlowBlocks(BlockRenderer):
+    """Renders each block after a per-block delay, tracking concurrency."""
+
+    def __init__(self, delays: dict[str, float], **kwargs: t.Any) -> None:
+        super().__init__(t.cast(t.Any, object()), t.cast(t.Any, object()), **kwargs)
+        self.delays = delays
+        self.active = 0
+        self.peak = 0
+        for name in delays:
+            self.registry.register_block(
+                BlockDefinition(
+                    name=f"dash.html:{name}", template_name="dash.html", block_name=name
+                )
+            )
+
+    async def render_block(self, request: BlockRenderRequest) -> BlockRenderResult:
+        name = request.block_id.split(":")[1]
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delays[name])
+            if name == "broken":
+                raise RuntimeError(name)
+        finally:
+            self.active -= 1
+        return BlockRenderResult(
+            content=f"<{name}>",
+            block_id=request.block_id,
+            update_mode=BlockUpdateMode.REPLACE,
+        )
+
+
+class TestRenderFragmentComposition:
+    async def test_wall_time_follows_slowest_fragment(self) -> None:
+        delays = {f"f{i}": 0.05 for i in range(11)} | {"slow": 0.2}
+        renderer = _SlowBlocks(delays, max_concurrent_fragments=12)
+
+        start = time.perf_counter()
+        response = await renderer.render_fragment_composition("dash", list(delays))
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.4
+        assert response.body.decode() == "\n".join(f"<{name}>" for name in delays)
+        assert response.headers["HX-Composition"] == "dash"
+
+    async def test_concurrency_is_bounded(self) -> None:
+        renderer = _SlowBlocks({f"f{i}": 0.01 for i in range(10)})
+        renderer.max_concurrent_fragments = 3
+
+        await renderer.render_fragment_composition("dash", [f"f{i}" for i in range(10)])
+
+        assert renderer.peak == 3
+
+    async def test_order_with_failures_and_missing_fragments(self) -> None:
+        renderer = _SlowBlocks({"a": 0.03, "broken": 0.0, "b": 0.0})
+
+        response = await renderer.render_fragment_composition(
+            "dash", ["a", "missing", "broken", "b"]
+        )
+
+        assert response.body.decode() == (
+            "<a>\n<!-- Fragment broken failed to render -->\n<b>"
+        )
+
+
+class TestFindFragment:
+    def test_lookup_by_id_name_and_substring(self) -> None:
+        registry = BlockRegistry()
+        for template in ("a.html", "b.html"):
+            registry.register_block(
+                BlockDefinition(
+                    name=f"{template}:sidebar",
+                    template_name=template,
+                    block_name="sidebar",
+                )
+            )
+
+        by_id = registry.find_fragment("b.html:sidebar")
+        by_name = registry.find_fragment("sidebar")
+        by_substring = registry.find_fragment("b.html")
+        assert by_id is not None and by_id.template_name == "b.html"
+        assert by_name is not None and by_name.template_name == "a.html"
+        assert by_substring is not None and by_substring.name == "b.html:sidebar"
+        assert registry.find_fragment("nav") is None
+        by_partial_name = registry.find_fragment("side")
+        assert by_partial_name is not None and by_partial_name.name == "a.html:sidebar"
+
+        registry.register_block(
+            BlockDefinition(name="c.html:nav", template_name="c.html", block_name="nav")
+        )
+        assert registry.find_fragment("na") is registry.get_block("c.html:nav")
+
+        registry.clear()
+        assert registry.find_fragment("sidebar") is None
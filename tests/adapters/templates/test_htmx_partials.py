@@ -0,0 +1,153 @@
+"""Tests for rendering only the HX-Target block of full-page routes."""
+
+from __future__ import annotations
+
+import importlib
+import sys
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from starlette.requests import Request
+from fastblocks.adapters.templates._partials import (
+    render_target_block,
+    target_block_name,
+)
+from fastblocks.adapters.templates.jinja2 import Templates
+from fastblocks.htmx import HtmxDetails
+
+_SOURCES = {
+    "base.html": (
+        "<html><nav>{% block nav %}menu{% endblock %}</nav>"
+        '<main id="main-content">{% block main_content %}{% endblock %}</main>'
+        "</html>"
+    ),
+    "page.html": (
+        "{% extends 'base.html' %}"
+        "{% block main_content %}{% for i in items %}<p>{{ i }}</p>{% endfor %}"
+        "{% endblock %}"
+    ),
+}
+
+
+class TestTargetBlockName:
+    def test_matches_id_and_dashed_id(self) -> None:
+        names = ["nav", "main_content"]
+
+        assert target_block_name(names, "nav") == "nav"
+        assert target_block_name(names, "#main-content") == "main_content"
+        assert target_block_name(names, "footer") is None
+
+    def test_ambiguous_targets_do_not_match(self) -> None:
+        names = ["main-content", "main_content"]
+
+        assert target_block_name(names, "main-content") is None
+
+
+class TestRenderTargetBlock:
+    async def test_renders_only_the_targeted_block(self) -> None:
+        env = Environment(loader=DictLoader(_SOURCES), enable_async=True)
+        template = env.get_template("page.html")
+
+        rendered = await render_target_block(template, "main-content", {"items": [1]})
+
+        assert rendered == ("main_content", "<p>1</p>")
+        assert await render_target_block(template, "footer", {}) is None
+
+
+def _request(**headers: str) -> Request:
+    scope: dict[str, t.Any] = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    scope["htmx"] = HtmxDetails(scope)
+    return Request(scope)
+
+
+@pytest.fixture
+def templates() -> Templates:
+    for key in list(sys.modules):
+        if key.startswith("jinja2_async_environment"):
+            del sys.modules[key]
+    module = importlib.import_module("jinja2_async_environment")
+    loaders = importlib.import_module("jinja2_async_environment.loaders")
+    env = module.AsyncEnvironment(
+        loader=loaders.AsyncDictLoader(_SOURCES, "templates"), enable_async=True
+    )
+    full_renders: list[str] = []
+    prepared: list[dict[str, t.Any]] = []
+
+    async def template_response(**kwargs: t.Any) -> str:
+        full_renders.append(kwargs["name"])
+        return "full page"
+
+    def prepare_template_context(
+        context: dict[str, t.Any], request: Request
+    ) -> dict[str, t.Any]:
+        # Stands in for the context processors.
+        prepared.append(context)
+        return context | {"request": request}
+
+    templates = Templates(
+        config=SimpleNamespace(
+            debug=SimpleNamespace(), templates=SimpleNamespace(htmx_partials=True)
+        )
+    )
+    templates.app = t.cast(
+        t.Any,
+        SimpleNamespace(
+            env=env,
+            TemplateResponse=template_response,
+            _prepare_template_context=prepare_template_context,
+            full_renders=full_renders,
+            prepared=prepared,
+        ),
+    )
+    return templates
+
+
+class TestRenderTemplate:
+    async def test_htmx_target_gets_only_its_block(self, templates: Templates) -> None:
+        request = _request(**{"HX-Request": "true", "HX-Target": "main-content"})
+
+        response = await templates.render_template(
+            request, "page.html", {"items": [1, 2]}
+        )
+
+        assert response.body == b"<p>1</p><p>2</p>"
+        assert response.headers["Vary"] == "HX-Request, HX-Target"
+        assert templates.app.full_renders == []  # type: ignore[union-attr]
+        assert len(templates.app.prepared) == 1  # type: ignore[union-attr]
+
+    @pytest.mark.parametrize(
+        "headers",
+        [
+            {},
+            {"HX-Request": "true"},
+            {"HX-Request": "true", "HX-Target": "footer"},
+            {"HX-Request": "true", "HX-Target": "main-content", "HX-Boosted": "true"},
+        ],
+    )
+    async def test_falls_back_to_the_full_page(
+        self, templates: Templates, headers: dict[str, str]
+    ) -> None:
+        response = await templates.render_template(
+            _request(**headers), "page.html", {"items": []}
+        )
+
+        assert response == "full page"
+        assert templates.app.full_renders == ["page.html"]  # type: ignore[union-attr]
+        # Left to the full-page render, which prepares it once.
+        assert templates.app.prepared == []  # type: ignore[union-attr]
+
+    async def test_opt_in(self, templates: Templates) -> None:
+        request = _request(**{"HX-Request": "true", "HX-Target": "nav"})
+
+        response = await templates.render_template(
+            request, "page.html", {}, htmx_partial=False
+        )
+
+        assert response == "full page"
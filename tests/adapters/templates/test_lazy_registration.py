@@ -0,0 +1,189 @@
+"""Tests for lazily loaded template filters and globals, and eager extensions."""
+
+from __future__ import annotations
+
+import sys
+import types
+import typing as t
+from importlib import import_module
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from jinja2.ext import Extension
+from fastblocks.adapters.templates import jinja2 as jinja2_adapter
+from fastblocks.adapters.templates._registration import (
+    FILTER_GROUPS,
+    LazyFilterMap,
+    install_lazy_filters,
+    install_lazy_globals,
+)
+from fastblocks.adapters.templates.jinja2 import Templates
+
+_GROUPS = {group.name: group for group in FILTER_GROUPS}
+
+
+def _unload(*modules: str) -> None:
+    for module in modules:
+        sys.modules.pop(module, None)
+
+
+class TestFilterGroups:
+    @pytest.mark.parametrize("group", FILTER_GROUPS, ids=lambda g: g.name)
+    def test_static_names_match_module_mappings(self, group: t.Any) -> None:
+        module = import_module(group.module)
+        provided = set()
+        for mapping in group.mappings:
+            provided.update(getattr(module, mapping))
+        assert provided == group.names
+
+
+class TestLazyFilterMap:
+    def test_membership_does_not_import(self) -> None:
+        _unload(_GROUPS["enhanced"].module)
+        filters = LazyFilterMap({}, FILTER_GROUPS)
+
+        assert "wa_icon" in filters
+        assert _GROUPS["enhanced"].module not in sys.modules
+        assert filters.loaded_groups == []
+
+    def test_lookup_imports_only_that_group(self) -> None:
+        filters = LazyFilterMap({}, FILTER_GROUPS)
+
+        assert callable(filters["wa_icon"])
+        assert filters.loaded_groups == ["enhanced"]
+        assert "async_optimized_font_loading" in dict(filters)
+        assert "img_tag" not in dict(filters)
+
+    def test_explicit_filter_wins(self) -> None:
+        def custom(value: str) -> str:
+            return value
+
+        filters = LazyFilterMap({"img_tag": custom}, FILTER_GROUPS)
+        filters["icon_tag"]  # loads the core group
+
+        assert filters["img_tag"] is custom
+
+    def test_unknown_filter(self) -> None:
+        filters = LazyFilterMap({}, FILTER_GROUPS)
+        assert filters.get("nope") is None
+        with pytest.raises(KeyError):
+            filters["nope"]
+
+    def test_compiling_a_template_loads_used_group(self) -> None:
+        env = Environment()
+        filters = install_lazy_filters(env)
+
+        template = env.from_string("{{ 3 | htmx_retry_trigger('linear') }}")
+
+        assert filters.loaded_groups == ["core"]
+        assert template.render() == 'data-max-retries="3" data-backoff="linear"'
+
+
+class TestLazyAdapterGlobal:
+    def test_adapter_resolved_once_on_first_use(self) -> None:
+        calls: list[str] = []
+
+        class Images:
+            name = "cloudflare"
+
+        def resolve(adapter: str) -> t.Any:
+            calls.append(adapter)
+            return Images()
+
+        env = Environment()
+        install_lazy_globals(env, resolve)
+        template = env.from_string(
+            "{{ images_adapter.name }}|{{ images_adapter.name }}"
+        )
+
+        assert calls == []
+        assert template.render() == "cloudflare|cloudflare"
+        assert calls == ["images"]
+
+    def test_unavailable_adapter_is_falsy(self) -> None:
+        env = Environment()
+        install_lazy_globals(env, lambda adapter: None)
+        template = env.from_string("{% if fonts_adapter %}yes{% else %}no{% endif %}")
+
+        assert template.render() == "no"
+
+    def test_disabled_adapters_stay_undefined(self) -> None:
+        env = Environment()
+        install_lazy_globals(env, lambda adapter: None, lambda adapter: False)
+        template = env.from_string("{{ icons_adapter is defined }}")
+
+        assert "icons_adapter" not in env.globals
+        assert template.render() == "False"
+
+    def test_resolves_dependencies_primed_by_templates(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        class Images:
+            name = "cloudflare"
+
+        primed = jinja2_adapter._resolved_dependencies
+        monkeypatch.setitem(primed, "images", Images())
+        for adapter in ("styles", "icons", "fonts"):
+            monkeypatch.setitem(primed, adapter, None)
+        env = Environment()
+        install_lazy_globals(
+            env, jinja2_adapter._try_resolve_sync, jinja2_adapter._adapter_enabled
+        )
+        template = env.from_string(
+            "{{ images_adapter.name }}|{{ fonts_adapter is defined }}"
+        )
+
+        assert template.render() == "cloudflare|False"
+
+
+@pytest.fixture
+def async_env() -> types.ModuleType:
+    """Import the real jinja2_async_environment (see test_precompile)."""
+    for key in list(sys.modules):
+        if key.startswith("jinja2_async_environment"):
+            del sys.modules[key]
+    return import_module("jinja2_async_environment")
+
+
+class _ShoutExtension(Extension):
+    def __init__(self, environment: Environment) -> None:
+        super().__init__(environment)
+        environment.filters["shout"] = str.upper
+
+
+class _Templates(Templates):
+    def get_loader(self, template_paths: t.Any) -> t.Any:
+        return DictLoader({})
+
+
+class TestConfiguredExtensions:
+    async def test_loaded_for_templates_that_are_never_parsed(
+        self, async_env: types.ModuleType, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        module = types.ModuleType("shout_extension")
+        module.ShoutExtension = _ShoutExtension  # type: ignore[attr-defined]
+        monkeypatch.setitem(sys.modules, "shout_extension", module)
+        settings = SimpleNamespace(
+            extensions=["shout_extension"],
+            context_processors=[],
+            loader=None,
+            delimiters={},
+            globals={},
+        )
+        templates = _Templates(
+            config=SimpleNamespace(
+                debug=SimpleNamespace(production=False),
+                deployed=False,
+                templates=settings,
+            )
+        )
+        env = (await templates.init_envs([])).env
+
+        # As if loaded from the bytecode cache or a precompiled bundle.
+        code = Environment(extensions=[_ShoutExtension], enable_async=True).compile(
+            "{{ 'hi' | shout }}"
+        )
+        template = env.template_class.from_code(env, code, env.make_globals(None))
+
+        assert await template.render_async() == "HI"
@@ -0,0 +1,176 @@
+"""Tests for PerformanceOptimizer decisions and their use by the renderer."""
+
+from __future__ import annotations
+
+import time
+import typing as t
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+
+from jinja2 import DictLoader, Environment
+from fastblocks.adapters.templates._async_renderer import (
+    AsyncTemplateRenderer,
+    RenderContext,
+)
+from fastblocks.adapters.templates._performance_optimizer import (
+    PerformanceMetrics,
+    PerformanceOptimizer,
+)
+
+
+def _record(
+    optimizer: PerformanceOptimizer,
+    render_time: float,
+    count: int = 1,
+    size: int = 1_000,
+    cache_hit: bool = False,
+    template: str = "page.html",
+) -> None:
+    metrics = PerformanceMetrics(
+        render_time=render_time,
+        cache_hit=cache_hit,
+        template_size=size,
+        context_size=100,
+    )
+    for _ in range(count):
+        optimizer.record_render(template, metrics)
+
+
+def _explain(optimizer: PerformanceOptimizer, part: str) -> dict[str, t.Any]:
+    explanation = optimizer.explain("page.html")
+    assert explanation is not None
+    return explanation[part]
+
+
+class TestCacheTtl:
+    def test_slow_stable_templates_get_longer_ttls(self) -> None:
+        optimizer = PerformanceOptimizer()
+        _record(optimizer, 0.25, count=4)
+        assert optimizer.get_optimal_cache_ttl("page.html") == 300
+        assert "only 4 renders" in _explain(optimizer, "cache_ttl")["reason"]
+
+        _record(optimizer, 0.25)
+
+        assert optimizer.get_optimal_cache_ttl("page.html") == 1800
+        assert "stable" in _explain(optimizer, "cache_ttl")["reason"]
+
+    def test_unstable_templates_keep_the_default(self) -> None:
+        optimizer = PerformanceOptimizer()
+        for render_time in (0.01, 0.9) * 5:
+            _record(optimizer, render_time)
+
+        assert optimizer.get_optimal_cache_ttl("page.html") == 300
+        assert "varies" in _explain(optimizer, "cache_ttl")["reason"]
+
+    def test_cache_hits_are_not_render_samples(self) -> None:
+        optimizer = PerformanceOptimizer()
+        _record(optimizer, 0.25, count=5)
+        _record(optimizer, 0.0001, count=100, cache_hit=True)
+
+        assert len(optimizer.template_stats["page.html"]) == 5
+        assert optimizer.get_optimal_cache_ttl("page.html") == 1800
+        assert optimizer.get_performance_stats().cache_hit_ratio > 0.9
+
+
+class TestStreaming:
+    def test_large_output_switches_to_streaming(self) -> None:
+        optimizer = PerformanceOptimizer()
+        _record(optimizer, 0.01, size=200_000)
+
+        assert optimizer.should_enable_streaming("page.html", 0)
+        assert "output size" in _explain(optimizer, "streaming")["reason"]
+
+    def test_hysteresis(self) -> None:
+        optimizer = PerformanceOptimizer()
+        _record(optimizer, 0.4, count=5, template="other.html")
+        assert not optimizer.should_enable_streaming("other.html", 0)
+
+        _record(optimizer, 0.6)
+        _record(optimizer, 0.4, count=30)
+
+        # 0.4s would not switch streaming on, but does not switch it off.
+        assert optimizer.should_enable_streaming("page.html", 0)
+        streaming = _explain(optimizer, "streaming")
+        assert streaming["changes"] == 1
+        assert ">= 0.3s" in streaming["reason"]
+
+    def test_changes_are_held(self) -> None:
+        optimizer = PerformanceOptimizer()
+        _record(optimizer, 0.6)
+        _record(optimizer, 0.01, count=40)
+
+        streaming = _explain(optimizer, "streaming")
+        assert streaming["value"] is True and streaming["held"] is True
+
+        optimizer.MIN_DECISION_HOLD = 0
+        _record(optimizer, 0.01, count=optimizer.EVALUATE_EVERY)
+
+        streaming = _explain(optimizer, "streaming")
+        assert streaming["value"] is False and streaming["changes"] == 2
+        assert not optimizer.should_enable_streaming("page.html", 0)
+
+
+_SOURCES = {
+    "big.html": "{% for i in range(rows) %}<p>{{ i }}</p>{% endfor %}",
+    "small.html": "<p>{{ value }}</p>",
+}
+
+
+def _renderer(optimizer: PerformanceOptimizer) -> AsyncTemplateRenderer:
+    env = Environment(loader=DictLoader(_SOURCES), enable_async=True)
+    return AsyncTemplateRenderer(
+        base_templates=t.cast(t.Any, SimpleNamespace(app=SimpleNamespace(env=env))),
+        hybrid_manager=t.cast(t.Any, object()),
+        performance_optimizer=optimizer,
+    )
+
+
+class TestRendererUsesDecisions:
+    async def test_big_template_switches_to_streaming(self) -> None:
+        optimizer = PerformanceOptimizer()
+        renderer = _renderer(optimizer)
+        context = {"rows": 20_000}
+
+        first = await renderer.render(RenderContext("big.html", dict(context)))
+        assert isinstance(first.content, str)
+
+        second = await renderer.render(RenderContext("big.html", dict(context)))
+        assert isinstance(second.content, AsyncIterator)
+        streamed = "".join([chunk async for chunk in second.content])
+
+        assert streamed == first.content
+        explanation = renderer.explain_decisions("big.html")
+        assert explanation is not None
+        # The stream was measured once complete, with its full size.
+        assert explanation["renders"] == 2
+        assert explanation["output_size"] == len(first.content)
+
+    async def test_cached_output_uses_the_decided_ttl(self) -> None:
+        optimizer = PerformanceOptimizer()
+        optimizer.MIN_TTL_SAMPLES = 1
+        optimizer.TTL_STEPS = ((0.0, 1800),)
+        renderer = _renderer(optimizer)
+
+        await renderer.render(RenderContext("small.html", {"value": 1}))
+        await renderer.render(
+            RenderContext("small.html", {"value": 1}, cache_key="small")
+        )
+
+        expires_at = renderer._render_cache._entries["small"].expires_at
+        # 1800s less at most CACHE_TTL_JITTER of it.
+        assert expires_at - time.time() > 1600
+
+    async def test_explicit_ttl_is_kept(self) -> None:
+        optimizer = PerformanceOptimizer()
+        optimizer.MIN_TTL_SAMPLES = 1
+        optimizer.TTL_STEPS = ((0.0, 1800),)
+        renderer = _renderer(optimizer)
+
+        await renderer.render(RenderContext("small.html", {"value": 1}))
+        # 300 is also the optimizer's default; it is not taken for "unset".
+        await renderer.render(
+            RenderContext("small.html", {"value": 1}, cache_key="small", cache_ttl=300)
+        )
+
+        expires_at = renderer._render_cache._entries["small"].expires_at
+        assert expires_at - time.time() <= 300
@@ -0,0 +1,138 @@
+"""Tests for native async block rendering."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import sys
+import types
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from fastblocks.adapters.templates._async_renderer import (
+    AsyncTemplateRenderer,
+    RenderContext,
+    RenderMode,
+)
+from fastblocks.adapters.templates._partials import render_block_async
+
+_SOURCES = {
+    "base.html": (
+        "<html>{% block head %}<title>Base</title>{% endblock %}"
+        "{% block body %}<main>{% block content %}base{% endblock %}</main>"
+        "{% endblock %}</html>"
+    ),
+    "layout.html": (
+        "{% extends 'base.html' %}"
+        "{% block content %}[layout {{ super() }}]{% endblock %}"
+    ),
+    "page.html": (
+        "{% extends 'layout.html' %}"
+        "{% set title = 'Page' %}"
+        "{% block content %}{{ title }} {{ user|slow_upper }} {{ super() }}"
+        "{% endblock %}"
+    ),
+    "loop.html": (
+        "{% for item in items %}{% block row scoped %}<{{ item }}>{% endblock %}"
+        "{% endfor %}"
+    ),
+}
+
+
+async def slow_upper(value: str) -> str:
+    await asyncio.sleep(0.05)
+    return value.upper()
+
+
+@pytest.fixture
+def env() -> Environment:
+    env = Environment(loader=DictLoader(_SOURCES), enable_async=True)
+    env.filters["slow_upper"] = slow_upper
+    return env
+
+
+class TestRenderBlockAsync:
+    async def test_super_resolves_through_the_layout_chain(
+        self, env: Environment
+    ) -> None:
+        template = env.get_template("page.html")
+
+        content = await render_block_async(template, "content", {"user": "ann"})
+
+        assert content == "Page ANN [layout base]"
+
+    async def test_blocks_defined_only_by_a_parent(self, env: Environment) -> None:
+        template = env.get_template("page.html")
+
+        assert await render_block_async(template, "head", {}) == "<title>Base</title>"
+        body = await render_block_async(template, "body", {"user": "ann"})
+        assert body == "<main>Page ANN [layout base]</main>"
+
+    async def test_matches_the_full_render(self, env: Environment) -> None:
+        template = env.get_template("page.html")
+
+        page = await template.render_async(user="ann")
+        block = await render_block_async(template, "body", {"user": "ann"})
+
+        assert block in page
+
+    async def test_scoped_block_reads_the_render_context(
+        self, env: Environment
+    ) -> None:
+        template = env.get_template("loop.html")
+
+        assert await render_block_async(template, "row", {"item": 3}) == "<3>"
+
+    async def test_missing_block(self, env: Environment) -> None:
+        with pytest.raises(KeyError):
+            await render_block_async(env.get_template("page.html"), "nav", {})
+
+    async def test_async_filters_do_not_block_the_loop(self, env: Environment) -> None:
+        template = env.get_template("page.html")
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await asyncio.gather(
+            *(render_block_async(template, "content", {"user": "u"}) for _ in range(10))
+        )
+
+        assert loop.time() - start < 0.3
+        assert set(results) == {"Page U [layout base]"}
+
+    async def test_async_environment(self) -> None:
+        for key in list(sys.modules):
+            if key.startswith("jinja2_async_environment"):
+                del sys.modules[key]
+        module: types.ModuleType = importlib.import_module("jinja2_async_environment")
+        loaders = importlib.import_module("jinja2_async_environment.loaders")
+        env = module.AsyncEnvironment(
+            loader=loaders.AsyncDictLoader(
+                {k: v for k, v in _SOURCES.items() if k != "page.html"}, "templates"
+            ),
+            enable_async=True,
+        )
+        template = await env.get_template_async("layout.html")
+
+        assert await render_block_async(template, "content", {}) == "[layout base]"
+
+
+class TestRendererBlockMode:
+    async def test_block_mode_renders_only_the_block(self, env: Environment) -> None:
+        renderer = AsyncTemplateRenderer(
+            base_templates=t.cast(t.Any, SimpleNamespace(app=SimpleNamespace(env=env))),
+            hybrid_manager=t.cast(t.Any, object()),
+        )
+
+        result = await renderer.render(
+            RenderContext(
+                template_name="page.html",
+                context={"user": "ann"},
+                mode=RenderMode.BLOCK,
+                block_name="content",
+            )
+        )
+
+        assert result.status_code == 200
+        assert result.content == "Page ANN [layout base]"
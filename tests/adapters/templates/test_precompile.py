@@ -0,0 +1,164 @@
+"""Tests for ahead-of-time template bundle compilation."""
+
+from __future__ import annotations
+
+import importlib
+import json
+import sys
+import types
+import zipfile
+from pathlib import Path
+
+import jinja2
+import pytest
+
+
+@pytest.fixture
+def precompile() -> types.ModuleType:
+    """Import ``_precompile`` against the real jinja2_async_environment.
+
+    Other template test modules replace ``jinja2_async_environment`` in
+    ``sys.modules`` at collection time; bundles need the real environment to
+    compile and render. ``restore_module_state`` puts the previous entries
+    back after each test.
+    """
+    for key in list(sys.modules):
+        if key.startswith("jinja2_async_environment") or key.endswith("._precompile"):
+            del sys.modules[key]
+    return importlib.import_module("fastblocks.adapters.templates._precompile")
+
+
+def _write(root: Path, name: str, source: str) -> None:
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(source)
+
+
+@pytest.fixture
+def searchpaths(tmp_path: Path) -> list[Path]:
+    theme = tmp_path / "theme"
+    base = tmp_path / "base"
+    _write(theme, "index.html", "<h1>[[ title ]]</h1>")
+    _write(base, "index.html", "<h1>base</h1>")
+    _write(base, "blocks/item.html", "[% for i in items %][[ i ]],[% endfor %]")
+    _write(base, "style.css", "body { color: [[ color ]]; }")
+    return [theme, base]
+
+
+class TestDiscoverTemplates:
+    def test_first_searchpath_wins(
+        self, precompile: types.ModuleType, searchpaths: list[Path]
+    ) -> None:
+        found = precompile.discover_templates(searchpaths)
+        assert found["index.html"] == searchpaths[0] / "index.html"
+        assert set(found) == {"index.html", "blocks/item.html", "style.css"}
+
+    def test_missing_searchpath_is_skipped(
+        self, precompile: types.ModuleType, tmp_path: Path
+    ) -> None:
+        assert precompile.discover_templates([tmp_path / "nope"]) == {}
+
+
+class TestCompileTemplateBundle:
+    def test_writes_manifest_and_code(
+        self, precompile: types.ModuleType, searchpaths: list[Path], tmp_path: Path
+    ) -> None:
+        output = tmp_path / "out" / "templates.bundle"
+        result = precompile.compile_template_bundle(searchpaths, output, workers=1)
+
+        assert result.ok
+        assert sorted(result.compiled) == [
+            "blocks/item.html",
+            "index.html",
+            "style.css",
+        ]
+        with zipfile.ZipFile(output) as archive:
+            manifest = json.loads(archive.read("manifest.json"))
+            assert set(manifest["templates"]) == set(result.compiled)
+            assert "code/index.html" in archive.namelist()
+
+    def test_broken_template_is_reported_not_bundled(
+        self, precompile: types.ModuleType, searchpaths: list[Path], tmp_path: Path
+    ) -> None:
+        _write(searchpaths[1], "broken.html", "[% if %]")
+        output = tmp_path / "templates.bundle"
+        result = precompile.compile_template_bundle(searchpaths, output, workers=2)
+
+        assert not result.ok
+        assert "broken.html" in result.errors
+        assert "broken.html" not in precompile.TemplateBundle.load(output)
+
+    async def test_translate_delimiters(
+        self, precompile: types.ModuleType, tmp_path: Path
+    ) -> None:
+        src = tmp_path / "src"
+        _write(src, "legacy.html", "{% if show %}{{ name }}{% endif %}")
+        output = tmp_path / "templates.bundle"
+        precompile.compile_template_bundle(
+            [src], output, translate_delimiters=True, workers=1
+        )
+
+        env = precompile.build_compile_environment()
+        env.loader = precompile.PrecompiledLoader(
+            precompile.TemplateBundle.load(output)
+        )
+        template = await env.get_template_async("legacy.html")
+        assert await template.render_async(show=True, name="x") == "x"
+
+
+class TestTemplateBundle:
+    def test_rejects_other_toolchain(
+        self, precompile: types.ModuleType, searchpaths: list[Path], tmp_path: Path
+    ) -> None:
+        output = tmp_path / "templates.bundle"
+        precompile.compile_template_bundle(searchpaths, output, workers=1)
+        with zipfile.ZipFile(output) as archive:
+            blobs = {n: archive.read(n) for n in archive.namelist()}
+        manifest = json.loads(blobs["manifest.json"])
+        manifest["jinja2"] = "0.0.0"
+        blobs["manifest.json"] = json.dumps(manifest).encode()
+        with zipfile.ZipFile(output, "w") as archive:
+            for name, data in blobs.items():
+                archive.writestr(name, data)
+
+        with pytest.raises(ValueError, match="jinja2"):
+            precompile.TemplateBundle.load(output)
+
+
+class TestPrecompiledLoader:
+    async def test_renders_from_bundle_and_falls_back(
+        self, precompile: types.ModuleType, searchpaths: list[Path], tmp_path: Path
+    ) -> None:
+        output = tmp_path / "templates.bundle"
+        precompile.compile_template_bundle(searchpaths, output, workers=1)
+        loaders = importlib.import_module("jinja2_async_environment.loaders")
+
+        env = precompile.build_compile_environment()
+        fallback = loaders.AsyncDictLoader({"extra.html": "extra [[ n ]]"}, "templates")
+        env.loader = precompile.PrecompiledLoader(
+            precompile.TemplateBundle.load(output), fallback
+        )
+
+        index = await env.get_template_async("index.html")
+        assert await index.render_async(title="Hi") == "<h1>Hi</h1>"
+        items = await env.get_template_async("blocks/item.html")
+        assert await items.render_async(items=[1, 2]) == "1,2,"
+        extra = await env.get_template_async("extra.html")
+        assert await extra.render_async(n=3) == "extra 3"
+
+        names = await env.loader.list_templates_async()
+        assert "extra.html" in names
+        assert "index.html" in names
+
+    async def test_missing_without_fallback(
+        self, precompile: types.ModuleType, searchpaths: list[Path], tmp_path: Path
+    ) -> None:
+        output = tmp_path / "templates.bundle"
+        precompile.compile_template_bundle(searchpaths, output, workers=1)
+        env = precompile.build_compile_environment()
+        env.loader = precompile.PrecompiledLoader(
+            precompile.TemplateBundle.load(output)
+        )
+
+        with pytest.raises(jinja2.TemplateNotFound):
+            await env.get_template_async("missing.html")
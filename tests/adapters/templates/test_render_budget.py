@@ -0,0 +1,179 @@
+"""Tests for render time budgets and their fallbacks."""
+
+from __future__ import annotations
+
+import asyncio
+import typing as t
+from types import SimpleNamespace
+
+from jinja2 import DictLoader, Environment
+from fastblocks.adapters.templates._async_renderer import (
+    AsyncTemplateRenderer,
+    RenderContext,
+    RenderMode,
+)
+from fastblocks.adapters.templates._block_renderer import (
+    BlockDefinition,
+    BlockRenderer,
+    BlockRenderRequest,
+)
+from fastblocks.adapters.templates._render_cache import RenderCache
+
+_SOURCES = {
+    "page.html": (
+        "<main>{% block stats %}{{ value|slow }}{% endblock %}"
+        "{% block nav %}menu{% endblock %}</main>"
+    ),
+}
+
+
+def _renderer(delay: list[float]) -> AsyncTemplateRenderer:
+    async def slow(value: t.Any) -> str:
+        await asyncio.sleep(delay[0])
+        return str(value)
+
+    env = Environment(loader=DictLoader(_SOURCES), enable_async=True)
+    env.filters["slow"] = slow
+    return AsyncTemplateRenderer(
+        base_templates=t.cast(t.Any, SimpleNamespace(app=SimpleNamespace(env=env))),
+        hybrid_manager=t.cast(t.Any, object()),
+    )
+
+
+def _context(value: int, **kwargs: t.Any) -> RenderContext:
+    return RenderContext(
+        template_name="page.html",
+        context={"value": value},
+        mode=RenderMode.BLOCK,
+        block_name="stats",
+        **kwargs,
+    )
+
+
+class TestRenderCacheStaleEntries:
+    def test_expired_entry_is_kept_for_peek(self) -> None:
+        cache = RenderCache()
+        cache.set("a", "A", 10, "t.html", now=100)
+
+        assert cache.get("a", now=110, keep_stale=True) is None
+        assert cache.peek("a") == "A"
+        assert cache.get("a", now=110) is None
+        assert cache.peek("a") is None
+
+
+class TestRendererBudget:
+    async def test_within_budget(self) -> None:
+        renderer = _renderer([0.0])
+
+        result = await renderer.render(_context(1, render_budget=1.0))
+
+        assert result.content == "1"
+        assert not result.budget_exceeded
+
+    async def test_serves_last_good_output(self) -> None:
+        delay = [0.0]
+        renderer = _renderer(delay)
+        first = await renderer.render(
+            _context(1, cache_key="block:stats", cache_ttl=0, render_budget=1.0)
+        )
+        assert first.content == "1"
+
+        delay[0] = 1.0
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await renderer.render(
+            _context(2, cache_key="block:stats", cache_ttl=0, render_budget=0.05)
+        )
+
+        assert loop.time() - start < 0.5
+        assert result.content == "1"
+        assert result.budget_exceeded and result.cache_hit
+        assert renderer.get_budget_stats()["stale"] == 1
+
+    async def test_serves_placeholder(self) -> None:
+        renderer = _renderer([1.0])
+
+        result = await renderer.render(
+            _context(1, render_budget=0.05, budget_placeholder="<p>Loading</p>")
+        )
+
+        assert result.content == "<p>Loading</p>"
+        assert result.status_code == 200
+        assert renderer.get_budget_stats() == {
+            "stale": 0,
+            "placeholder": 1,
+            "error": 0,
+            "exceeded": 1,
+        }
+
+    async def test_without_fallback_times_out(self) -> None:
+        renderer = _renderer([1.0])
+
+        result = await renderer.render(_context(1, render_budget=0.05))
+
+        assert result.status_code == 504
+        assert result.budget_exceeded
+        assert renderer.get_budget_stats()["error"] == 1
+
+    async def test_errors_raised_by_the_template_are_not_overruns(self) -> None:
+        renderer = _renderer([0.0])
+
+        async def failing(value: t.Any) -> str:
+            raise TimeoutError("backend")
+
+        env = t.cast(t.Any, renderer.base_templates).app.env
+        env.filters["slow"] = failing
+        result = await renderer.render(_context(1, render_budget=1.0))
+
+        assert result.status_code == 500
+        assert not result.budget_exceeded
+        assert renderer.get_budget_stats()["exceeded"] == 0
+
+
+class TestBlockBudget:
+    async def test_slow_block_does_not_hold_up_the_others(self) -> None:
+        renderer = _renderer([1.0])
+        blocks = BlockRenderer(renderer, t.cast(t.Any, object()))
+        blocks.registry.register_block(
+            BlockDefinition(
+                name="page.html:stats",
+                template_name="page.html",
+                block_name="stats",
+                render_budget=0.05,
+                budget_placeholder="<p>Stats unavailable</p>",
+            )
+        )
+        blocks.registry.register_block(
+            BlockDefinition(
+                name="page.html:nav", template_name="page.html", block_name="nav"
+            )
+        )
+        blocks._discovered_all = True
+
+        response = await blocks.render_fragment_composition(
+            "page", ["page.html:stats", "page.html:nav"], {"value": 1}
+        )
+
+        assert response.body == b"<p>Stats unavailable</p>\nmenu"
+
+    async def test_request_overrides_block_budget(self) -> None:
+        renderer = _renderer([0.1])
+        blocks = BlockRenderer(renderer, t.cast(t.Any, object()))
+        blocks.registry.register_block(
+            BlockDefinition(
+                name="page.html:stats",
+                template_name="page.html",
+                block_name="stats",
+                render_budget=0.01,
+                budget_placeholder="-",
+            )
+        )
+
+        result = await blocks.render_block(
+            BlockRenderRequest(
+                block_id="page.html:stats", context={"value": 7}, render_budget=1.0
+            )
+        )
+
+        assert result.content == "7"
+        assert not result.budget_exceeded
@@ -0,0 +1,153 @@
+"""Tests for the bounded render cache and render-time statistics."""
+
+from __future__ import annotations
+
+import gc
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+from fastblocks.adapters.templates._async_renderer import (
+    AsyncTemplateRenderer,
+    RenderContext,
+    RenderResult,
+)
+from fastblocks.adapters.templates._render_cache import (
+    RenderCache,
+    RenderTimeStats,
+    RenderTimeTracker,
+)
+
+
+class TestRenderCache:
+    def test_lru_by_entry_count(self) -> None:
+        cache = RenderCache(max_entries=2)
+        cache.set("a", "A", 60, "t.html", now=0)
+        cache.set("b", "B", 60, "t.html", now=0)
+        assert cache.get("a", now=1) == "A"
+        cache.set("c", "C", 60, "t.html", now=1)
+
+        assert list(cache) == ["a", "c"]
+        assert cache.evictions == 1
+
+    def test_byte_budget(self) -> None:
+        size = RenderCache.entry_size("k0", "x" * 100)
+        cache = RenderCache(max_entries=100, max_bytes=size * 3)
+        for i in range(10):
+            cache.set(f"k{i}", "x" * 100, 60, "t.html")
+
+        assert len(cache) == 3
+        assert cache.total_bytes <= cache.max_bytes
+        assert not cache.set("huge", "x" * size * 4, 60, "t.html")
+        assert "huge" not in cache
+
+    def test_ttl_expiry(self) -> None:
+        cache = RenderCache()
+        cache.set("a", "A", 10, "t.html", now=100)
+
+        assert cache.get("a", now=109) == "A"
+        assert cache.get("a", now=110) is None
+        assert cache.expirations == 1
+        assert cache.total_bytes == 0
+
+    def test_replacing_an_entry_keeps_accounting(self) -> None:
+        cache = RenderCache()
+        cache.set("a", "short", 60, "t.html")
+        cache.set("a", "a much longer value", 60, "t.html")
+
+        assert cache.total_bytes == RenderCache.entry_size("a", "a much longer value")
+
+    def test_invalidate_templates_uses_index(self) -> None:
+        cache = RenderCache()
+        cache.set("p1", "P", 60, "page.html")
+        cache.set("p2", "P", 60, "page.html")
+        cache.set("n", "N", 60, "nav.html")
+
+        assert sorted(cache.invalidate_templates(["page.html"])) == ["p1", "p2"]
+        assert list(cache) == ["n"]
+        assert cache.invalidate_templates(["page.html"]) == []
+
+
+class TestRenderTimeStats:
+    def test_aggregates_and_percentiles(self) -> None:
+        stats = RenderTimeStats()
+        for _ in range(90):
+            stats.add(0.001)
+        for _ in range(10):
+            stats.add(0.5)
+
+        assert stats.count == 100
+        assert stats.minimum == 0.001
+        assert stats.maximum == 0.5
+        assert stats.average == pytest.approx(0.0509)
+        assert 0.001 <= stats.percentile(0.5) < 0.002
+        assert stats.percentile(0.95) == 0.5
+        assert len(stats.recent) == 10
+
+    def test_tracker_caps_templates(self) -> None:
+        tracker = RenderTimeTracker(max_templates=2)
+        tracker.record("a", 0.1)
+        tracker.record("b", 0.1)
+        tracker.record("a", 0.1)
+        tracker.record("c", 0.1)
+
+        assert "b" not in tracker
+        assert tracker.get("a").count == 2  # type: ignore[union-attr]
+
+
+def _renderer(**kwargs: t.Any) -> AsyncTemplateRenderer:
+    env = Environment(
+        loader=DictLoader({"p.html": "<p>{{ n }}</p>"}), enable_async=True
+    )
+    return AsyncTemplateRenderer(
+        base_templates=t.cast(t.Any, SimpleNamespace(app=SimpleNamespace(env=env))),
+        hybrid_manager=t.cast(t.Any, object()),
+        **kwargs,
+    )
+
+
+class TestRendererMemory:
+    async def test_unique_contexts_render_into_bounded_cache(self) -> None:
+        renderer = _renderer(max_cache_entries=100)
+        for i in range(2_000):
+            result = await renderer.render(
+                RenderContext(
+                    template_name="p.html", context={"n": i}, cache_key=f"p:{i}"
+                )
+            )
+        assert result.content == "<p>1999</p>"
+
+        stats = renderer.get_cache_stats()
+        assert stats["entries"] == 100
+        assert stats["evictions"] == 1_900
+        metrics = await renderer.get_performance_metrics("p.html")
+        assert metrics["render_count"] == 2_000
+        assert len(metrics["recent_times"]) == 10
+
+    @pytest.mark.slow
+    async def test_memory_steady_over_a_million_renders(self) -> None:
+        renderer = _renderer(max_cache_entries=1_000)
+        # The renderer state each render touches: cache lookup, store and
+        # metrics, with a unique context, cache key and output every time.
+        renders = 1_000_000
+        baseline = 0
+        for i in range(renders):
+            render_context = RenderContext(
+                template_name=f"t{i % 2_000}.html",
+                context={"n": i},
+                cache_key=f"p:{i}",
+            )
+            renderer._check_memory_cache(render_context)
+            await renderer._cache_result(
+                render_context, RenderResult(content=f"<p>{i}</p>")
+            )
+            renderer._track_performance(render_context.template_name, 0.001)
+            if i == renders // 10:
+                gc.collect()
+                baseline = len(gc.get_objects())
+        gc.collect()
+
+        assert abs(len(gc.get_objects()) - baseline) < 1_000
+        assert len(renderer._render_cache) == 1_000
+        assert len(renderer._performance_metrics) == renderer.MAX_TRACKED_TEMPLATES
@@ -0,0 +1,185 @@
+"""Tests for the host-local shared render cache, across real processes."""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import typing as t
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from markupsafe import Markup
+from fastblocks.adapters.templates import jinja2 as jinja2_adapter
+from fastblocks.adapters.templates._enhanced_cache import EnhancedCacheManager
+from fastblocks.adapters.templates._shared_cache import SharedRenderCache
+from fastblocks.adapters.templates.jinja2 import Templates
+
+SLOT_SIZE = 4096
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> Path:
+    return tmp_path / "render_cache"
+
+
+def _cache(path: Path, slots: int = 256) -> SharedRenderCache:
+    return SharedRenderCache(path, size=slots * SLOT_SIZE, slot_size=SLOT_SIZE)
+
+
+def _run(*jobs: tuple[t.Callable[..., None], tuple[t.Any, ...]]) -> None:
+    """Run each ``target(*args)`` in a new process; fail if any fails."""
+    context = multiprocessing.get_context("spawn")
+    children = [context.Process(target=target, args=args) for target, args in jobs]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join(120)
+    assert [child.exitcode for child in children] == [0] * len(jobs)
+
+
+class TestSharedRenderCache:
+    def test_values_round_trip(self, path: Path) -> None:
+        cache = _cache(path)
+        values = {"markup": Markup("<b>x</b>"), "str": "caf\xe9", "bytes": b"\x00"}
+        for key, value in values.items():
+            assert cache.set(key, value, ttl=60)
+
+        for key, value in values.items():
+            restored = cache.get(key)
+            assert restored == value and type(restored) is type(value)
+        assert cache.get("missing") is None
+
+    def test_only_small_rendered_values_are_shared(self, path: Path) -> None:
+        cache = _cache(path)
+
+        assert not cache.set("big", "x" * SLOT_SIZE)
+        assert not cache.set("object", {"html": "x"})
+        assert cache.rejections == 2
+
+    def test_expiry_and_delete(self, path: Path) -> None:
+        cache = _cache(path)
+        cache.set("a", "A", ttl=10, now=100)
+        cache.set("b", "B", now=100)
+
+        assert cache.get("a", now=109) == "A"
+        assert cache.get("a", now=110) is None
+        assert cache.delete("b") and not cache.delete("b")
+        assert cache.get("b") is None
+
+    def test_full_bucket_replaces_the_entry_expiring_first(self, path: Path) -> None:
+        cache = _cache(path, slots=SharedRenderCache.WAYS)
+        for i, ttl in enumerate((50, 10, 40, 30)):
+            cache.set(f"k{i}", f"v{i}", ttl=ttl, now=0)
+
+        cache.set("new", "n", ttl=60, now=0)
+
+        assert [cache.get(f"k{i}", now=0) for i in range(4)] == [
+            "v0",
+            None,
+            "v2",
+            "v3",
+        ]
+        assert cache.get("new", now=0) == "n"
+
+    def test_later_processes_use_the_files_layout(self, path: Path) -> None:
+        first = _cache(path)
+        first.set("a", "A")
+
+        second = SharedRenderCache(path, size=1 << 30)
+
+        assert (second.slot_count, second.slot_size) == (256, SLOT_SIZE)
+        assert second.get("a") == "A"
+        second.clear()
+        assert first.get("a") is None
+
+
+def _write_pages(path: Path, rounds: int, index: int) -> None:
+    cache = SharedRenderCache(path)
+    for n in range(rounds):
+        # Each value repeats its 8-digit stamp: a torn read mixes stamps.
+        stamp = f"{index:02d}{n:06d}"
+        cache.set(f"page{n % 8}", stamp * (16 + n % 300))
+
+
+def _check_pages(path: Path, rounds: int, index: int) -> None:
+    # Reads race the writers of _write_pages.
+    cache = SharedRenderCache(path)
+    seen = 0
+    for n in range(rounds):
+        value = cache.get(f"page{n % 8}")
+        if value is not None:
+            seen += 1
+            assert value == value[:8] * (len(value) // 8), value
+    assert seen
+
+
+def _set_page(path: Path) -> None:
+    async def main() -> None:
+        cache = EnhancedCacheManager(
+            sample_every=0, shared_cache=SharedRenderCache(path)
+        )
+        await cache.set("page", "<p>rendered once</p>", ttl=60)
+
+    asyncio.run(main())
+
+
+class TestAcrossProcesses:
+    def test_lock_free_reads_are_never_torn(self, path: Path) -> None:
+        _cache(path).set("page0", "00000000")
+
+        _run(
+            (_write_pages, (path, 20_000, 0)),
+            (_write_pages, (path, 20_000, 1)),
+            (_check_pages, (path, 50_000, 0)),
+            (_check_pages, (path, 50_000, 1)),
+        )
+
+    async def test_workers_share_one_copy(self, path: Path) -> None:
+        _cache(path)
+        cache = EnhancedCacheManager(
+            sample_every=0, shared_cache=SharedRenderCache(path)
+        )
+
+        _run((_set_page, (path,)))
+
+        assert await cache.get("page") == "<p>rendered once</p>"
+        assert cache.metrics.shared_hits == 1
+        assert "page" not in cache.entries
+
+    async def test_entries_keep_only_metadata_locally(self, path: Path) -> None:
+        _cache(path)
+        cache = EnhancedCacheManager(
+            sample_every=0, shared_cache=SharedRenderCache(path)
+        )
+        other = EnhancedCacheManager(
+            sample_every=0, shared_cache=SharedRenderCache(path)
+        )
+        page = "<p>page</p>" * 100
+        await cache.set("page", page, tags={"nav"})
+        await cache.set("data", {"rows": [1, 2]})
+
+        assert cache.metrics.memory_usage == cache.entries["data"].size
+        assert await cache.get("page") == page
+
+        # Invalidation in one worker drops the output for all of them.
+        await other.delete("page")
+        assert await cache.get("page") is None
+        assert "page" not in cache.entries
+
+
+class TestTemplatesSetting:
+    def test_attaches_the_shared_cache(
+        self, path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        cache = EnhancedCacheManager(sample_every=0)
+        monkeypatch.setattr(jinja2_adapter, "get_enhanced_cache", lambda: cache)
+        settings = SimpleNamespace(shared_cache=str(path), shared_cache_size=1 << 20)
+        templates = Templates(
+            config=SimpleNamespace(debug=SimpleNamespace(), templates=settings)
+        )
+
+        templates._attach_shared_cache()
+
+        assert cache.shared_cache is not None
+        assert cache.shared_cache.slot_count * cache.shared_cache.slot_size == 1 << 20
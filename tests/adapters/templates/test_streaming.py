@@ -0,0 +1,160 @@
+"""Tests for block-boundary streaming of template responses."""
+
+from __future__ import annotations
+
+import typing as t
+
+import pytest
+from jinja2 import DictLoader, Environment
+from starlette.requests import Request
+from fastblocks import caching
+from fastblocks.adapters.templates._streaming import (
+    StreamingTemplateResponse,
+    iter_template_chunks,
+)
+from fastblocks.caching import CacheResponder, Rule
+
+_SOURCES = {
+    "base.html": (
+        "<html><head>{% block head %}<title>T</title>{% endblock %}</head>"
+        "<body>{% block body %}{% block content %}{% endblock %}{% endblock %}"
+        "</body></html>"
+    ),
+    "page.html": (
+        "{% extends 'base.html' %}"
+        "{% block head %}{{ super() }}<meta>{% endblock %}"
+        "{% block content %}{% for i in items %}{{ i }}{% endfor %}{% endblock %}"
+    ),
+    "self_ref.html": (
+        "{% extends 'base.html' %}{% block content %}[{{ self.head() }}]{% endblock %}"
+    ),
+}
+
+
+@pytest.fixture
+def env() -> Environment:
+    return Environment(loader=DictLoader(_SOURCES), enable_async=True)
+
+
+async def _chunks(
+    template: t.Any, context: dict[str, t.Any], **kwargs: t.Any
+) -> list[str]:
+    return [chunk async for chunk in iter_template_chunks(template, context, **kwargs)]
+
+
+class TestIterTemplateChunks:
+    async def test_flushes_at_block_boundaries(self, env: Environment) -> None:
+        template = env.get_template("page.html")
+        chunks = await _chunks(template, {"items": [1, 2]})
+
+        assert chunks == [
+            "<html><head>",
+            "<title>T</title><meta>",
+            "</head><body>",
+            "12",
+            "</body></html>",
+        ]
+        assert "".join(chunks) == await template.render_async(items=[1, 2])
+
+    async def test_configured_blocks_only(self, env: Environment) -> None:
+        template = env.get_template("page.html")
+        chunks = await _chunks(template, {"items": [1]}, flush_blocks=["content"])
+
+        assert chunks == [
+            "<html><head><title>T</title><meta></head><body>",
+            "1",
+            "</body></html>",
+        ]
+
+    async def test_self_block_reference_is_not_split(self, env: Environment) -> None:
+        template = env.get_template("self_ref.html")
+        chunks = await _chunks(template, {})
+
+        assert "[<title>T</title>]" in chunks
+        assert "".join(chunks) == await template.render_async()
+
+    async def test_errors_propagate(self) -> None:
+        env = Environment(enable_async=True)
+        template = env.from_string("a{% block body %}{{ 1 / 0 }}{% endblock %}")
+
+        with pytest.raises(ZeroDivisionError):
+            await _chunks(template, {})
+
+
+class TestStreamingTemplateResponse:
+    async def test_sends_chunks_as_body_messages(self, env: Environment) -> None:
+        response = StreamingTemplateResponse(
+            env.get_template("page.html"), {"items": [1]}
+        )
+        messages: list[dict[str, t.Any]] = []
+
+        async def receive() -> dict[str, t.Any]:
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict[str, t.Any]) -> None:
+            messages.append(message)
+
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        await response(scope, receive, send)
+
+        assert messages[0]["type"] == "http.response.start"
+        content_type = (b"content-type", b"text/html; charset=utf-8")
+        assert content_type in messages[0]["headers"]
+        bodies = [m["body"] for m in messages[1:] if m.get("body")]
+        assert bodies[0] == b"<html><head>"
+        assert len(bodies) == 5
+
+
+class TestCacheResponderStreaming:
+    async def test_streamed_body_is_cached_after_completion(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        stored: list[bytes] = []
+
+        async def set_in_cache(response: t.Any, **kwargs: t.Any) -> None:
+            stored.append(response.body)
+
+        monkeypatch.setattr(caching, "set_in_cache", set_in_cache)
+        responder = CacheResponder(t.cast(t.Any, None), rules=[Rule()])
+        responder.request = Request({"type": "http", "method": "GET", "headers": []})
+        sent: list[dict[str, t.Any]] = []
+
+        async def send(message: t.Any) -> None:
+            sent.append(message)
+
+        start = {"type": "http.response.start", "status": 200, "headers": []}
+        await responder.send_with_caching(start, send=send)
+        for body, more in ((b"<html>", True), (b"body", True), (b"</html>", False)):
+            message = {"type": "http.response.body", "body": body, "more_body": more}
+            await responder.send_with_caching(message, send=send)
+
+        assert sent[0] is start
+        assert [m["body"] for m in sent[1:]] == [b"<html>", b"body", b"</html>"]
+        assert stored == [b"<html>body</html>"]
+
+    async def test_oversized_stream_is_not_cached(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        stored: list[bytes] = []
+
+        async def set_in_cache(response: t.Any, **kwargs: t.Any) -> None:
+            stored.append(response.body)
+
+        monkeypatch.setattr(caching, "set_in_cache", set_in_cache)
+        monkeypatch.setattr(caching, "max_streamed_body", 8)
+        responder = CacheResponder(t.cast(t.Any, None), rules=[Rule()])
+        responder.request = Request({"type": "http", "method": "GET", "headers": []})
+        sent: list[dict[str, t.Any]] = []
+
+        async def send(message: t.Any) -> None:
+            sent.append(message)
+
+        await responder.send_with_caching(
+            {"type": "http.response.start", "status": 200, "headers": []}, send=send
+        )
+        for body, more in ((b"0123456", True), (b"789", True), (b"!", False)):
+            message = {"type": "http.response.body", "body": body, "more_body": more}
+            await responder.send_with_caching(message, send=send)
+
+        assert len(sent) == 4
+        assert stored == []
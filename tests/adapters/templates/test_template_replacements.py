@@ -0,0 +1,60 @@
+"""Tests for the single-pass delimiter translation used by PackageLoader."""
+
+from __future__ import annotations
+
+import pytest
+from fastblocks.adapters.templates import jinja2 as jinja2_adapter
+from fastblocks.adapters.templates.jinja2 import _apply_template_replacements
+
+
+class TestDelimiterTranslation:
+    @pytest.mark.parametrize(
+        ("source", "expected"),
+        [
+            (b"{{ a }} {% if b %}c{% endif %}", b"[[ a ]] [% if b %]c[% endif %]"),
+            (b'{{ "}}" }}', b'[[ "}}" ]]'),
+            (b"{% set x = '%}' %}", b"[% set x = '%}' %]"),
+            (b'{{ "a\\"}}" }}', b'[[ "a\\"}}" ]]'),
+            (b"function(){if(x){}}", b"function(){if(x){}}"),
+        ],
+    )
+    def test_only_tag_delimiters_are_rewritten(
+        self, source: bytes, expected: bytes
+    ) -> None:
+        assert _apply_template_replacements(source) == expected
+
+    def test_raw_block_body_is_preserved(self) -> None:
+        source = b"{%- raw %}{{ keep }} {% keep %}{% endraw -%} {{ y }}"
+        assert (
+            _apply_template_replacements(source)
+            == b"[%- raw %]{{ keep }} {% keep %}[% endraw -%] [[ y ]]"
+        )
+
+    def test_deployed_upgrades_http_everywhere(self) -> None:
+        source = b"<a href='http://x'>{{ url('http://y') }}</a>"
+        assert (
+            _apply_template_replacements(source, deployed=True)
+            == b"<a href='https://x'>[[ url('https://y') ]]</a>"
+        )
+
+    def test_translate_disabled(self) -> None:
+        source = b"{{ a }} http://x"
+        assert _apply_template_replacements(source, translate=False) is source
+        assert (
+            _apply_template_replacements(source, deployed=True, translate=False)
+            == b"{{ a }} https://x"
+        )
+
+
+class TestReplacementCache:
+    def test_result_is_memoized_by_content(self) -> None:
+        source = b"{{ memo_" + b"x" * 64 + b" }}"
+        first = _apply_template_replacements(source)
+        assert _apply_template_replacements(bytes(bytearray(source))) is first
+
+    def test_cache_is_bounded(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(jinja2_adapter, "_REPLACEMENT_CACHE_SIZE", 4)
+        jinja2_adapter._replacement_cache.clear()
+        for i in range(10):
+            _apply_template_replacements(b"{{ v%d }}" % i)
+        assert len(jinja2_adapter._replacement_cache) == 4
@@ -0,0 +1,121 @@
+"""Startup benchmarks for building a FastBlocks template environment.
+
+Both arms build the environment with the real ``Templates.init_envs``. The
+eager arm then registers every FastBlocks filter family the way
+``HybridTemplates`` did before filters became lazy; the lazy arm keeps the
+``LazyFilterMap`` that ``init_envs`` installs. Filter family modules are
+evicted from ``sys.modules`` before every round so each round measures a
+cold start.
+"""
+
+import asyncio
+import importlib
+import sys
+import typing as t
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader
+from fastblocks.adapters.templates._registration import FILTER_GROUPS
+from fastblocks.adapters.templates.jinja2 import Templates
+
+_FILTER_MODULES = tuple(group.module for group in FILTER_GROUPS)
+_FULL_APP_EXTENSIONS = ["jinja2.ext"]
+
+
+class _Templates(Templates):
+    def get_loader(self, template_paths: t.Any) -> t.Any:
+        return DictLoader({})
+
+
+def _evict_filter_modules() -> None:
+    for module in _FILTER_MODULES:
+        sys.modules.pop(module, None)
+
+
+def _lazy_env(extensions: list[str]) -> t.Any:
+    settings = SimpleNamespace(
+        extensions=extensions,
+        context_processors=[],
+        loader=None,
+        delimiters={},
+        globals={},
+    )
+    templates = _Templates(
+        config=SimpleNamespace(
+            debug=SimpleNamespace(production=False), deployed=False, templates=settings
+        )
+    )
+    return asyncio.run(templates.init_envs([])).env
+
+
+def _eager_env(extensions: list[str]) -> t.Any:
+    env = _lazy_env(extensions)
+    # The former HybridTemplates._register_filters.
+    from fastblocks.adapters.templates._async_filters import (
+        FASTBLOCKS_ASYNC_FILTERS,
+    )
+    from fastblocks.adapters.templates._enhanced_filters import (
+        ENHANCED_ASYNC_FILTERS,
+        ENHANCED_FILTERS,
+    )
+    from fastblocks.adapters.templates._filters import FASTBLOCKS_FILTERS
+
+    for name, filter_func in (FASTBLOCKS_FILTERS | ENHANCED_FILTERS).items():
+        env.filters[name] = filter_func
+    for name, filter_func in (
+        FASTBLOCKS_ASYNC_FILTERS | ENHANCED_ASYNC_FILTERS
+    ).items():
+        env.filters[name] = filter_func
+    return env
+
+
+@pytest.fixture(autouse=True)
+def async_env() -> None:
+    """Import the real jinja2_async_environment (see test_precompile)."""
+    for key in list(sys.modules):
+        if key.startswith("jinja2_async_environment"):
+            del sys.modules[key]
+    importlib.import_module("jinja2_async_environment")
+
+
+class TestTemplateEnvironmentStartup:
+    """Cold-start cost of a template environment, eager vs lazy."""
+
+    @pytest.mark.benchmark(group="template-startup-minimal")
+    def test_minimal_app_eager(self, benchmark) -> None:
+        env = benchmark.pedantic(
+            _eager_env, args=([],), setup=_evict_filter_modules, rounds=20
+        )
+        assert "img_tag" in env.filters
+
+    @pytest.mark.benchmark(group="template-startup-minimal")
+    def test_minimal_app_lazy(self, benchmark) -> None:
+        env = benchmark.pedantic(
+            _lazy_env, args=([],), setup=_evict_filter_modules, rounds=20
+        )
+        assert "img_tag" in env.filters
+        assert not any(module in sys.modules for module in _FILTER_MODULES)
+
+    @pytest.mark.benchmark(group="template-startup-full")
+    def test_full_app_eager(self, benchmark) -> None:
+        env = benchmark.pedantic(
+            _eager_env,
+            args=(_FULL_APP_EXTENSIONS,),
+            setup=_evict_filter_modules,
+            rounds=20,
+        )
+        assert "jinja2.ext.ExprStmtExtension" in env.extensions
+
+    @pytest.mark.benchmark(group="template-startup-full")
+    def test_full_app_lazy(self, benchmark) -> None:
+        env = benchmark.pedantic(
+            _lazy_env,
+            args=(_FULL_APP_EXTENSIONS,),
+            setup=_evict_filter_modules,
+            rounds=20,
+        )
+        # Extensions load with the environment; filters on first use.
+        assert "jinja2.ext.ExprStmtExtension" in env.extensions
+        env.from_string("[% do [] %]{{ 3 | htmx_retry_trigger }}")
+        assert env.filters.loaded_groups == ["core"]